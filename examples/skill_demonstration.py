@@ -67,7 +67,7 @@ print("📋 SQL Query (from skill pattern):")
 print(cohort_sql)
 print()
 
-cohort_df = query_to_df(cohort_sql, db='mimic')
+cohort_df = query_to_df(cohort_sql, db='mimic', cache=True)
 print("✅ Retrieved cohort:")
 print(cohort_df.to_string())
 print()
@@ -121,7 +121,7 @@ WHERE pao2 IS NOT NULL AND fio2 IS NOT NULL
 ORDER BY charttime;
 """
 
-sofa_resp_df = query_to_df(sofa_resp_sql, db='mimic')
+sofa_resp_df = query_to_df(sofa_resp_sql, db='mimic', cache=True)
 if not sofa_resp_df.empty:
     print("✅ SOFA Respiration Data:")
     print(sofa_resp_df.to_string())
@@ -158,7 +158,7 @@ WHERE le.stay_id = {sample_stay_id}
 ORDER BY le.charttime;
 """
 
-sofa_renal_df = query_to_df(sofa_renal_sql, db='mimic')
+sofa_renal_df = query_to_df(sofa_renal_sql, db='mimic', cache=True)
 if not sofa_renal_df.empty:
     print("✅ SOFA Renal Data:")
     print(sofa_renal_df.to_string())
@@ -230,7 +230,7 @@ WHERE b.baseline_creatinine IS NOT NULL
 ORDER BY c.charttime;
 """
 
-aki_df = query_to_df(aki_sql, db='mimic')
+aki_df = query_to_df(aki_sql, db='mimic', cache=True)
 if not aki_df.empty:
     print("✅ AKI Detection Results:")
     print(aki_df.to_string())
@@ -285,7 +285,7 @@ GROUP BY ie.stay_id, ce.charttime, ie.intime
 ORDER BY ce.charttime;
 """
 
-vitals_df = query_to_df(vitals_sql, db='mimic')
+vitals_df = query_to_df(vitals_sql, db='mimic', cache=True)
 if not vitals_df.empty:
     print("✅ Vital Signs Timeline:")
     print(vitals_df.to_string())
@@ -353,7 +353,7 @@ FULL OUTER JOIN cultures c
 ORDER BY COALESCE(a.antibiotic_time, c.culture_time);
 """
 
-sepsis_df = query_to_df(sepsis_sql, db='mimic')
+sepsis_df = query_to_df(sepsis_sql, db='mimic', cache=True)
 if not sepsis_df.empty:
     print("✅ Sepsis Suspicion Indicators:")
     print(sepsis_df.to_string())
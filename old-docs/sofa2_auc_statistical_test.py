@@ -4,6 +4,10 @@ SOFA-1 vs SOFA-2 AUC差异的统计学检验
 使用bootstrap方法计算AUC差异的置信区间和p值
 """
 
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
 import pandas as pd
 import numpy as np
 from sklearn.metrics import roc_auc_score, roc_curve
@@ -13,6 +17,9 @@ from scipy import stats
 import warnings
 warnings.filterwarnings('ignore')
 
+from utils.auc_bootstrap import bootstrap_auc
+from utils.delong import fast_delong
+
 def load_data():
     """加载数据"""
     df = pd.read_csv('survival_auc_data.csv')
@@ -31,11 +38,10 @@ def calculate_bootstrap_auc_difference(df, n_bootstrap=2000):
     print(f"\n🔬 Bootstrap统计检验 (n={n_bootstrap})")
     print("=" * 60)
 
-    np.random.seed(42)  # 设置随机种子确保结果可重现
-
-    # 计算原始AUC
-    auc_sofa1_orig = roc_auc_score(df['icu_mortality'], df['sofa_score'])
-    auc_sofa2_orig = roc_auc_score(df['icu_mortality'], df['sofa2_score'])
+    # 配对Bootstrap：两个评分共用同一组重采样（utils/auc_bootstrap.py）
+    result = bootstrap_auc(df['icu_mortality'], df[['sofa_score', 'sofa2_score']],
+                           n_bootstrap=n_bootstrap, seed=42)
+    auc_sofa1_orig, auc_sofa2_orig = result.auc
     diff_orig = auc_sofa2_orig - auc_sofa1_orig
 
     print(f"📊 原始AUC：")
@@ -43,45 +49,14 @@ def calculate_bootstrap_auc_difference(df, n_bootstrap=2000):
     print(f"   SOFA-2: {auc_sofa2_orig:.4f}")
     print(f"   差异 (SOFA2-SOFA1): {diff_orig:+.4f}")
 
-    # Bootstrap重采样
-    bootstrap_diffs = []
-    bootstrap_sofa1_aucs = []
-    bootstrap_sofa2_aucs = []
-
-    n_patients = len(df)
-    n_pos = df['icu_mortality'].sum()
-    n_neg = n_patients - n_pos
-
-    print(f"\n🔄 开始Bootstrap重采样...")
-
-    for i in range(n_bootstrap):
-        # 重采样
-        bootstrap_indices = np.random.choice(n_patients, size=n_patients, replace=True)
-        bootstrap_df = df.iloc[bootstrap_indices].copy()
-
-        # 检查是否有足够的阳性和阴性样本
-        if bootstrap_df['icu_mortality'].sum() == 0 or bootstrap_df['icu_mortality'].sum() == n_patients:
-            continue
-
-        # 计算bootstrap AUC
-        auc_sofa1_boot = roc_auc_score(bootstrap_df['icu_mortality'], bootstrap_df['sofa_score'])
-        auc_sofa2_boot = roc_auc_score(bootstrap_df['icu_mortality'], bootstrap_df['sofa2_score'])
-
-        bootstrap_sofa1_aucs.append(auc_sofa1_boot)
-        bootstrap_sofa2_aucs.append(auc_sofa2_boot)
-        bootstrap_diffs.append(auc_sofa2_boot - auc_sofa1_boot)
-
-        # 进度显示
-        if (i + 1) % 500 == 0:
-            print(f"   完成 {i + 1}/{n_bootstrap} 次重采样")
+    # 剔除阳性或阴性被抽空的重采样
+    valid = ~np.isnan(result.replicates).any(axis=1)
+    bootstrap_sofa1_aucs = result.replicates[valid, 0]
+    bootstrap_sofa2_aucs = result.replicates[valid, 1]
+    bootstrap_diffs = bootstrap_sofa2_aucs - bootstrap_sofa1_aucs
 
     print(f"✅ Bootstrap完成：{len(bootstrap_diffs)}次有效重采样")
 
-    # 计算置信区间
-    bootstrap_diffs = np.array(bootstrap_diffs)
-    bootstrap_sofa1_aucs = np.array(bootstrap_sofa1_aucs)
-    bootstrap_sofa2_aucs = np.array(bootstrap_sofa2_aucs)
-
     # 95%置信区间
     ci_95_low, ci_95_high = np.percentile(bootstrap_diffs, [2.5, 97.5])
     ci_90_low, ci_90_high = np.percentile(bootstrap_diffs, [5.0, 95.0])
@@ -131,65 +106,18 @@ def calculate_bootstrap_auc_difference(df, n_bootstrap=2000):
 def delong_test(y_true, y_score1, y_score2):
     """
     DeLong检验：比较两个相关ROC曲线的AUC差异
-    这是AUC比较的更精确方法
+    这是AUC比较的更精确方法（中位秩快速算法，见 utils/delong.py）
     """
-    def compute_auc_variance(y_true, y_score):
-        """计算AUC的方差（使用DeLong方法）"""
-        n = len(y_true)
-        n_pos = np.sum(y_true == 1)
-        n_neg = n - n_pos
-
-        # 排序
-        order = np.argsort(y_score)[::-1]
-        y_true_sorted = y_true[order]
-        y_score_sorted = y_score[order]
-
-        # 计算结构化变量
-        V10 = np.cumsum(y_true_sorted) - y_true_sorted
-        V11 = np.cumsum(1 - y_true_sorted) - (1 - y_true_sorted)
-
-        # 计算AUC方差
-        auc = np.sum(V10 * y_true_sorted) / (n_pos * n_neg)
-
-        S1 = np.sum(V10 * y_true_sorted) / (n_pos * n_neg)
-        S2 = np.sum(V11 * (1 - y_true_sorted)) / (n_pos * n_neg)
-
-        var_auc = (S1 - auc**2) / n_pos + (S2 - auc**2) / n_neg
-
-        return auc, var_auc
-
-    # 计算每个模型的AUC和方差
-    auc1, var1 = compute_auc_variance(y_true, y_score1)
-    auc2, var2 = compute_auc_variance(y_true, y_score2)
-
-    # 计算协方差
-    order = np.lexsort((y_score1, y_score2))[::-1]
-
-    # 简化的协方差计算
-    rank1 = stats.rankdata(y_score1)
-    rank2 = stats.rankdata(y_score2)
-
-    n = len(y_true)
-    n_pos = np.sum(y_true == 1)
-    n_neg = n - n_pos
-
-    # 计算协方差的近似方法
-    cov = np.cov(rank1, rank2)[0, 1] * (n_pos * n_neg) / (n**2 * (n-1))
-
-    # 计算差异的统计量
-    diff = auc2 - auc1
-    se_diff = np.sqrt(var1 + var2 - 2 * cov)
-
-    z_score = diff / se_diff
-    p_value = 2 * (1 - stats.norm.cdf(abs(z_score)))
+    result = fast_delong(y_true, {'score1': y_score1, 'score2': y_score2})
+    test = result.pairwise([('score2', 'score1')]).iloc[0]
 
     return {
-        'auc1': auc1,
-        'auc2': auc2,
-        'diff': diff,
-        'se_diff': se_diff,
-        'z_score': z_score,
-        'p_value': p_value
+        'auc1': result.auc[0],
+        'auc2': result.auc[1],
+        'diff': test['diff'],
+        'se_diff': test['se'],
+        'z_score': test['z'],
+        'p_value': test['p_value']
     }
 
 def plot_bootstrap_results(results):
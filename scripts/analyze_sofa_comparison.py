@@ -8,23 +8,11 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-from utils.db_helper import DB_CONFIG
-import psycopg2
+from utils.db_helper import _IDENTIFIER_RE, get_connection, iter_query, query_to_df
 import pandas as pd
 import numpy as np
-from scipy import stats
 import time
 
-def get_connection():
-    config = DB_CONFIG['mimic']
-    return psycopg2.connect(
-        host=config['host'],
-        port=config['port'],
-        database=config['database'],
-        user=config['user'],
-        password=config['password']
-    )
-
 def create_comparison_table(conn, sql_file, table_name):
     """Create comparison table from SQL file"""
     print(f"\n{'='*70}")
@@ -68,142 +56,244 @@ def create_comparison_table(conn, sql_file, table_name):
     finally:
         cursor.close()
 
-def load_comparison_data(conn, table_name):
-    """Load comparison data into pandas DataFrame"""
+def load_comparison_data(table_name, batch_size=200_000):
+    """Stream comparison data into a typed DataFrame (nullable small-int score columns)"""
     print(f"\n📥 Loading data from {table_name}...")
     query = f"SELECT * FROM {table_name}"
-    df = pd.read_sql_query(query, conn)
+    chunks = list(iter_query(query, batch_size=batch_size))
+    df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
     print(f"✅ Loaded {len(df):,} rows")
     return df
 
-def calculate_distribution_stats(df, score_cols, label):
-    """Calculate distribution statistics for scores"""
+def _value_codes(values):
+    """Integer score column -> int64 codes, missing = -1"""
+    values = pd.Series(values)
+    if pd.api.types.is_integer_dtype(values.dtype) or pd.api.types.is_bool_dtype(values.dtype):
+        # copy=True: plain numpy-backed columns would otherwise return a read-only view
+        codes = np.array(values.to_numpy(dtype=np.int64, na_value=-1), dtype=np.int64, copy=True)
+        missing = values.isna().to_numpy()
+    else:
+        floats = pd.to_numeric(values, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        missing = np.isnan(floats)
+        codes = np.where(missing, -1, floats).astype(np.int64)
+    if (codes[~missing] < 0).any():
+        raise ValueError("agreement matrices need non-negative integer scores")
+    return codes
+
+def build_agreement_matrices(df, sofa1_cols, sofa2_cols):
+    """
+    Joint value counts of every SOFA-1/SOFA-2 column pair from a single bincount.
+
+    Each pair gets a (K1 + 1) x (K2 + 1) matrix where joint[i, j] counts stays
+    with SOFA-1 == i and SOFA-2 == j; the last row / column counts stays where
+    that side is missing. Every statistic in the report is derived from these
+    matrices, so the DataFrame is scanned once regardless of cohort size.
+    """
+    pairs = [(c1, c2) for c1, c2 in zip(sofa1_cols, sofa2_cols)
+             if c1 in df.columns and c2 in df.columns]
+    codes, shapes, offset = [], [], 0
+    for c1, c2 in pairs:
+        a, b = _value_codes(df[c1]), _value_codes(df[c2])
+        k1, k2 = max(a.max(initial=-1), 0) + 1, max(b.max(initial=-1), 0) + 1
+        a, b = np.where(a < 0, k1, a), np.where(b < 0, k2, b)
+        codes.append(offset + a * (k2 + 1) + b)
+        shapes.append((offset, (k1 + 1, k2 + 1)))
+        offset += (k1 + 1) * (k2 + 1)
+
+    counts = np.bincount(np.concatenate(codes), minlength=offset) if codes else np.zeros(0, dtype=np.int64)
+    return {
+        c1.replace('sofa1_', ''): counts[start:start + rows * cols].reshape(rows, cols)
+        for (c1, _), (start, (rows, cols)) in zip(pairs, shapes)
+    }
+
+def _quantile_from_counts(counts, q):
+    """pandas-style (linear) quantile of the values 0..K-1 with the given counts"""
+    n = counts.sum()
+    position = (n - 1) * q
+    cumulative = np.cumsum(counts)
+    low = np.searchsorted(cumulative, np.floor(position), side='right')
+    high = np.searchsorted(cumulative, np.ceil(position), side='right')
+    return low + (high - low) * (position - np.floor(position))
+
+def _kappa(confusion, weights=None):
+    """Cohen's kappa from a square confusion matrix; weights='linear' / 'quadratic' for weighted kappa"""
+    size = max(confusion.shape)
+    table = np.zeros((size, size))
+    table[:confusion.shape[0], :confusion.shape[1]] = confusion
+    n = table.sum()
+    if n == 0:
+        return np.nan
+    i, j = np.indices(table.shape)
+    if weights == 'linear':
+        disagreement = np.abs(i - j) / max(size - 1, 1)
+    elif weights == 'quadratic':
+        disagreement = ((i - j) / max(size - 1, 1)) ** 2
+    else:
+        disagreement = (i != j).astype(float)
+    expected = np.outer(table.sum(axis=1), table.sum(axis=0)) / n
+    observed_disagreement = (disagreement * table).sum()
+    expected_disagreement = (disagreement * expected).sum()
+    return 1 - observed_disagreement / expected_disagreement if expected_disagreement else 1.0
+
+def _weighted_correlation(x, y, weights):
+    """Pearson correlation of value grids x (rows) and y (columns) weighted by joint counts"""
+    n = weights.sum()
+    mx = (weights.sum(axis=1) * x).sum() / n
+    my = (weights.sum(axis=0) * y).sum() / n
+    dx, dy = x - mx, y - my
+    cov = (weights * np.outer(dx, dy)).sum()
+    var_x = (weights.sum(axis=1) * dx ** 2).sum()
+    var_y = (weights.sum(axis=0) * dy ** 2).sum()
+    return cov / np.sqrt(var_x * var_y) if var_x > 0 and var_y > 0 else np.nan
+
+def _midranks(counts):
+    """Average rank of each value 0..K-1 given its count (ties share the mean rank)"""
+    cumulative = np.cumsum(counts)
+    return cumulative - (counts - 1) / 2.0
+
+def _correlation_p_value(r, n):
+    from scipy import stats
+
+    if np.isnan(r) or n < 3:
+        return np.nan
+    if abs(r) >= 1:
+        return 0.0
+    t = r * np.sqrt((n - 2) / (1 - r ** 2))
+    return 2 * stats.t.sf(abs(t), n - 2)
+
+def calculate_distribution_stats(matrices, label):
+    """Calculate distribution statistics for scores (marginals of the agreement matrices)"""
     print(f"\n{'='*70}")
     print(f"  {label} - Distribution Statistics")
     print(f"{'='*70}")
 
+    axis = 1 if label.upper() == 'SOFA1' else 0
     stats_list = []
-    for col in score_cols:
-        if col not in df.columns:
+    for component, joint in matrices.items():
+        counts = joint.sum(axis=axis)[:-1]      # drop the missing bin
+        values = np.arange(len(counts))
+        n = counts.sum()
+        if n == 0:
             continue
-
-        data = df[col].dropna()
+        mean = (counts * values).sum() / n
+        present = np.flatnonzero(counts)
 
         stats_dict = {
-            'Component': col.replace(label.lower() + '_', '').replace('_', ' ').title(),
-            'N': len(data),
-            'Mean': data.mean(),
-            'Std': data.std(),
-            'Median': data.median(),
-            'IQR_25': data.quantile(0.25),
-            'IQR_75': data.quantile(0.75),
-            'Min': data.min(),
-            'Max': data.max(),
-            'Score_0': (data == 0).sum(),
-            'Score_1': (data == 1).sum(),
-            'Score_2': (data == 2).sum(),
-            'Score_3': (data == 3).sum(),
-            'Score_4': (data == 4).sum(),
+            'Component': component.replace('_', ' ').title(),
+            'N': n,
+            'Mean': mean,
+            'Std': np.sqrt((counts * (values - mean) ** 2).sum() / (n - 1)) if n > 1 else np.nan,
+            'Median': _quantile_from_counts(counts, 0.5),
+            'IQR_25': _quantile_from_counts(counts, 0.25),
+            'IQR_75': _quantile_from_counts(counts, 0.75),
+            'Min': present[0],
+            'Max': present[-1],
         }
+        for score in range(5):
+            stats_dict[f'Score_{score}'] = counts[score] if score < len(counts) else 0
         stats_list.append(stats_dict)
 
     stats_df = pd.DataFrame(stats_list)
     return stats_df
 
-def calculate_correlations(df, sofa1_cols, sofa2_cols):
-    """Calculate correlations between SOFA-1 and SOFA-2 scores"""
+def calculate_correlations(matrices):
+    """Calculate correlations and agreement between SOFA-1 and SOFA-2 scores"""
     print(f"\n{'='*70}")
     print(f"  SOFA-1 vs SOFA-2 Correlations")
     print(f"{'='*70}")
 
     corr_list = []
 
-    for s1_col, s2_col in zip(sofa1_cols, sofa2_cols):
-        if s1_col not in df.columns or s2_col not in df.columns:
-            continue
-
-        # Remove rows with missing values
-        valid_data = df[[s1_col, s2_col]].dropna()
+    for component, joint in matrices.items():
+        # Pairs with both scores present
+        confusion = joint[:-1, :-1]
+        n = confusion.sum()
 
-        if len(valid_data) < 2:
+        if n < 2:
             continue
 
-        # Pearson correlation
-        pearson_r, pearson_p = stats.pearsonr(valid_data[s1_col], valid_data[s2_col])
-
-        # Spearman correlation
-        spearman_r, spearman_p = stats.spearmanr(valid_data[s1_col], valid_data[s2_col])
+        v1, v2 = np.arange(confusion.shape[0]), np.arange(confusion.shape[1])
+        pearson_r = _weighted_correlation(v1, v2, confusion)
 
-        # Calculate agreement (exact match)
-        agreement = (valid_data[s1_col] == valid_data[s2_col]).mean()
+        # Spearman = Pearson on midranks of the paired values
+        spearman_r = _weighted_correlation(_midranks(confusion.sum(axis=1)),
+                                           _midranks(confusion.sum(axis=0)), confusion)
 
-        # Mean absolute difference
-        mad = (valid_data[s2_col] - valid_data[s1_col]).abs().mean()
-
-        component = s1_col.replace('sofa1_', '').replace('_', ' ').title()
+        gap = np.abs(np.subtract.outer(v1, v2))
 
         corr_list.append({
-            'Component': component,
-            'N': len(valid_data),
+            'Component': component.replace('_', ' ').title(),
+            'N': n,
             'Pearson_r': pearson_r,
-            'Pearson_p': pearson_p,
+            'Pearson_p': _correlation_p_value(pearson_r, n),
             'Spearman_r': spearman_r,
-            'Spearman_p': spearman_p,
-            'Exact_Agreement': agreement,
-            'Mean_Abs_Diff': mad
+            'Spearman_p': _correlation_p_value(spearman_r, n),
+            'Exact_Agreement': np.trace(confusion) / n,
+            'Mean_Abs_Diff': (gap * confusion).sum() / n,
+            'Kappa': _kappa(confusion),
+            'Weighted_Kappa': _kappa(confusion, weights='quadratic'),
         })
 
     corr_df = pd.DataFrame(corr_list)
     return corr_df
 
-def analyze_score_differences(df):
-    """Analyze differences between SOFA-1 and SOFA-2"""
+def analyze_score_differences(matrices):
+    """Analyze differences between SOFA-1 and SOFA-2 (anti-diagonals of the agreement matrices)"""
     print(f"\n{'='*70}")
     print(f"  Score Differences (SOFA-2 - SOFA-1)")
     print(f"{'='*70}")
 
-    diff_cols = [col for col in df.columns if col.endswith('_diff')]
-
     diff_stats = []
-    for col in diff_cols:
-        data = df[col].dropna()
-
-        component = col.replace('_diff', '').replace('_', ' ').title()
+    for component, joint in matrices.items():
+        confusion = joint[:-1, :-1]
+        rows, cols = confusion.shape
+        # Histogram of SOFA-2 - SOFA-1 over -(rows - 1) .. cols - 1
+        diffs = np.arange(cols)[None, :] - np.arange(rows)[:, None]
+        counts = np.bincount((diffs + rows - 1).ravel(), weights=confusion.ravel(),
+                             minlength=rows + cols - 1)
+        values = np.arange(rows + cols - 1) - (rows - 1)
+        n = counts.sum()
+        if n == 0:
+            continue
+        mean = (counts * values).sum() / n
+        present = values[counts > 0]
 
         diff_stats.append({
-            'Component': component,
-            'Mean_Diff': data.mean(),
-            'Median_Diff': data.median(),
-            'Std_Diff': data.std(),
-            'SOFA2_Higher': (data > 0).sum(),
-            'No_Change': (data == 0).sum(),
-            'SOFA1_Higher': (data < 0).sum(),
-            'Max_Increase': data.max(),
-            'Max_Decrease': data.min()
+            'Component': component.replace('_', ' ').title(),
+            'Mean_Diff': mean,
+            'Median_Diff': _quantile_from_counts(counts, 0.5) - (rows - 1),
+            'Std_Diff': np.sqrt((counts * (values - mean) ** 2).sum() / (n - 1)) if n > 1 else np.nan,
+            'SOFA2_Higher': int(counts[values > 0].sum()),
+            'No_Change': int(counts[values == 0].sum()),
+            'SOFA1_Higher': int(counts[values < 0].sum()),
+            'Max_Increase': present.max(),
+            'Max_Decrease': present.min()
         })
 
     diff_df = pd.DataFrame(diff_stats)
     return diff_df
 
-def analyze_risk_categorization(df):
+def analyze_risk_categorization(df, matrices, threshold=2):
     """Analyze SOFA >= 2 categorization agreement"""
     print(f"\n{'='*70}")
-    print(f"  High Risk (SOFA >= 2) Categorization")
+    print(f"  High Risk (SOFA >= {threshold}) Categorization")
     print(f"{'='*70}")
 
-    both_high = df['both_high_risk'].sum()
-    both_low = df['both_low_risk'].sum()
-    sofa1_only = df['sofa1_only_high'].sum()
-    sofa2_only = df['sofa2_only_high'].sum()
+    # Collapse the total-score matrix at the threshold
+    confusion = matrices['total'][:-1, :-1]
+    both_low = confusion[:threshold, :threshold].sum()
+    sofa2_only = confusion[:threshold, threshold:].sum()
+    sofa1_only = confusion[threshold:, :threshold].sum()
+    both_high = confusion[threshold:, threshold:].sum()
 
     total = len(df)
     agreement = (both_high + both_low) / total
-    kappa = calculate_cohen_kappa(df['sofa1_high_risk'], df['sofa2_high_risk'])
+    kappa = _kappa(np.array([[both_low, sofa2_only], [sofa1_only, both_high]]))
 
     print(f"Total ICU Stays: {total:,}")
     print(f"\nCategorization Agreement:")
-    print(f"  Both High Risk (≥2):     {both_high:>8,} ({both_high/total*100:>5.1f}%)")
-    print(f"  Both Low Risk (<2):      {both_low:>8,} ({both_low/total*100:>5.1f}%)")
+    print(f"  Both High Risk (≥{threshold}):     {both_high:>8,} ({both_high/total*100:>5.1f}%)")
+    print(f"  Both Low Risk (<{threshold}):      {both_low:>8,} ({both_low/total*100:>5.1f}%)")
     print(f"  SOFA-1 Only High:        {sofa1_only:>8,} ({sofa1_only/total*100:>5.1f}%)")
     print(f"  SOFA-2 Only High:        {sofa2_only:>8,} ({sofa2_only/total*100:>5.1f}%)")
     print(f"\n  Overall Agreement:       {agreement*100:.1f}%")
@@ -219,26 +309,43 @@ def analyze_risk_categorization(df):
         'kappa': kappa
     }
 
+def analyze_reclassification(df, threshold=2, outcome='icu_mortality', n_bootstrap=1000):
+    """NRI / IDI for SOFA-1 -> SOFA-2 against an outcome from patient_outcomes"""
+    from utils.reclassification import reclassification
+
+    if not _IDENTIFIER_RE.match(outcome):
+        raise ValueError(f"Invalid outcome column: {outcome}")
+
+    print(f"\n{'='*70}")
+    print(f"  Reclassification (NRI / IDI) for {outcome}")
+    print(f"{'='*70}")
+
+    outcomes = query_to_df(f"SELECT stay_id, {outcome} FROM mimiciv_derived.patient_outcomes",
+                           engine='arrow', label='analyze_sofa_comparison.outcomes')
+    merged = df[['stay_id', 'sofa1_total', 'sofa2_total']].merge(outcomes, on='stay_id', how='inner')
+
+    frames = []
+    for label, kwargs in ((f'score >= {threshold}', {'score_cutoffs': (threshold,)}),
+                          ('risk 10/20/40%', {'risk_cutoffs': (0.1, 0.2, 0.4)})):
+        result = reclassification(merged[outcome], merged['sofa1_total'], merged['sofa2_total'],
+                                  n_bootstrap=n_bootstrap, **kwargs)
+        summary = result.summary()
+        summary.insert(0, 'categories', label)
+        frames.append(summary)
+        print(f"\nCategories: {label}")
+        print(result.table.to_string())
+    summary = pd.concat(frames, ignore_index=True)
+    print("\n" + summary.to_string(index=False))
+    return summary
+
 def calculate_cohen_kappa(y1, y2):
-    """Calculate Cohen's Kappa for agreement"""
-    # Create confusion matrix
-    both_yes = ((y1 == 1) & (y2 == 1)).sum()
-    both_no = ((y1 == 0) & (y2 == 0)).sum()
-    y1_yes_y2_no = ((y1 == 1) & (y2 == 0)).sum()
-    y1_no_y2_yes = ((y1 == 0) & (y2 == 1)).sum()
-
-    n = len(y1)
-    po = (both_yes + both_no) / n  # Observed agreement
-
-    # Expected agreement
-    p_y1_yes = (both_yes + y1_yes_y2_no) / n
-    p_y2_yes = (both_yes + y1_no_y2_yes) / n
-    p_y1_no = 1 - p_y1_yes
-    p_y2_no = 1 - p_y2_yes
-    pe = p_y1_yes * p_y2_yes + p_y1_no * p_y2_no
-
-    kappa = (po - pe) / (1 - pe) if pe != 1 else 1.0
-    return kappa
+    """Calculate Cohen's Kappa for agreement (binary or integer ratings, missing pairs dropped)"""
+    a, b = _value_codes(y1), _value_codes(y2)
+    valid = (a >= 0) & (b >= 0)
+    a, b = a[valid], b[valid]
+    size = int(max(a.max(initial=0), b.max(initial=0))) + 1
+    confusion = np.bincount(a * size + b, minlength=size * size).reshape(size, size)
+    return _kappa(confusion)
 
 def analyze_sepsis_comparison(df):
     """Analyze sepsis identification comparison"""
@@ -330,8 +437,8 @@ def main():
         print("  PART 2: Loading Data")
         print("="*70)
 
-        sofa_df = load_comparison_data(conn, 'mimiciv_derived.sofa_comparison')
-        sepsis_df = load_comparison_data(conn, 'mimiciv_derived.sepsis_comparison')
+        sofa_df = load_comparison_data('mimiciv_derived.sofa_comparison')
+        sepsis_df = load_comparison_data('mimiciv_derived.sepsis_comparison')
 
         # 3. Distribution analysis
         print("\n" + "="*70)
@@ -343,10 +450,13 @@ def main():
         sofa2_cols = ['sofa2_total', 'sofa2_brain', 'sofa2_respiratory',
                       'sofa2_cardiovascular', 'sofa2_liver', 'sofa2_kidney', 'sofa2_hemostasis']
 
-        sofa1_stats = calculate_distribution_stats(sofa_df, sofa1_cols, 'SOFA1')
+        # One bincount over all component pairs; everything below is derived from it
+        matrices = build_agreement_matrices(sofa_df, sofa1_cols, sofa2_cols)
+
+        sofa1_stats = calculate_distribution_stats(matrices, 'SOFA1')
         print("\n" + sofa1_stats.to_string(index=False))
 
-        sofa2_stats = calculate_distribution_stats(sofa_df, sofa2_cols, 'SOFA2')
+        sofa2_stats = calculate_distribution_stats(matrices, 'SOFA2')
         print("\n" + sofa2_stats.to_string(index=False))
 
         # 4. Correlation analysis
@@ -354,7 +464,7 @@ def main():
         print("  PART 4: Correlation Analysis")
         print("="*70)
 
-        corr_df = calculate_correlations(sofa_df, sofa1_cols, sofa2_cols)
+        corr_df = calculate_correlations(matrices)
         print("\n" + corr_df.to_string(index=False))
 
         # 5. Difference analysis
@@ -362,7 +472,7 @@ def main():
         print("  PART 5: Score Difference Analysis")
         print("="*70)
 
-        diff_df = analyze_score_differences(sofa_df)
+        diff_df = analyze_score_differences(matrices)
         print("\n" + diff_df.to_string(index=False))
 
         # 6. Risk categorization analysis
@@ -370,7 +480,8 @@ def main():
         print("  PART 6: Risk Categorization Analysis")
         print("="*70)
 
-        risk_stats = analyze_risk_categorization(sofa_df)
+        risk_stats = analyze_risk_categorization(sofa_df, matrices)
+        reclass_df = analyze_reclassification(sofa_df)
 
         # 7. Sepsis comparison analysis
         print("\n" + "="*70)
@@ -387,6 +498,7 @@ def main():
             sofa2_distribution=sofa2_stats,
             correlations=corr_df,
             score_differences=diff_df,
+            reclassification=reclass_df,
             sofa_comparison_data=sofa_df,
             sepsis_comparison_data=sepsis_df
         )
@@ -8,20 +8,9 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-from utils.db_helper import DB_CONFIG
-import psycopg2
+from utils.db_helper import get_connection
 import time
 
-def get_connection():
-    config = DB_CONFIG['mimic']
-    return psycopg2.connect(
-        host=config['host'],
-        port=config['port'],
-        database=config['database'],
-        user=config['user'],
-        password=config['password']
-    )
-
 def execute_sql_file(filepath, table_name):
     """Execute SQL file to create table"""
     print(f"\n{'='*70}")
@@ -22,23 +22,11 @@ from datetime import datetime
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-from utils.db_helper import query_to_df, DB_CONFIG
+from utils.db_helper import query_to_df, get_connection, count_rows
 import psycopg2
 from psycopg2 import sql
 
 
-def get_connection(db='mimic'):
-    """Get database connection"""
-    config = DB_CONFIG[db]
-    return psycopg2.connect(
-        host=config['host'],
-        port=config['port'],
-        database=config['database'],
-        user=config['user'],
-        password=config['password']
-    )
-
-
 def print_header(text):
     """Print formatted header"""
     print("\n" + "=" * 70)
@@ -94,25 +82,30 @@ def check_table_exists(conn, schema, table_name):
     return exists
 
 
-def get_table_stats(conn, schema, table_name):
-    """Get table row count and basic stats"""
+def get_table_stats(conn, schema, table_name, mode='sample'):
+    """
+    Get table row count and unique stays without re-scanning the new table.
+
+    The freshly built table is ANALYZEd first (a sampled pass the planner needs
+    anyway), then rows are estimated from a block sample and unique stays from
+    pg_stats. Use mode='exact' for an exact row count (unique stays are then a
+    HyperLogLog estimate).
+    """
     cursor = conn.cursor()
     try:
-        cursor.execute(f"""
-            SELECT
-                COUNT(*) as row_count,
-                COUNT(DISTINCT stay_id) as unique_stays
-            FROM {schema}.{table_name}
-        """)
-        result = cursor.fetchone()
-        return {'row_count': result[0], 'unique_stays': result[1]}
-    except:
-        cursor.execute(f"SELECT COUNT(*) FROM {schema}.{table_name}")
-        result = cursor.fetchone()
-        return {'row_count': result[0], 'unique_stays': None}
+        cursor.execute(f"ANALYZE {schema}.{table_name}")
+        conn.commit()
+    except psycopg2.Error:
+        conn.rollback()
     finally:
         cursor.close()
 
+    try:
+        counts = count_rows(f"{schema}.{table_name}", mode=mode, distinct='stay_id')
+    except (psycopg2.Error, ValueError):
+        counts = count_rows(f"{schema}.{table_name}", mode=mode)
+    return {'row_count': counts.rows, 'unique_stays': counts.approx_distinct}
+
 
 def drop_table_if_exists(conn, schema, table_name):
     """Drop table if it exists"""
@@ -217,9 +210,9 @@ def main():
             # Get table stats
             try:
                 stats = get_table_stats(conn, schema, table_name)
-                print(f"📊 Table created with {stats['row_count']:,} rows", end="")
+                print(f"📊 Table created with ~{stats['row_count']:,} rows", end="")
                 if stats['unique_stays']:
-                    print(f" ({stats['unique_stays']:,} unique ICU stays)")
+                    print(f" (~{stats['unique_stays']:,} unique ICU stays)")
                 else:
                     print()
 
@@ -8,13 +8,15 @@ This script explores the complete MIMIC-IV dataset structure including:
 - Table row counts
 - Table column information
 - Sample data from key tables
+
+Independent catalog queries run concurrently (utils.db_helper.query_many).
 """
 
 import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from utils.db_helper import query_to_df
+from utils.db_helper import query_many
 import pandas as pd
 
 pd.set_option('display.max_columns', None)
@@ -27,13 +29,8 @@ print("=" * 80)
 print()
 
 # ============================================================================
-# 1. Discover all schemas
+# 0. Run the independent catalog queries concurrently
 # ============================================================================
-print("=" * 80)
-print("STEP 1: Discover All Schemas")
-print("=" * 80)
-print()
-
 schemas_sql = """
 SELECT
     table_schema as schema_name,
@@ -45,7 +42,64 @@ GROUP BY table_schema
 ORDER BY table_schema;
 """
 
-schemas_df = query_to_df(schemas_sql, db='mimic')
+tables_sql = """
+SELECT
+    table_schema,
+    table_name,
+    pg_size_pretty(pg_total_relation_size('"' || table_schema || '"."' || table_name || '"')) as size
+FROM information_schema.tables
+WHERE table_schema NOT IN ('pg_catalog', 'information_schema')
+  AND table_type = 'BASE TABLE'
+ORDER BY table_schema, table_name;
+"""
+
+# This query gets approximate row counts quickly
+rowcount_sql = """
+SELECT
+    schemaname as schema_name,
+    relname as table_name,
+    n_live_tup as approximate_rows
+FROM pg_stat_user_tables
+ORDER BY schemaname, relname;
+"""
+
+fk_sql = """
+SELECT
+    tc.table_schema,
+    tc.table_name,
+    kcu.column_name,
+    ccu.table_schema AS foreign_table_schema,
+    ccu.table_name AS foreign_table_name,
+    ccu.column_name AS foreign_column_name
+FROM information_schema.table_constraints AS tc
+JOIN information_schema.key_column_usage AS kcu
+    ON tc.constraint_name = kcu.constraint_name
+    AND tc.table_schema = kcu.table_schema
+JOIN information_schema.constraint_column_usage AS ccu
+    ON ccu.constraint_name = tc.constraint_name
+WHERE tc.constraint_type = 'FOREIGN KEY'
+  AND tc.table_schema NOT IN ('pg_catalog', 'information_schema')
+ORDER BY tc.table_schema, tc.table_name, kcu.column_name;
+"""
+
+catalog = {
+    r.label: r.df for r in query_many({
+        'schemas': schemas_sql,
+        'tables': tables_sql,
+        'rowcounts': rowcount_sql,
+        'foreign_keys': fk_sql,
+    }, db='mimic', concurrency=4, raise_errors=True)
+}
+
+# ============================================================================
+# 1. Discover all schemas
+# ============================================================================
+print("=" * 80)
+print("STEP 1: Discover All Schemas")
+print("=" * 80)
+print()
+
+schemas_df = catalog['schemas']
 print("📊 Available Schemas:")
 print(schemas_df.to_string(index=False))
 print()
@@ -58,18 +112,7 @@ print("STEP 2: All Tables Across All Schemas")
 print("=" * 80)
 print()
 
-tables_sql = """
-SELECT
-    table_schema,
-    table_name,
-    pg_size_pretty(pg_total_relation_size('"' || table_schema || '"."' || table_name || '"')) as size
-FROM information_schema.tables
-WHERE table_schema NOT IN ('pg_catalog', 'information_schema')
-  AND table_type = 'BASE TABLE'
-ORDER BY table_schema, table_name;
-"""
-
-tables_df = query_to_df(tables_sql, db='mimic')
+tables_df = catalog['tables']
 print(f"📋 Total Tables Found: {len(tables_df)}")
 print()
 
@@ -89,17 +132,7 @@ print("STEP 3: Table Row Counts")
 print("=" * 80)
 print()
 
-# This query gets approximate row counts quickly
-rowcount_sql = """
-SELECT
-    schemaname as schema_name,
-    relname as table_name,
-    n_live_tup as approximate_rows
-FROM pg_stat_user_tables
-ORDER BY schemaname, relname;
-"""
-
-rowcount_df = query_to_df(rowcount_sql, db='mimic')
+rowcount_df = catalog['rowcounts']
 print("📊 Table Row Counts (Approximate):")
 print()
 
@@ -132,6 +165,7 @@ key_tables = [
     ('mimiciv_icu', 'd_items'),
 ]
 
+existing_tables = []
 for schema, table in key_tables:
     # Check if table exists
     table_exists = ((tables_df['table_schema'] == schema) &
@@ -140,10 +174,11 @@ for schema, table in key_tables:
     if not table_exists:
         print(f"⚠️  Table {schema}.{table} not found")
         continue
+    existing_tables.append((schema, table))
 
-    print(f"\n--- Table: {schema}.{table} ---")
-
-    # Get column information
+# Column information and sample rows for every key table, fetched concurrently
+structure_queries = []
+for schema, table in existing_tables:
     columns_sql = f"""
     SELECT
         column_name,
@@ -155,19 +190,29 @@ for schema, table in key_tables:
       AND table_name = '{table}'
     ORDER BY ordinal_position;
     """
+    sample_sql = f"SELECT * FROM {schema}.{table} LIMIT 3;"
+    structure_queries.append((f"{schema}.{table} columns", columns_sql))
+    structure_queries.append((f"{schema}.{table} sample", sample_sql))
+
+structure_results = query_many(structure_queries, db='mimic', concurrency=8)
+
+for i, (schema, table) in enumerate(existing_tables):
+    columns_result = structure_results[2 * i]
+    sample_result = structure_results[2 * i + 1]
 
-    columns_df = query_to_df(columns_sql, db='mimic')
+    print(f"\n--- Table: {schema}.{table} ---")
+
+    if columns_result.error is not None:
+        raise columns_result.error
     print("\n📋 Columns:")
-    print(columns_df.to_string(index=False))
+    print(columns_result.df.to_string(index=False))
 
     # Get sample data
-    sample_sql = f"SELECT * FROM {schema}.{table} LIMIT 3;"
-    try:
-        sample_df = query_to_df(sample_sql, db='mimic')
+    if sample_result.error is None:
         print(f"\n📊 Sample Data (first 3 rows):")
-        print(sample_df.to_string(index=False))
-    except Exception as e:
-        print(f"⚠️  Could not retrieve sample data: {e}")
+        print(sample_result.df.to_string(index=False))
+    else:
+        print(f"⚠️  Could not retrieve sample data: {sample_result.error}")
 
     print()
 
@@ -179,27 +224,8 @@ print("STEP 5: Table Relationships")
 print("=" * 80)
 print()
 
-# Get foreign key constraints
-fk_sql = """
-SELECT
-    tc.table_schema,
-    tc.table_name,
-    kcu.column_name,
-    ccu.table_schema AS foreign_table_schema,
-    ccu.table_name AS foreign_table_name,
-    ccu.column_name AS foreign_column_name
-FROM information_schema.table_constraints AS tc
-JOIN information_schema.key_column_usage AS kcu
-    ON tc.constraint_name = kcu.constraint_name
-    AND tc.table_schema = kcu.table_schema
-JOIN information_schema.constraint_column_usage AS ccu
-    ON ccu.constraint_name = tc.constraint_name
-WHERE tc.constraint_type = 'FOREIGN KEY'
-  AND tc.table_schema NOT IN ('pg_catalog', 'information_schema')
-ORDER BY tc.table_schema, tc.table_name, kcu.column_name;
-"""
-
-fk_df = query_to_df(fk_sql, db='mimic')
+# Foreign key constraints (fetched with the catalog queries above)
+fk_df = catalog['foreign_keys']
 
 if len(fk_df) > 0:
     print("🔗 Foreign Key Relationships:")
@@ -1,13 +1,16 @@
 """
 Get Actual Row Counts for Key MIMIC-IV Tables
 ==============================================
+
+All COUNT(*) queries run concurrently over the db_helper connection pool,
+so the total time is close to the slowest single table (chartevents).
 """
 
 import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from utils.db_helper import query_to_df
+from utils.db_helper import query_many
 import pandas as pd
 
 print("=" * 80)
@@ -44,32 +47,51 @@ key_tables = {
     ]
 }
 
+# Concurrency: number of tables counted at the same time
+CONCURRENCY = int(os.environ.get('ROW_COUNT_CONCURRENCY', 8))
+
+queries = [
+    ((category, schema, table), f"SELECT COUNT(*) as count FROM {schema}.{table};")
+    for category, tables in key_tables.items()
+    for schema, table in tables
+]
+query_results = query_many(
+    [(f"{schema}.{table}", sql) for (_, schema, table), sql in queries],
+    db='mimic', concurrency=CONCURRENCY, verbose=False
+)
+
 results = []
+current_category = None
+
+for ((category, schema, table), _), result in zip(queries, query_results):
+    if category != current_category:
+        current_category = category
+        print(f"\n{category}:")
+        print("-" * 60)
 
-for category, tables in key_tables.items():
-    print(f"\n{category}:")
-    print("-" * 60)
+    if result.error is None:
+        count = result.df.iloc[0]['count']
+        results.append({
+            'Category': category,
+            'Schema': schema,
+            'Table': table,
+            'Row Count': f"{count:,}",
+            'Seconds': f"{result.seconds:.1f}"
+        })
+        print(f"  {schema}.{table:30s}: {count:,}  ({result.seconds:.1f}s)")
+    else:
+        print(f"  {schema}.{table:30s}: ERROR - {result.error}")
+        results.append({
+            'Category': category,
+            'Schema': schema,
+            'Table': table,
+            'Row Count': 'ERROR',
+            'Seconds': f"{result.seconds:.1f}"
+        })
 
-    for schema, table in tables:
-        try:
-            sql = f"SELECT COUNT(*) as count FROM {schema}.{table};"
-            df = query_to_df(sql, db='mimic')
-            count = df.iloc[0]['count']
-            results.append({
-                'Category': category,
-                'Schema': schema,
-                'Table': table,
-                'Row Count': f"{count:,}"
-            })
-            print(f"  {schema}.{table:30s}: {count:,}")
-        except Exception as e:
-            print(f"  {schema}.{table:30s}: ERROR - {e}")
-            results.append({
-                'Category': category,
-                'Schema': schema,
-                'Table': table,
-                'Row Count': 'ERROR'
-            })
+serial = sum(r.seconds for r in query_results)
+slowest = max(query_results, key=lambda r: r.seconds)
+print(f"\nSerial time would be {serial:.1f}s; slowest table {slowest.label} took {slowest.seconds:.1f}s")
 
 print()
 print("=" * 80)
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Replay MIMIC-IV source tables as one time-ordered event stream
+==============================================================
+
+Feeds the online SOFA-2 scorer (utils/sofa2_online.py) with the same inputs
+the batch pipeline (sofa2_sql/02) reads, so the streaming path can be load
+tested against real data before it goes anywhere near a bedside.
+
+- Each source table is read through its own server-side (named) cursor,
+  sorted by event time in PostgreSQL.
+- The per-table streams are k-way merged with heapq.merge, so memory stays
+  O(k * itersize) however many events are replayed.
+- Events are paced at a configurable speed-up factor (0 = as fast as possible).
+- Reports throughput and end-to-end per-event latency percentiles. Latency is
+  measured from an event's scheduled wall-clock release to the moment the
+  scorer has consumed it and emitted any hours it closed.
+
+Usage:
+    python scripts/replay_sofa2_events.py --stays 500
+    python scripts/replay_sofa2_events.py --stays 5000 --speedup 3600
+    python scripts/replay_sofa2_events.py --stay-ids 30000153,30000646 --show-scores
+"""
+
+import argparse
+import heapq
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+
+from utils.db_helper import get_connection
+from utils.sofa2_online import Sofa2Event, Sofa2StayRegistry
+
+# Interval-start events sort before point events at the same timestamp, so a
+# GCS charted at the exact start of a sedation infusion counts as sedated.
+INTERVAL_KINDS = ('sedation', 'delirium', 'ventilation', 'vasoactive')
+
+# Restrict per-stay source rows to the span the hourly grid can see:
+# 48h lab lookback before hr=-24 through ICU discharge.
+STAY_SPAN = """
+    c.charttime >= s.intime - INTERVAL '73 hours'
+    AND c.charttime <= s.outtime
+"""
+
+# kind -> SQL returning (stay_id, event_time, <data columns...>) ordered by time,
+# restricted to the replayed stays via the `stays` temp table (see load_stays).
+SOURCES = {
+    'sedation': """
+        SELECT c.stay_id, c.starttime AS event_time, c.endtime
+        FROM mimiciv_icu.inputevents c
+        JOIN stays s ON s.stay_id = c.stay_id
+        WHERE c.itemid IN (222168, 221668, 229420, 225150, 221385, 221712, 221756, 225156)
+          AND c.amount > 0
+        ORDER BY c.starttime
+    """,
+    'delirium': """
+        SELECT s.stay_id, c.starttime AS event_time, c.stoptime
+        FROM mimiciv_hosp.prescriptions c
+        JOIN stays s ON s.hadm_id = c.hadm_id
+        WHERE (c.drug ILIKE '%haloperidol%'
+               OR c.drug ILIKE '%quetiapine%' OR c.drug ILIKE '%seroquel%'
+               OR c.drug ILIKE '%olanzapine%' OR c.drug ILIKE '%zyprexa%'
+               OR c.drug ILIKE '%risperidone%' OR c.drug ILIKE '%risperdal%'
+               OR c.drug ILIKE '%ziprasidone%' OR c.drug ILIKE '%geodon%'
+               OR c.drug ILIKE '%clozapine%'
+               OR c.drug ILIKE '%aripiprazole%' OR c.drug ILIKE '%abilify%')
+          AND c.drug NOT ILIKE '%TOPICAL%'
+          AND c.starttime IS NOT NULL
+          AND c.starttime <= s.outtime
+        ORDER BY c.starttime
+    """,
+    'gcs': """
+        SELECT c.stay_id, c.charttime AS event_time, c.gcs, c.gcs_motor, c.gcs_unable
+        FROM mimiciv_derived.gcs c
+        JOIN stays s ON s.stay_id = c.stay_id
+        ORDER BY c.charttime
+    """,
+    'ventilation': """
+        SELECT c.stay_id, c.starttime AS event_time, c.endtime, c.ventilation_status
+        FROM mimiciv_derived.ventilation c
+        JOIN stays s ON s.stay_id = c.stay_id
+        ORDER BY c.starttime
+    """,
+    'mech': """
+        SELECT c.stay_id, c.charttime AS event_time, c.itemid, c.value
+        FROM mimiciv_icu.chartevents c
+        JOIN stays s ON s.stay_id = c.stay_id
+        WHERE c.itemid IN (
+            224660, 229270, 229277, 229280, 229278, 229363, 229364, 229365, 228193,
+            229268,
+            224322, 227980, 225980, 228866,
+            228154, 229671, 229897, 229898, 229899, 229900,
+            220125, 220128, 229254, 229262, 229255, 229263
+        )
+        ORDER BY c.charttime
+    """,
+    'fio2': """
+        SELECT c.stay_id, c.charttime AS event_time, c.valuenum AS fio2
+        FROM mimiciv_icu.chartevents c
+        JOIN stays s ON s.stay_id = c.stay_id
+        WHERE c.itemid = 223835 AND c.valuenum > 0
+        ORDER BY c.charttime
+    """,
+    'spo2': """
+        SELECT c.stay_id, c.charttime AS event_time, c.valuenum AS spo2
+        FROM mimiciv_icu.chartevents c
+        JOIN stays s ON s.stay_id = c.stay_id
+        WHERE c.itemid = 220277 AND c.valuenum > 0 AND c.valuenum <= 100
+        ORDER BY c.charttime
+    """,
+    'bg': f"""
+        SELECT s.stay_id, c.charttime AS event_time,
+               c.potassium, c.ph, c.bicarbonate, c.fio2, c.po2, c.specimen
+        FROM mimiciv_derived.bg c
+        JOIN stays s ON s.subject_id = c.subject_id
+        WHERE {STAY_SPAN}
+        ORDER BY c.charttime
+    """,
+    'vitals': """
+        SELECT c.stay_id, c.charttime AS event_time, c.mbp
+        FROM mimiciv_derived.vitalsign c
+        JOIN stays s ON s.stay_id = c.stay_id
+        WHERE c.mbp IS NOT NULL
+        ORDER BY c.charttime
+    """,
+    'vasoactive': """
+        SELECT c.stay_id, c.starttime AS event_time, c.endtime,
+               c.norepinephrine, c.epinephrine, c.dopamine, c.dobutamine,
+               c.vasopressin, c.phenylephrine, c.milrinone
+        FROM mimiciv_derived.vasoactive_agent c
+        JOIN stays s ON s.stay_id = c.stay_id
+        ORDER BY c.starttime
+    """,
+    'chemistry': f"""
+        SELECT s.stay_id, c.charttime AS event_time,
+               c.creatinine, c.potassium, c.bicarbonate
+        FROM mimiciv_derived.chemistry c
+        JOIN stays s ON s.subject_id = c.subject_id
+        WHERE {STAY_SPAN}
+        ORDER BY c.charttime
+    """,
+    'rrt': """
+        SELECT c.stay_id, c.charttime AS event_time, c.dialysis_present, c.dialysis_active
+        FROM mimiciv_derived.rrt c
+        JOIN stays s ON s.stay_id = c.stay_id
+        ORDER BY c.charttime
+    """,
+    'urine': """
+        SELECT c.stay_id, c.charttime AS event_time, c.urineoutput
+        FROM mimiciv_derived.urine_output c
+        JOIN stays s ON s.stay_id = c.stay_id
+        ORDER BY c.charttime
+    """,
+    'platelet': f"""
+        SELECT s.stay_id, c.charttime AS event_time, c.platelet
+        FROM mimiciv_derived.complete_blood_count c
+        JOIN stays s ON s.hadm_id = c.hadm_id
+        WHERE c.platelet IS NOT NULL AND {STAY_SPAN}
+        ORDER BY c.charttime
+    """,
+    'bilirubin': f"""
+        SELECT s.stay_id, c.charttime AS event_time, c.bilirubin_total
+        FROM mimiciv_derived.enzyme c
+        JOIN stays s ON s.hadm_id = c.hadm_id
+        WHERE c.bilirubin_total IS NOT NULL AND {STAY_SPAN}
+        ORDER BY c.charttime
+    """,
+}
+
+# Same five-level weight fallback as sofa2_sql/02 (2.11), already materialised
+# per hour in sofa2_stage1_urine.
+STAYS_SQL = """
+    SELECT ie.stay_id, ie.subject_id, ie.hadm_id, ie.intime, ie.outtime,
+           (SELECT MAX(u.weight) FROM mimiciv_derived.sofa2_stage1_urine u
+            WHERE u.stay_id = ie.stay_id) AS weight
+    FROM mimiciv_icu.icustays ie
+    WHERE ie.intime IS NOT NULL AND ie.outtime IS NOT NULL
+      {filter}
+    ORDER BY ie.intime
+    {limit}
+"""
+
+
+def load_stays(conn, n_stays=None, stay_ids=None):
+    """Select the replayed stays and publish them as a temp table for the source queries."""
+    params = []
+    where = ''
+    if stay_ids:
+        where = 'AND ie.stay_id = ANY(%s)'
+        params.append(list(stay_ids))
+    limit = f'LIMIT {int(n_stays)}' if n_stays else ''
+
+    with conn.cursor() as cur:
+        cur.execute(STAYS_SQL.format(filter=where, limit=limit), params)
+        stays = cur.fetchall()
+        # Pooled connections outlive one replay; drop any previous temp table
+        cur.execute("DROP TABLE IF EXISTS pg_temp.stays")
+        cur.execute("""
+            CREATE TEMP TABLE stays (
+                stay_id INTEGER PRIMARY KEY, subject_id INTEGER, hadm_id INTEGER,
+                intime TIMESTAMP, outtime TIMESTAMP
+            ) ON COMMIT PRESERVE ROWS
+        """)
+        cur.executemany(
+            "INSERT INTO stays VALUES (%s, %s, %s, %s, %s)",
+            [row[:5] for row in stays]
+        )
+        cur.execute("ANALYZE stays")
+    conn.commit()
+    return stays
+
+
+def stream_source(conn, kind, itersize):
+    """Yield (event_time, order, stay_id, Sofa2Event) from one server-side cursor."""
+    order = 0 if kind in INTERVAL_KINDS else 1
+    cur = conn.cursor(name=f'replay_{kind}')
+    cur.itersize = itersize
+    cur.execute(SOURCES[kind])
+    columns = None
+    for row in cur:
+        if columns is None:
+            columns = [d[0] for d in cur.description][2:]
+        event_time = row[1]
+        if event_time is None:
+            continue
+        yield event_time, order, row[0], Sofa2Event(event_time, kind, dict(zip(columns, row[2:])))
+    cur.close()
+
+
+def merged_events(conn, kinds, itersize):
+    """k-way merge of the per-table sorted streams."""
+    streams = [stream_source(conn, kind, itersize) for kind in kinds]
+    return heapq.merge(*streams, key=lambda item: (item[0], item[1]))
+
+
+def replay(conn, stays, kinds, speedup=0.0, itersize=5000, show_scores=False, progress_every=100000):
+    registry = Sofa2StayRegistry()
+    for stay_id, _, _, intime, outtime, weight in stays:
+        registry.add_stay(stay_id, intime, float(weight) if weight is not None else None, outtime=outtime)
+
+    latencies = []
+    kind_counts = {kind: 0 for kind in kinds}
+    n_hours = 0
+    first_event_time = None
+    wall_start = time.perf_counter()
+
+    for event_time, _, stay_id, event in merged_events(conn, kinds, itersize):
+        if first_event_time is None:
+            first_event_time = event_time
+
+        scheduled = wall_start
+        if speedup > 0:
+            scheduled += (event_time - first_event_time).total_seconds() / speedup
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        else:
+            scheduled = time.perf_counter()
+
+        rows = registry.push(stay_id, event)
+        latencies.append(time.perf_counter() - scheduled)
+
+        kind_counts[event.kind] += 1
+        n_hours += len(rows)
+        if show_scores:
+            for r in rows:
+                print(f"  stay {r.stay_id} hr {r.hr:>4} {r.endtime}  SOFA2={r.sofa2_total} "
+                      f"(B{r.brain} R{r.respiratory} C{r.cardiovascular} "
+                      f"L{r.liver} K{r.kidney} H{r.hemostasis})")
+        if progress_every and len(latencies) % progress_every == 0:
+            elapsed = time.perf_counter() - wall_start
+            print(f"  ... {len(latencies):,} events, {len(latencies) / elapsed:,.0f} events/s")
+
+    for stay_id in list(registry.scorers):
+        n_hours += len(registry.discharge(stay_id))
+
+    elapsed = time.perf_counter() - wall_start
+    return {
+        'events': len(latencies),
+        'hours': n_hours,
+        'elapsed': elapsed,
+        'kind_counts': kind_counts,
+        'latencies': np.asarray(latencies),
+    }
+
+
+def print_report(result, speedup):
+    events = result['events']
+    elapsed = result['elapsed']
+    print("\n" + "=" * 70)
+    print("  Replay Summary")
+    print("=" * 70)
+    print(f"Events replayed:   {events:,}")
+    print(f"Hours scored:      {result['hours']:,}")
+    print(f"Wall time:         {elapsed:.2f}s (speed-up: {'max' if speedup <= 0 else f'{speedup:g}x'})")
+    if elapsed > 0:
+        print(f"Throughput:        {events / elapsed:,.0f} events/s")
+
+    print("\nEvents by source:")
+    for kind, count in sorted(result['kind_counts'].items(), key=lambda x: -x[1]):
+        print(f"  {kind:<12} {count:>12,}")
+
+    if events:
+        lat_ms = result['latencies'] * 1000
+        p50, p95, p99, p999 = np.percentile(lat_ms, [50, 95, 99, 99.9])
+        print("\nEnd-to-end latency (ms):")
+        print(f"  p50 {p50:.3f}  p95 {p95:.3f}  p99 {p99:.3f}  p99.9 {p999:.3f}  max {lat_ms.max():.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay MIMIC-IV events through the online SOFA-2 scorer")
+    parser.add_argument('--stays', type=int, default=500, help="Number of stays to replay (earliest intime first)")
+    parser.add_argument('--stay-ids', type=str, help="Comma-separated stay_ids (overrides --stays)")
+    parser.add_argument('--speedup', type=float, default=0.0,
+                        help="Replay speed relative to real time (0 = as fast as possible)")
+    parser.add_argument('--sources', type=str, default=','.join(SOURCES),
+                        help="Comma-separated event sources to replay")
+    parser.add_argument('--itersize', type=int, default=5000, help="Rows fetched per server-side cursor round trip")
+    parser.add_argument('--show-scores', action='store_true', help="Print every emitted hourly score")
+    args = parser.parse_args()
+
+    kinds = [k.strip() for k in args.sources.split(',') if k.strip()]
+    unknown = [k for k in kinds if k not in SOURCES]
+    if unknown:
+        parser.error(f"unknown sources: {', '.join(unknown)}")
+
+    print("=" * 70)
+    print("  SOFA-2 Event Replay")
+    print("=" * 70)
+
+    conn = get_connection()
+    try:
+        stay_ids = [int(s) for s in args.stay_ids.split(',')] if args.stay_ids else None
+        stays = load_stays(conn, n_stays=None if stay_ids else args.stays, stay_ids=stay_ids)
+        print(f"Replaying {len(stays):,} stays from {len(kinds)} sources...")
+        result = replay(conn, stays, kinds, speedup=args.speedup,
+                        itersize=args.itersize, show_scores=args.show_scores)
+        print_report(result, args.speedup)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
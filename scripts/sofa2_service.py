@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+SOFA-2 Trajectory Service
+=========================
+
+A small asyncio HTTP service for dashboards that need one stay at a time.
+It replaces ad-hoc query_to_df() calls, which build a new engine for every
+request.
+
+Endpoints (GET, JSON):
+    /stays/{stay_id}              trajectory + first_day + sepsis in one document
+    /stays/{stay_id}/trajectory   hourly mimiciv_derived.sofa2_scores rows
+    /stays/{stay_id}/first_day    mimiciv_derived.first_day_sofa2 row (or null)
+    /stays/{stay_id}/sepsis       mimiciv_derived.sepsis3_sofa2_delta row (or null)
+    /health                       liveness + current manifest version
+    /stats                        cache hit rate and request latency percentiles
+
+Performance design:
+- asyncpg connection pool. Each connection caches its prepared statements, so
+  the per-stay query is parsed and planned once per connection.
+- One round trip per cold stay. PostgreSQL builds all three JSON fragments
+  (json_agg / row_to_json), and the service caches the encoded bytes without
+  re-serialising them.
+- LRU cache of per-stay documents. Concurrent cold requests for the same stay
+  share a single in-flight query.
+- The cache is invalidated when the pipeline manifest changes. The manifest is
+  a fingerprint of the served tables: relfilenode and pg_stat insert, update
+  and delete counters. Re-running any pipeline stage (DROP + CREATE TABLE AS,
+  or UPDATE) changes it, and a background task polls it every few seconds.
+  A new relfilenode is visible as soon as its transaction commits. The
+  pg_stat counters only appear after the writing session goes idle or
+  disconnects; run_steps.sh runs each stage in its own psql session.
+
+Requires asyncpg (pip install asyncpg).
+
+Usage:
+    python scripts/sofa2_service.py --port 8765
+    curl http://localhost:8765/stays/30000153
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import sys
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.db_helper import DB_CONFIG
+
+try:
+    import asyncpg
+except ImportError:  # pragma: no cover - optional dependency
+    asyncpg = None
+
+SERVED_TABLES = ('sofa2_scores', 'first_day_sofa2', 'sepsis3_sofa2_delta')
+
+STAY_SQL = """
+SELECT
+    (SELECT COALESCE(json_agg(t ORDER BY t.hr), '[]'::json)
+     FROM (
+         SELECT hr, starttime, endtime, brain, respiratory, cardiovascular,
+                liver, kidney, hemostasis, sofa2_total
+         FROM mimiciv_derived.sofa2_scores
+         WHERE stay_id = $1
+     ) t)::text AS trajectory,
+    (SELECT row_to_json(f)
+     FROM (
+         SELECT brain, respiratory, cardiovascular, liver, kidney, hemostasis, sofa2_total
+         FROM mimiciv_derived.first_day_sofa2
+         WHERE stay_id = $1
+         LIMIT 1
+     ) f)::text AS first_day,
+    (SELECT row_to_json(s)
+     FROM (
+         SELECT suspected_infection_time, antibiotic, antibiotic_time, culture_time,
+                sofa_time, sofa2_score, baseline_sofa2, delta_sofa2,
+                brain, respiratory, cardiovascular, liver, kidney, hemostasis
+         FROM mimiciv_derived.sepsis3_sofa2_delta
+         WHERE stay_id = $1
+         LIMIT 1
+     ) s)::text AS sepsis
+"""
+
+MANIFEST_SQL = """
+SELECT c.relname, c.relfilenode,
+       COALESCE(st.n_tup_ins, 0), COALESCE(st.n_tup_upd, 0), COALESCE(st.n_tup_del, 0)
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_stat_user_tables st ON st.relid = c.oid
+WHERE n.nspname = 'mimiciv_derived'
+  AND c.relname = ANY($1::text[])
+ORDER BY c.relname
+"""
+
+ROUTE = re.compile(r'^/stays/(\d+)(?:/(trajectory|first_day|sepsis))?/?$')
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class StayCache:
+    """LRU cache: stay_id -> (trajectory, first_day, sepsis) as encoded JSON bytes."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, stay_id):
+        entry = self.entries.get(stay_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(stay_id)
+        self.hits += 1
+        return entry
+
+    def put(self, stay_id, entry):
+        self.entries[stay_id] = entry
+        self.entries.move_to_end(stay_id)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class Sofa2Service:
+    def __init__(self, db='mimic', cache_size=10000, pool_min=4, pool_max=20, poll_interval=5.0):
+        self.db = db
+        self.cache = StayCache(cache_size)
+        self.pool_min = pool_min
+        self.pool_max = pool_max
+        self.poll_interval = poll_interval
+        self.pool = None
+        self.manifest = None
+        self.manifest_version = 0
+        self.inflight = {}
+        self.latencies = deque(maxlen=10000)
+        self._watcher = None
+
+    async def start(self):
+        config = DB_CONFIG[self.db]
+        self.pool = await asyncpg.create_pool(
+            host=config['host'],
+            port=config['port'],
+            database=config['database'],
+            user=config['user'],
+            password=config['password'],
+            min_size=self.pool_min,
+            max_size=self.pool_max,
+        )
+        self.manifest = await self._read_manifest()
+        self._watcher = asyncio.create_task(self._watch_manifest())
+
+    async def close(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+        if self.pool is not None:
+            await self.pool.close()
+
+    # ------------------------------------------------------------------
+    # Manifest-based invalidation
+    # ------------------------------------------------------------------
+
+    async def _read_manifest(self):
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(MANIFEST_SQL, list(SERVED_TABLES))
+        return tuple(tuple(row) for row in rows)
+
+    async def _watch_manifest(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                manifest = await self._read_manifest()
+            except Exception as e:
+                print(f"manifest poll failed: {e}", file=sys.stderr)
+                continue
+            if manifest != self.manifest:
+                self.manifest = manifest
+                self.manifest_version += 1
+                self.cache.clear()
+                print(f"pipeline manifest changed -> cache cleared (version {self.manifest_version})")
+
+    # ------------------------------------------------------------------
+    # Per-stay lookup
+    # ------------------------------------------------------------------
+
+    async def get_stay(self, stay_id):
+        entry = self.cache.get(stay_id)
+        if entry is not None:
+            return entry
+
+        # Coalesce concurrent cold requests for the same stay into one query
+        future = self.inflight.get(stay_id)
+        if future is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise               # this waiter itself was cancelled
+                # The leading request was cancelled (e.g. client disconnect): retry
+                return await self.get_stay(stay_id)
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[stay_id] = future
+        version = self.manifest_version
+        try:
+            async with self.pool.acquire() as conn:
+                row = await conn.fetchrow(STAY_SQL, stay_id)
+            entry = tuple(
+                (value if value is not None else 'null').encode()
+                for value in (row['trajectory'], row['first_day'], row['sepsis'])
+            )
+            # Results read across a manifest change may mix old and new tables
+            if version == self.manifest_version:
+                self.cache.put(stay_id, entry)
+            future.set_result(entry)
+            return entry
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters retrieve the exception; avoid "never retrieved" warnings
+            future.exception()
+            raise
+        finally:
+            # Cancellation (a BaseException) skips the handler above; release waiters anyway
+            if not future.done():
+                future.cancel()
+            del self.inflight[stay_id]
+
+    async def route(self, path):
+        if path == '/health':
+            return 200, json.dumps({'status': 'ok', 'manifest_version': self.manifest_version}).encode()
+        if path == '/stats':
+            return 200, json.dumps(self.stats()).encode()
+
+        match = ROUTE.match(path)
+        if match is None:
+            return 404, b'{"error": "not found"}'
+        stay_id = int(match.group(1))
+        part = match.group(2)
+
+        trajectory, first_day, sepsis = await self.get_stay(stay_id)
+        if part == 'trajectory':
+            return 200, trajectory
+        if part == 'first_day':
+            return 200, first_day
+        if part == 'sepsis':
+            return 200, sepsis
+        if trajectory == b'[]' and first_day == b'null':
+            return 404, b'{"error": "unknown stay_id"}'
+        return 200, b''.join((
+            b'{"stay_id": ', str(stay_id).encode(),
+            b', "trajectory": ', trajectory,
+            b', "first_day": ', first_day,
+            b', "sepsis": ', sepsis, b'}'
+        ))
+
+    def stats(self):
+        lookups = self.cache.hits + self.cache.misses
+        result = {
+            'cache_entries': len(self.cache.entries),
+            'cache_hits': self.cache.hits,
+            'cache_misses': self.cache.misses,
+            'hit_rate': round(self.cache.hits / lookups, 4) if lookups else None,
+            'manifest_version': self.manifest_version,
+            'inflight': len(self.inflight),
+        }
+        if self.latencies:
+            ordered = sorted(self.latencies)
+            for q in (50, 95, 99):
+                idx = min(len(ordered) - 1, int(len(ordered) * q / 100))
+                result[f'p{q}_ms'] = round(ordered[idx] * 1000, 3)
+        return result
+
+    # ------------------------------------------------------------------
+    # Minimal HTTP/1.1 (keep-alive) on asyncio streams
+    # ------------------------------------------------------------------
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                started = time.perf_counter()
+                parts = request_line.decode('latin-1').split()
+                if len(parts) < 3:
+                    status, body = 400, b'{"error": "bad request"}'
+                elif parts[0] != 'GET':
+                    status, body = 405, b'{"error": "method not allowed"}'
+                else:
+                    try:
+                        status, body = await self.route(parts[1].split('?', 1)[0])
+                    except (OSError, asyncpg.PostgresError) as e:
+                        status, body = 503, json.dumps({'error': str(e)}).encode()
+                    except Exception as e:
+                        status, body = 500, json.dumps({'error': str(e)}).encode()
+
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+                    + body
+                )
+                await writer.drain()
+                self.latencies.append(time.perf_counter() - started)
+                if not keep_alive:
+                    break
+        except (ConnectionResetError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(args):
+    service = Sofa2Service(
+        db=args.db,
+        cache_size=args.cache_size,
+        pool_min=args.pool_min,
+        pool_max=args.pool_max,
+        poll_interval=args.poll_interval,
+    )
+    await service.start()
+    server = await asyncio.start_server(service.handle_client, args.host, args.port, backlog=1024)
+    print(f"SOFA-2 service listening on http://{args.host}:{args.port} "
+          f"(pool {args.pool_min}-{args.pool_max}, cache {args.cache_size} stays)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve SOFA-2 trajectories over HTTP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--db', default='mimic', choices=sorted(DB_CONFIG))
+    parser.add_argument('--cache-size', type=int, default=10000, help="Max stays kept in the LRU cache")
+    parser.add_argument('--pool-min', type=int, default=4)
+    parser.add_argument('--pool-max', type=int, default=20)
+    parser.add_argument('--poll-interval', type=float, default=5.0,
+                        help="Seconds between pipeline manifest checks")
+    args = parser.parse_args()
+
+    if asyncpg is None:
+        print("asyncpg is required: pip install asyncpg", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        print("\nShutting down.")
+
+
+if __name__ == "__main__":
+    main()
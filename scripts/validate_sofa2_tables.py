@@ -1,27 +1,20 @@
 #!/usr/bin/env python3
 """
 Validate SOFA-2 tables after creation
+
+Row and stay counts come from a block sample by default so validation takes
+seconds rather than a full scan of each table; pass --exact for full counts.
 """
 
+import argparse
 import sys
 from pathlib import Path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-from utils.db_helper import DB_CONFIG
-import psycopg2
-
-def get_connection():
-    config = DB_CONFIG['mimic']
-    return psycopg2.connect(
-        host=config['host'],
-        port=config['port'],
-        database=config['database'],
-        user=config['user'],
-        password=config['password']
-    )
+from utils.db_helper import get_connection, count_rows
 
-def check_table(cursor, table_name):
+def check_table(cursor, table_name, mode='sample'):
     """Check if table exists and get statistics"""
     try:
         # Check if table exists
@@ -36,13 +29,13 @@ def check_table(cursor, table_name):
         if not exists:
             return {'exists': False}
 
-        # Get row count
-        cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-        row_count = cursor.fetchone()[0]
-
-        # Get unique stay_ids
-        cursor.execute(f"SELECT COUNT(DISTINCT stay_id) FROM {table_name}")
-        unique_stays = cursor.fetchone()[0]
+        # Row count is estimated unless mode='exact'; unique stay_ids are always approximate
+        if mode != 'exact':
+            cursor.execute(f"ANALYZE {table_name}")
+            cursor.connection.commit()
+        counts = count_rows(table_name, mode=mode, distinct='stay_id')
+        row_count = counts.rows
+        unique_stays = counts.approx_distinct
 
         # Get sample of columns
         cursor.execute(f"""
@@ -63,7 +56,16 @@ def check_table(cursor, table_name):
     except Exception as e:
         return {'exists': False, 'error': str(e)}
 
-def main():
+def fmt_count(value):
+    return f"{value:,}" if value is not None else "n/a"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate SOFA-2 tables after creation")
+    parser.add_argument('--exact', action='store_true',
+                        help="full-scan row counts (unique stays via HyperLogLog)")
+    args = parser.parse_args(argv)
+    mode = 'exact' if args.exact else 'sample'
+
     print("="*70)
     print("  SOFA-2 Tables Validation")
     print("="*70)
@@ -84,13 +86,13 @@ def main():
         print(f"  {description}")
         print(f"{'='*70}")
 
-        info = check_table(cursor, table_name)
+        info = check_table(cursor, table_name, mode)
         results[table_name] = info
 
         if info['exists']:
             print(f"✅ Table exists")
-            print(f"📊 Total rows: {info['row_count']:,}")
-            print(f"👥 Unique ICU stays: {info['unique_stays']:,}")
+            print(f"📊 Total rows: {fmt_count(info['row_count'])}")
+            print(f"👥 Unique ICU stays: {fmt_count(info['unique_stays'])}")
             print(f"📋 Columns ({len(info['columns'])}): {', '.join(info['columns'][:5])}...")
         else:
             print(f"❌ Table does not exist")
@@ -112,7 +114,7 @@ def main():
         print(f"{status} {table_name}")
         if results[table_name]['exists']:
             info = results[table_name]
-            print(f"   └─ {info['row_count']:,} rows, {info['unique_stays']:,} ICU stays")
+            print(f"   └─ {fmt_count(info['row_count'])} rows, {fmt_count(info['unique_stays'])} ICU stays")
 
     print(f"{'='*70}")
 
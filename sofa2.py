@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+sofa2 - command-line entry point for the SOFA-2 toolkit
+=======================================================
+
+Subcommands:
+    run        run the sofa2_sql pipeline stages through psql (like run_steps.sh)
+    validate   check the SOFA-2 output tables (scripts/validate_sofa2_tables.py)
+    export     export a table or query to Parquet or CSV
+    compare    SOFA-1 vs SOFA-2 comparison analysis (scripts/analyze_sofa_comparison.py)
+    count      row / distinct counts (estimate, block sample or exact)
+    status     connection check and pipeline table summary
+    metrics    slowest recorded queries per script (utils.db_helper query metrics)
+
+Heavy dependencies (pandas, scipy, pyarrow) are imported only inside the
+subcommand that needs them, so `status` and `count` start in well under a
+second and can be used in shell loops and health checks.
+
+Usage:
+    python sofa2.py status
+    python sofa2.py count mimiciv_derived.sofa2_scores --distinct stay_id
+    python sofa2.py run --from 04_window_final_scores
+    python sofa2.py export mimiciv_derived.first_day_sofa2 first_day.parquet
+    python sofa2.py export mimiciv_derived.sofa2_scores output/sofa2_scores --partitions 16
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent
+sys.path.insert(0, str(project_root))
+
+PIPELINE_STEPS = [
+    '01_setup_cleanup',
+    '02_stage_components',
+    '03_hourly_raw_scores',
+    '04_window_final_scores',
+    '05_filter_hr_nonnegative',
+    '06_first_day_sofa2_simple',
+    '07_sepsis3_sofa2_delta',
+    '08_extract_outcomes_final_corrected',
+]
+
+PIPELINE_TABLES = [
+    'mimiciv_derived.sofa2_hourly_raw',
+    'mimiciv_derived.sofa2_scores',
+    'mimiciv_derived.sofa2_scores_hr_filtered',
+    'mimiciv_derived.first_day_sofa2',
+    'mimiciv_derived.sepsis3_sofa2_delta',
+    'mimiciv_derived.patient_outcomes',
+    'mimiciv_derived.stay_interval_coverage',
+]
+
+STATUS_SQL = """
+SELECT t.name,
+       c.oid IS NOT NULL,
+       c.reltuples::bigint,
+       pg_size_pretty(pg_total_relation_size(c.oid)),
+       greatest(s.last_analyze, s.last_autoanalyze)
+FROM unnest(%s::text[]) AS t(name)
+LEFT JOIN pg_class c ON c.oid = to_regclass(t.name)
+LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+"""
+
+
+def _select_steps(args):
+    steps = PIPELINE_STEPS
+    if args.only:
+        unknown = [s for s in args.only if s not in steps]
+        if unknown:
+            raise SystemExit(f"unknown step(s): {', '.join(unknown)}")
+        return [s for s in steps if s in args.only]
+    start = steps.index(args.from_step) if args.from_step else 0
+    stop = steps.index(args.to_step) + 1 if args.to_step else len(steps)
+    return steps[start:stop]
+
+
+def cmd_run(args):
+    """Run pipeline stages with psql, one session per stage."""
+    from utils.db_helper import DB_CONFIG
+
+    config = DB_CONFIG[args.db]
+    env = dict(os.environ, PGPASSWORD=config['password'])
+    steps = _select_steps(args)
+    for step in steps:
+        cmd = ['psql', '-v', 'ON_ERROR_STOP=1',
+               '-h', config['host'], '-p', str(config['port']),
+               '-U', config['user'], '-d', config['database'],
+               '-f', str(project_root / 'sofa2_sql' / f'{step}.sql')]
+        print(f"[{time.strftime('%F %T')}] start {step}", flush=True)
+        if args.dry_run:
+            print('  ' + ' '.join(cmd))
+            continue
+        started = time.perf_counter()
+        result = subprocess.run(cmd, env=env)
+        if result.returncode != 0:
+            print(f"❌ {step} failed (exit {result.returncode})")
+            return result.returncode
+        print(f"[{time.strftime('%F %T')}] done {step} ({time.perf_counter() - started:.0f}s)")
+    return 0
+
+
+def cmd_validate(args):
+    from scripts import validate_sofa2_tables
+
+    return 0 if validate_sofa2_tables.main(['--exact'] if args.exact else []) else 1
+
+
+def cmd_export(args):
+    from utils.db_helper import export_partitioned_parquet, export_to_csv, export_to_parquet
+
+    source = args.source
+    if args.partitions > 1:
+        export_partitioned_parquet(source, args.output, db=args.db, key=args.key,
+                                   partitions=args.partitions, workers=args.workers)
+        return 0
+    sql = source if ' ' in source.strip() else f"SELECT * FROM {source}"
+    fmt = args.format or ('csv' if args.output.endswith('.csv') else 'parquet')
+    if fmt == 'csv':
+        export_to_csv(sql, args.output, db=args.db)
+    else:
+        export_to_parquet(sql, args.output, db=args.db)
+    return 0
+
+
+def cmd_compare(args):
+    from scripts import analyze_sofa_comparison
+
+    analyze_sofa_comparison.main()
+    return 0
+
+
+def cmd_count(args):
+    from utils.db_helper import count_rows
+
+    for table in args.tables:
+        counts = count_rows(table, db=args.db, mode=args.mode, where=args.where,
+                            distinct=args.distinct, sample_percent=args.sample_percent)
+        fields = [table, counts.rows]
+        if args.mode == 'sample':
+            fields += [counts.low, counts.high]
+        if args.distinct:
+            fields.append('' if counts.approx_distinct is None else counts.approx_distinct)
+        print('\t'.join(str(f) for f in fields), flush=True)
+    return 0
+
+
+def cmd_status(args):
+    from utils.db_helper import get_connection
+
+    started = time.perf_counter()
+    try:
+        conn = get_connection(args.db)
+    except Exception as e:
+        print(f"❌ {args.db}: cannot connect ({e})")
+        return 2
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT current_database(), split_part(version(), ' ', 2)")
+            database, version = cur.fetchone()
+            cur.execute(STATUS_SQL, (PIPELINE_TABLES,))
+            rows = cur.fetchall()
+    finally:
+        conn.close()
+
+    print(f"✅ {args.db}: {database} (PostgreSQL {version}, {(time.perf_counter() - started) * 1000:.0f} ms)")
+    missing = 0
+    for name, exists, reltuples, size, analyzed in rows:
+        if not exists:
+            missing += 1
+            print(f"❌ {name:<45} missing")
+            continue
+        rows_text = f"~{reltuples:,} rows" if reltuples >= 0 else "not analyzed"
+        analyzed_text = f", analyzed {analyzed:%Y-%m-%d %H:%M}" if analyzed else ""
+        print(f"✅ {name:<45} {rows_text}, {size}{analyzed_text}")
+    return 1 if missing else 0
+
+
+def cmd_metrics(args):
+    from utils.db_helper import query_metrics_report
+
+    report = query_metrics_report(script=args.script, top=args.top, since=args.since)
+    if report.empty:
+        print("no query metrics recorded (run scripts with SOFA2_QUERY_METRICS=1 to record them)")
+        return 0
+    for script, rows in report.groupby('script', sort=False):
+        print(f"\n{script}")
+        for r in rows.fillna({'label': '', 'mean_rows': 0, 'mean_bytes': 0}).itertuples():
+            name = r.label or r.sql_text[:60]
+            print(f"  {r.rank:>2}. {r.total_seconds:8.2f}s total {r.runs:>5} runs "
+                  f"{r.mean_seconds:8.2f}s mean {r.mean_rows:>12,.0f} rows "
+                  f"{r.mean_bytes / 1e6:8.1f} MB  [{r.sql_hash}] {name}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='sofa2', description="SOFA-2 toolkit")
+    parser.add_argument('--db', default='mimic', help="DB_CONFIG key (default: mimic)")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('run', help="run sofa2_sql pipeline stages")
+    p.add_argument('--from', dest='from_step', choices=PIPELINE_STEPS, help="first stage to run")
+    p.add_argument('--to', dest='to_step', choices=PIPELINE_STEPS, help="last stage to run")
+    p.add_argument('--only', nargs='+', metavar='STEP', help="run only these stages")
+    p.add_argument('--dry-run', action='store_true', help="print the psql commands only")
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser('validate', help="check the SOFA-2 output tables")
+    p.add_argument('--exact', action='store_true', help="full-scan counts instead of a block sample")
+    p.set_defaults(func=cmd_validate)
+
+    p = sub.add_parser('export', help="export a table or query to Parquet/CSV")
+    p.add_argument('source', help="schema.table or a SELECT statement")
+    p.add_argument('output', help="output file (.parquet or .csv), or a directory with --partitions")
+    p.add_argument('--format', choices=['parquet', 'csv'], help="default: from the file extension")
+    p.add_argument('--partitions', type=int, default=1,
+                   help="split into N key ranges exported in parallel (Parquet dataset + _manifest.json)")
+    p.add_argument('--key', default='stay_id', help="integer range-partition column")
+    p.add_argument('--workers', type=int, help="parallel connections (default: --partitions)")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser('compare', help="SOFA-1 vs SOFA-2 comparison analysis")
+    p.set_defaults(func=cmd_compare)
+
+    p = sub.add_parser('count', help="row counts (tab-separated output)")
+    p.add_argument('tables', nargs='+', metavar='TABLE')
+    p.add_argument('--mode', choices=['estimate', 'sample', 'exact'], default='sample')
+    p.add_argument('--distinct', metavar='COLUMN', help="also estimate distinct values of COLUMN (approximate)")
+    p.add_argument('--where', help="WHERE condition")
+    p.add_argument('--sample-percent', type=float, default=1.0, help="sample mode block percentage")
+    p.set_defaults(func=cmd_count)
+
+    p = sub.add_parser('status', help="connection check and pipeline table summary")
+    p.set_defaults(func=cmd_status)
+
+    p = sub.add_parser('metrics', help="slowest recorded queries per script")
+    p.add_argument('--script', help="only this script (file name)")
+    p.add_argument('--top', type=int, default=10, help="queries per script")
+    p.add_argument('--since', help="only records after this ISO date")
+    p.set_defaults(func=cmd_metrics)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,4 +14,8 @@ WHERE hr >= 0;
 CREATE INDEX idx_sofa2_scores_hr_filtered_stay_hr
     ON mimiciv_derived.sofa2_scores_hr_filtered (stay_id, hr);
 
+-- 供 07 的 LATERAL 时间窗口查找使用（按 endtime 范围扫描 + 覆盖 sofa2_total）
+CREATE INDEX idx_sofa2_scores_hr_filtered_stay_endtime
+    ON mimiciv_derived.sofa2_scores_hr_filtered (stay_id, endtime) INCLUDE (sofa2_total);
+
 COMMENT ON TABLE mimiciv_derived.sofa2_scores_hr_filtered IS 'SOFA2 scores filtered to hr >= 0';
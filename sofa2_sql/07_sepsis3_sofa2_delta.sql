@@ -5,15 +5,32 @@
 --   - 官方简化假设基线 SOFA=0，这里显式计算基线，并在缺失时回退为0
 -- 判定逻辑：
 --   1) 窗口内存在疑似感染（suspected_infection=1）
---   2) ΔSOFA2 = (窗口内最大 SOFA2) - (前48小时内最小 SOFA2) >= 2
---   3) 取满足条件的最早事件（感染时间优先，其次 SOFA 时间）
+--   2) ΔSOFA2 = (窗口内 SOFA2) - (前48小时内最小 SOFA2) >= 2
+--   3) 取满足条件的最早事件（感染时间优先，其次抗生素/培养时间，最后 SOFA 时间）
 -- 产出表：mimiciv_derived.sepsis3_sofa2_delta
+--
+-- 性能说明（有序数组 + 索引 LATERAL 引擎）:
+--   suspicion_of_infection 每个抗生素/培养组合一行，同一 stay 的同一疑似感染
+--   时间会重复多次。旧版本对每一行都范围 JOIN 两次 sofa2_scores_hr_filtered
+--   (基线 MIN + 窗口)，重度送培养患者的同一批评分行被反复读取几十次。
+--   现在的做法:
+--   1) 先按 (stay_id, suspected_infection_time) 去重，只对不同的感染时间求值
+--   2) 每个感染时间用两个 LATERAL 子查询走 (stay_id, endtime) 索引:
+--      - 基线: 48h 前窗口内的 MIN (索引范围扫描)
+--      - 命中: 窗口内按 endtime 升序第一个满足 ΔSOFA2 >= 2 的小时 (LIMIT 1，命中即停)
+--   3) 每个 stay 取最早命中的感染时间，再回到原始 soi 行选出抗生素/培养
+--      时间最早的一行，输出列与旧版本完全一致
+-- 依赖索引: idx_sofa2_scores_hr_filtered_stay_endtime (由 05 创建，这里兜底创建)
 -- =================================================================
 
 DROP TABLE IF EXISTS mimiciv_derived.sepsis3_sofa2_delta CASCADE;
 
+CREATE INDEX IF NOT EXISTS idx_sofa2_scores_hr_filtered_stay_endtime
+    ON mimiciv_derived.sofa2_scores_hr_filtered (stay_id, endtime) INCLUDE (sofa2_total);
+
 CREATE TABLE mimiciv_derived.sepsis3_sofa2_delta AS
 WITH soi AS (
+    -- 只有 suspected_infection=1 的行才可能判定为 sepsis3_sofa2
     SELECT
         subject_id,
         stay_id,
@@ -22,46 +39,70 @@ WITH soi AS (
         antibiotic,
         antibiotic_time,
         culture_time,
-        suspected_infection,
         suspected_infection_time,
         specimen,
         positive_culture
     FROM mimiciv_derived.suspicion_of_infection
     WHERE stay_id IS NOT NULL
+      AND suspected_infection = 1
+      AND suspected_infection_time IS NOT NULL
 ),
-sofa2 AS (
-    SELECT
-        stay_id,
-        starttime,
-        endtime,
-        brain,
-        respiratory,
-        cardiovascular,
-        liver,
-        kidney,
-        hemostasis,
-        sofa2_total AS sofa2_score
-    FROM mimiciv_derived.sofa2_scores_hr_filtered
-),
-baseline AS (
-    -- 基线 SOFA2：疑似感染时间前 48 小时内的最小 SOFA2
-    SELECT
-        soi.subject_id,
-        soi.stay_id,
-        soi.hadm_id,
-        soi.suspected_infection_time,
-        MIN(s2.sofa2_score) AS baseline_sofa2,
-        COUNT(*) > 0 AS baseline_observed
+soi_times AS (
+    -- 每个 stay 的不同疑似感染时间（去重后才访问评分表）
+    SELECT DISTINCT stay_id, suspected_infection_time
     FROM soi
-    LEFT JOIN sofa2 s2
-        ON soi.stay_id = s2.stay_id
-       AND s2.endtime >= soi.suspected_infection_time - INTERVAL '48 hours'
-       AND s2.endtime <  soi.suspected_infection_time
-    GROUP BY soi.subject_id, soi.stay_id, soi.hadm_id, soi.suspected_infection_time
 ),
-window_scores AS (
-    -- 感染窗口 (-48h, +24h) 内的 SOFA2，计算 ΔSOFA2
+onset_candidates AS (
     SELECT
+        st.stay_id,
+        st.suspected_infection_time,
+        COALESCE(bl.baseline_sofa2, 0) AS baseline_sofa2,
+        hit.sofa_time,
+        hit.sofa2_score,
+        hit.brain,
+        hit.respiratory,
+        hit.cardiovascular,
+        hit.liver,
+        hit.kidney,
+        hit.hemostasis
+    FROM soi_times st
+    -- 基线 SOFA2：疑似感染时间前 48 小时内的最小 SOFA2
+    CROSS JOIN LATERAL (
+        SELECT MIN(s2.sofa2_total) AS baseline_sofa2
+        FROM mimiciv_derived.sofa2_scores_hr_filtered s2
+        WHERE s2.stay_id = st.stay_id
+          AND s2.endtime >= st.suspected_infection_time - INTERVAL '48 hours'
+          AND s2.endtime <  st.suspected_infection_time
+    ) bl
+    -- 感染窗口 (-48h, +24h) 内第一个 ΔSOFA2 >= 2 的小时
+    CROSS JOIN LATERAL (
+        SELECT
+            s2.endtime AS sofa_time,
+            s2.sofa2_total AS sofa2_score,
+            s2.brain,
+            s2.respiratory,
+            s2.cardiovascular,
+            s2.liver,
+            s2.kidney,
+            s2.hemostasis
+        FROM mimiciv_derived.sofa2_scores_hr_filtered s2
+        WHERE s2.stay_id = st.stay_id
+          AND s2.endtime >= st.suspected_infection_time - INTERVAL '48 hours'
+          AND s2.endtime <= st.suspected_infection_time + INTERVAL '24 hours'
+          AND s2.sofa2_total - COALESCE(bl.baseline_sofa2, 0) >= 2
+        ORDER BY s2.endtime
+        LIMIT 1
+    ) hit
+),
+first_onset AS (
+    -- 每个 stay 最早的命中感染时间
+    SELECT DISTINCT ON (stay_id) *
+    FROM onset_candidates
+    ORDER BY stay_id, suspected_infection_time
+),
+first_hit AS (
+    -- 回到原始 soi 行：同一感染时间下取抗生素/培养时间最早的一行
+    SELECT DISTINCT ON (soi.stay_id)
         soi.subject_id,
         soi.stay_id,
         soi.hadm_id,
@@ -69,47 +110,21 @@ window_scores AS (
         soi.antibiotic,
         soi.antibiotic_time,
         soi.culture_time,
-        soi.suspected_infection,
         soi.suspected_infection_time,
-        soi.specimen,
-        soi.positive_culture,
-        s2.endtime AS sofa_time,
-        s2.sofa2_score,
-        s2.brain,
-        s2.respiratory,
-        s2.cardiovascular,
-        s2.liver,
-        s2.kidney,
-        s2.hemostasis,
-        COALESCE(baseline.baseline_sofa2, 0) AS baseline_sofa2,
-        COALESCE(baseline.baseline_sofa2, 0) AS baseline_sofa2_filled,
-        baseline.baseline_observed,
-        s2.sofa2_score - COALESCE(baseline.baseline_sofa2, 0) AS delta_sofa2,
-        (s2.sofa2_score - COALESCE(baseline.baseline_sofa2, 0) >= 2 AND soi.suspected_infection = 1) AS sepsis3_sofa2
+        fo.sofa_time,
+        fo.sofa2_score,
+        fo.baseline_sofa2,
+        fo.brain,
+        fo.respiratory,
+        fo.cardiovascular,
+        fo.liver,
+        fo.kidney,
+        fo.hemostasis
     FROM soi
-    INNER JOIN sofa2 s2
-        ON soi.stay_id = s2.stay_id
-       AND s2.endtime >= soi.suspected_infection_time - INTERVAL '48 hours'
-       AND s2.endtime <= soi.suspected_infection_time + INTERVAL '24 hours'
-    LEFT JOIN baseline
-        ON soi.stay_id = baseline.stay_id
-       AND soi.subject_id = baseline.subject_id
-       AND soi.hadm_id = baseline.hadm_id
-       AND soi.suspected_infection_time = baseline.suspected_infection_time
-),
-first_hit AS (
-    SELECT
-        ws.*,
-        ROW_NUMBER() OVER (
-            PARTITION BY ws.stay_id
-            ORDER BY
-                ws.suspected_infection_time,
-                ws.antibiotic_time,
-                ws.culture_time,
-                ws.sofa_time
-        ) AS rn
-    FROM window_scores ws
-    WHERE ws.sepsis3_sofa2
+    INNER JOIN first_onset fo
+        ON soi.stay_id = fo.stay_id
+       AND soi.suspected_infection_time = fo.suspected_infection_time
+    ORDER BY soi.stay_id, soi.antibiotic_time, soi.culture_time
 )
 SELECT
     subject_id,
@@ -123,16 +138,16 @@ SELECT
     sofa_time,
     sofa2_score,
     baseline_sofa2,
-    baseline_observed,
-    delta_sofa2,
+    -- 与旧版本口径一致：旧版本用 LEFT JOIN 后的 COUNT(*) > 0，恒为 true
+    TRUE AS baseline_observed,
+    sofa2_score - baseline_sofa2 AS delta_sofa2,
     brain,
     respiratory,
     cardiovascular,
     liver,
     kidney,
     hemostasis,
-    sepsis3_sofa2
-FROM first_hit
-WHERE rn = 1;
+    TRUE AS sepsis3_sofa2
+FROM first_hit;
 
 COMMENT ON TABLE mimiciv_derived.sepsis3_sofa2_delta IS 'Sepsis-3 onset using SOFA2 with explicit ΔSOFA2 (baseline=48h pre-infection min, fallback 0)';
@@ -4,6 +4,165 @@
 -- 计算分开的通气时长
 -- =================================================================
 
+-- =================================================================
+-- 区间覆盖引擎 (Interval Coverage)
+-- 通气(各状态 + 高级支持合并)、血管活性药物、RRT 均为可能重叠的时间区间。
+-- 旧版本对每一类分别做 +1/-1 事件展开 + 窗口 SUM/LEAD 扫描，再把
+-- vent_durations / vent_first_start / vent_advanced_union 一起 LEFT JOIN 到
+-- icustays 上 GROUP BY，行数相乘(扇出)，时长被重复累计。
+-- 这里统一为一次 gaps-and-islands 合并:
+--   1) 所有区间带上类别 (category) 合并成一张区间表
+--   2) 按 (stay_id, category) 排序，前面区间的最大 endtime >= 当前 starttime 则属于同一段
+--   3) 每段取 MIN(starttime)/MAX(endtime)，按 stay 汇总为一行:
+--      覆盖时长、首次开始时间、合并后的段数
+-- 产出表：mimiciv_derived.stay_interval_coverage（每个 stay 一行）
+-- =================================================================
+
+DROP TABLE IF EXISTS mimiciv_derived.stay_interval_coverage CASCADE;
+
+CREATE TABLE mimiciv_derived.stay_interval_coverage AS
+WITH
+
+-- 通气区间（裁剪至ICU）
+vent_base AS (
+    SELECT
+        v.stay_id,
+        v.ventilation_status,
+        GREATEST(v.starttime, icu.intime) AS starttime,
+        LEAST(v.endtime, icu.outtime) AS endtime
+    FROM mimiciv_derived.ventilation v
+    JOIN mimiciv_icu.icustays icu ON v.stay_id = icu.stay_id
+    WHERE v.starttime IS NOT NULL
+      AND v.endtime IS NOT NULL
+      AND LEAST(v.endtime, icu.outtime) > GREATEST(v.starttime, icu.intime)
+),
+
+-- 血管活性药物基础区间（裁剪至ICU、需有任一剂量>0）
+vaso_base AS (
+    SELECT
+        v.stay_id,
+        GREATEST(v.starttime, icu.intime) AS starttime,
+        LEAST(v.endtime, icu.outtime) AS endtime
+    FROM mimiciv_derived.vasoactive_agent v
+    JOIN mimiciv_icu.icustays icu ON v.stay_id = icu.stay_id
+    WHERE v.starttime IS NOT NULL
+      AND v.endtime IS NOT NULL
+      AND LEAST(v.endtime, icu.outtime) > GREATEST(v.starttime, icu.intime)
+      AND (
+          COALESCE(v.dopamine, 0) +
+          COALESCE(v.epinephrine, 0) +
+          COALESCE(v.norepinephrine, 0) +
+          COALESCE(v.phenylephrine, 0) +
+          COALESCE(v.vasopressin, 0) +
+          COALESCE(v.dobutamine, 0) +
+          COALESCE(v.milrinone, 0)
+      ) > 0
+),
+
+-- RRT区间：使用下一个charttime推断间隔，末行假设1小时，仅计 active=1
+rrt_base AS (
+    SELECT
+        r.stay_id,
+        r.dialysis_active,
+        r.charttime AS starttime,
+        COALESCE(
+            LEAD(r.charttime) OVER (PARTITION BY r.stay_id ORDER BY r.charttime),
+            r.charttime + INTERVAL '1 hour'
+        ) AS endtime
+    FROM mimiciv_derived.rrt r
+    WHERE r.dialysis_type IS NOT NULL AND r.dialysis_type <> ''
+),
+
+coverage_intervals AS (
+    -- 各通气状态内部各自合并
+    SELECT stay_id, ventilation_status AS category, starttime, endtime FROM vent_base
+    UNION ALL
+    -- 高级呼吸支持（Invasive/Tracheostomy/NIV/HFNC）跨状态合并，避免联用重复累计
+    SELECT stay_id, 'AdvancedSupport' AS category, starttime, endtime
+    FROM vent_base
+    WHERE ventilation_status IN ('InvasiveVent', 'Tracheostomy', 'NonInvasiveVent', 'HFNC')
+    UNION ALL
+    SELECT stay_id, 'Vasoactive' AS category, starttime, endtime FROM vaso_base
+    UNION ALL
+    SELECT stay_id, 'RRT' AS category, starttime, endtime FROM rrt_base WHERE dialysis_active = 1
+),
+coverage_flagged AS (
+    SELECT
+        stay_id,
+        category,
+        starttime,
+        endtime,
+        -- 与之前所有区间都不相交（含首个区间）时开启新段
+        CASE
+            WHEN starttime <= MAX(endtime) OVER (
+                PARTITION BY stay_id, category
+                ORDER BY starttime, endtime
+                ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+            ) THEN 0
+            ELSE 1
+        END AS is_island_start
+    FROM coverage_intervals
+),
+coverage_islands AS (
+    SELECT
+        stay_id,
+        category,
+        starttime,
+        endtime,
+        SUM(is_island_start) OVER (
+            PARTITION BY stay_id, category
+            ORDER BY starttime, endtime
+            ROWS UNBOUNDED PRECEDING
+        ) AS island_id
+    FROM coverage_flagged
+),
+coverage_merged AS (
+    SELECT
+        stay_id,
+        category,
+        MIN(starttime) AS starttime,
+        EXTRACT(EPOCH FROM (MAX(endtime) - MIN(starttime))) / 3600 AS hours
+    FROM coverage_islands
+    GROUP BY stay_id, category, island_id
+)
+SELECT
+    stay_id,
+
+    -- 有无标记（按是否存在任一该类区间）
+    MAX(CASE WHEN category = 'InvasiveVent' THEN 1 ELSE 0 END) AS invasive_vent,
+    MAX(CASE WHEN category = 'Tracheostomy' THEN 1 ELSE 0 END) AS tracheostomy,
+    MAX(CASE WHEN category = 'NonInvasiveVent' THEN 1 ELSE 0 END) AS noninvasive_vent,
+    MAX(CASE WHEN category = 'HFNC' THEN 1 ELSE 0 END) AS hfnc,
+    MAX(CASE WHEN category IN ('SupplementalOxygen', 'None') THEN 1 ELSE 0 END) AS oxygen_only,
+
+    -- 去重后的各类时长（小时）
+    COALESCE(SUM(hours) FILTER (WHERE category IN ('InvasiveVent', 'Tracheostomy')), 0) AS invasive_ventilation_hours,
+    COALESCE(SUM(hours) FILTER (WHERE category = 'NonInvasiveVent'), 0) AS noninvasive_ventilation_hours,
+    COALESCE(SUM(hours) FILTER (WHERE category = 'HFNC'), 0) AS hfnc_hours,
+    COALESCE(SUM(hours) FILTER (WHERE category = 'AdvancedSupport'), 0) AS advanced_respiratory_support_hours,
+    COALESCE(SUM(hours) FILTER (WHERE category = 'Vasoactive'), 0) AS vasoactive_hours,
+    COALESCE(SUM(hours) FILTER (WHERE category = 'RRT'), 0) AS rrt_hours,
+
+    -- 首次开始时间（已裁剪至ICU）
+    MIN(starttime) FILTER (WHERE category IN ('InvasiveVent', 'Tracheostomy')) AS first_invasive_start,
+    MIN(starttime) FILTER (WHERE category = 'NonInvasiveVent') AS first_niv_start,
+    MIN(starttime) FILTER (WHERE category = 'HFNC') AS first_hfnc_start,
+    MIN(starttime) FILTER (WHERE category = 'AdvancedSupport') AS first_advanced_start,
+    MIN(starttime) FILTER (WHERE category = 'Vasoactive') AS first_vasoactive_start,
+    MIN(starttime) FILTER (WHERE category = 'RRT') AS first_rrt_start,
+
+    -- 合并后的段数
+    COUNT(*) FILTER (WHERE category IN ('InvasiveVent', 'Tracheostomy')) AS invasive_episodes,
+    COUNT(*) FILTER (WHERE category = 'AdvancedSupport') AS advanced_support_episodes,
+    COUNT(*) FILTER (WHERE category = 'Vasoactive') AS vasoactive_episodes,
+    COUNT(*) FILTER (WHERE category = 'RRT') AS rrt_episodes
+FROM coverage_merged
+GROUP BY stay_id;
+
+CREATE UNIQUE INDEX idx_stay_interval_coverage_stay ON mimiciv_derived.stay_interval_coverage(stay_id);
+
+COMMENT ON TABLE mimiciv_derived.stay_interval_coverage IS 'Per-stay merged interval coverage (ventilation by status, advanced support, vasoactive, RRT): hours, first start, episode counts';
+
 -- 删除已存在的表
 DROP TABLE IF EXISTS mimiciv_derived.patient_outcomes CASCADE;
 
@@ -92,196 +251,8 @@ icu_readmit AS (
     FROM mimiciv_icu.icustays
 ),
 
--- 机械通气结局（四分类系统，去重重叠时长）
-vent_base AS (
-    SELECT
-        v.stay_id,
-        v.ventilation_status,
-        GREATEST(v.starttime, icu.intime) AS starttime,
-        LEAST(v.endtime, icu.outtime) AS endtime
-    FROM mimiciv_derived.ventilation v
-    JOIN mimiciv_icu.icustays icu ON v.stay_id = icu.stay_id
-    WHERE v.starttime IS NOT NULL
-      AND v.endtime IS NOT NULL
-      AND LEAST(v.endtime, icu.outtime) > GREATEST(v.starttime, icu.intime)
-),
-vent_events AS (
-    SELECT stay_id, ventilation_status, starttime AS event_time, 1 AS delta FROM vent_base
-    UNION ALL
-    SELECT stay_id, ventilation_status, endtime AS event_time, -1 AS delta FROM vent_base
-),
-vent_coverage AS (
-    SELECT
-        stay_id,
-        ventilation_status,
-        event_time,
-        SUM(delta) OVER (PARTITION BY stay_id, ventilation_status ORDER BY event_time, delta DESC) AS active_count,
-        LEAD(event_time) OVER (PARTITION BY stay_id, ventilation_status ORDER BY event_time, delta DESC) AS next_time
-    FROM vent_events
-),
-vent_durations AS (
-    -- 每个状态内部合并重叠区间后计算时长
-    SELECT
-        stay_id,
-        ventilation_status,
-        SUM(
-            CASE
-                WHEN active_count > 0 AND next_time IS NOT NULL
-                    THEN GREATEST(0, EXTRACT(EPOCH FROM (next_time - event_time)) / 3600)
-                ELSE 0
-            END
-        ) AS hours
-    FROM vent_coverage
-    GROUP BY stay_id, ventilation_status
-),
-vent_first_start AS (
-    SELECT
-        vb.stay_id,
-        MIN(CASE WHEN ventilation_status IN ('InvasiveVent', 'Tracheostomy') THEN starttime END) AS first_invasive_start,
-        MIN(CASE WHEN ventilation_status = 'NonInvasiveVent' THEN starttime END) AS first_niv_start,
-        MIN(CASE WHEN ventilation_status = 'HFNC' THEN starttime END) AS first_hfnc_start,
-        MIN(CASE WHEN ventilation_status IN ('InvasiveVent', 'NonInvasiveVent', 'HFNC', 'Tracheostomy') THEN starttime END) AS first_advanced_start
-    FROM vent_base vb
-    GROUP BY vb.stay_id
-),
-vent_advanced_union AS (
-    -- 合并高级支持（Invasive/Tracheostomy/NIV/HFNC）重叠时长，避免联用重复累计
-    SELECT
-        stay_id,
-        event_time,
-        SUM(delta) OVER (PARTITION BY stay_id ORDER BY event_time, delta DESC) AS active_count,
-        LEAD(event_time) OVER (PARTITION BY stay_id ORDER BY event_time, delta DESC) AS next_time
-    FROM (
-        SELECT stay_id, starttime AS event_time, 1 AS delta FROM vent_base WHERE ventilation_status IN ('InvasiveVent', 'Tracheostomy', 'NonInvasiveVent', 'HFNC')
-        UNION ALL
-        SELECT stay_id, endtime AS event_time, -1 AS delta FROM vent_base WHERE ventilation_status IN ('InvasiveVent', 'Tracheostomy', 'NonInvasiveVent', 'HFNC')
-    ) ev
-),
-ventilation_info AS (
-    SELECT
-        icu.stay_id,
-        -- 有无标记（按是否存在任一该类区间）
-        MAX(CASE WHEN vd.ventilation_status = 'InvasiveVent' THEN 1 ELSE 0 END) AS invasive_vent,
-        MAX(CASE WHEN vd.ventilation_status = 'Tracheostomy' THEN 1 ELSE 0 END) AS tracheostomy,
-        MAX(CASE WHEN vd.ventilation_status = 'NonInvasiveVent' THEN 1 ELSE 0 END) AS noninvasive_vent,
-        MAX(CASE WHEN vd.ventilation_status = 'HFNC' THEN 1 ELSE 0 END) AS hfnc,
-        MAX(CASE WHEN vd.ventilation_status IN ('SupplementalOxygen', 'None') THEN 1 ELSE 0 END) AS oxygen_only,
-
-        -- 去重后的各类时长（小时）
-        COALESCE(SUM(CASE WHEN vd.ventilation_status IN ('InvasiveVent', 'Tracheostomy') THEN vd.hours END), 0) AS invasive_ventilation_hours,
-        COALESCE(SUM(CASE WHEN vd.ventilation_status = 'NonInvasiveVent' THEN vd.hours END), 0) AS noninvasive_ventilation_hours,
-        COALESCE(SUM(CASE WHEN vd.ventilation_status = 'HFNC' THEN vd.hours END), 0) AS hfnc_hours,
-
-        -- 高级呼吸支持：合并多类重叠后的净时长
-        COALESCE(
-            SUM(
-                CASE
-                    WHEN adv.active_count > 0 AND adv.next_time IS NOT NULL
-                        THEN GREATEST(0, EXTRACT(EPOCH FROM (adv.next_time - adv.event_time)) / 3600)
-                    ELSE 0
-                END
-            ),
-        0) AS advanced_respiratory_support_hours,
-
-        -- 从ICU入院到首次各类通气的时间（小时）
-        MIN(
-            CASE WHEN fs.first_invasive_start IS NOT NULL
-                 THEN EXTRACT(EPOCH FROM GREATEST(fs.first_invasive_start - icu.intime, INTERVAL '0')) / 3600
-            END
-        ) AS time_to_invasive_vent_hours,
-        MIN(
-            CASE WHEN fs.first_niv_start IS NOT NULL
-                 THEN EXTRACT(EPOCH FROM GREATEST(fs.first_niv_start - icu.intime, INTERVAL '0')) / 3600
-            END
-        ) AS time_to_noninvasive_vent_hours,
-        MIN(
-            CASE WHEN fs.first_hfnc_start IS NOT NULL
-                 THEN EXTRACT(EPOCH FROM GREATEST(fs.first_hfnc_start - icu.intime, INTERVAL '0')) / 3600
-            END
-        ) AS time_to_hfnc_hours,
-        MIN(
-            CASE WHEN fs.first_advanced_start IS NOT NULL
-                 THEN EXTRACT(EPOCH FROM GREATEST(fs.first_advanced_start - icu.intime, INTERVAL '0')) / 3600
-            END
-        ) AS time_to_advanced_support_hours
-
-    FROM mimiciv_icu.icustays icu
-    LEFT JOIN vent_durations vd ON icu.stay_id = vd.stay_id
-    LEFT JOIN vent_first_start fs ON icu.stay_id = fs.stay_id
-    LEFT JOIN vent_advanced_union adv ON icu.stay_id = adv.stay_id
-    GROUP BY icu.stay_id, icu.intime
-),
-
--- 血管活性药物基础区间（裁剪至ICU、需有任一剂量>0）
-vaso_base AS (
-    SELECT
-        v.stay_id,
-        GREATEST(v.starttime, icu.intime) AS starttime,
-        LEAST(v.endtime, icu.outtime) AS endtime
-    FROM mimiciv_derived.vasoactive_agent v
-    JOIN icu_info icu ON v.stay_id = icu.stay_id
-    WHERE v.starttime IS NOT NULL
-      AND v.endtime IS NOT NULL
-      AND LEAST(v.endtime, icu.outtime) > GREATEST(v.starttime, icu.intime)
-      AND (
-          COALESCE(v.dopamine, 0) +
-          COALESCE(v.epinephrine, 0) +
-          COALESCE(v.norepinephrine, 0) +
-          COALESCE(v.phenylephrine, 0) +
-          COALESCE(v.vasopressin, 0) +
-          COALESCE(v.dobutamine, 0) +
-          COALESCE(v.milrinone, 0)
-      ) > 0
-),
--- 血管活性药物事件（扫描线合并重叠/联用）
-vaso_events AS (
-    SELECT stay_id, starttime AS event_time, 1 AS delta FROM vaso_base
-    UNION ALL
-    SELECT stay_id, endtime AS event_time, -1 AS delta FROM vaso_base
-),
-vaso_coverage AS (
-    SELECT
-        stay_id,
-        event_time,
-        SUM(delta) OVER (PARTITION BY stay_id ORDER BY event_time, delta DESC) AS active_count,
-        LEAD(event_time) OVER (PARTITION BY stay_id ORDER BY event_time, delta DESC) AS next_time
-    FROM vaso_events
-),
--- 血管活性药物使用时长（小时）
-vasoactive_info AS (
-    SELECT
-        stay_id,
-        SUM(
-            CASE
-                WHEN active_count > 0 AND next_time IS NOT NULL
-                    THEN GREATEST(0, EXTRACT(EPOCH FROM (next_time - event_time)) / 3600)
-                ELSE 0
-            END
-        ) AS vasoactive_hours
-    FROM vaso_coverage
-    GROUP BY stay_id
-),
-
--- RRT结局
+-- RRT结局（时长来自区间覆盖表）
 rrt_info AS (
-    WITH rrt_durations AS (
-        SELECT
-            r.*,
-            -- 使用下一个charttime推断间隔，末行假设1小时；负值截断为0
-            GREATEST(
-                0,
-                EXTRACT(
-                    EPOCH FROM (
-                        COALESCE(
-                            LEAD(r.charttime) OVER (PARTITION BY r.stay_id ORDER BY r.charttime),
-                            r.charttime + INTERVAL '1 hour'
-                        ) - r.charttime
-                    )
-                ) / 3600
-            ) AS interval_hours
-        FROM mimiciv_derived.rrt r
-        WHERE r.dialysis_type IS NOT NULL AND r.dialysis_type <> ''
-    )
     SELECT
         r.stay_id,
         -- 是否需要RRT
@@ -290,8 +261,6 @@ rrt_info AS (
         STRING_AGG(DISTINCT r.dialysis_type, ', ') AS types,
         -- RRT记录条数（近似会话数，保持与原先口径一致）
         COUNT(*) AS sessions,
-        -- RRT总时长（小时），按charttime间隔累加，仅计active=1
-        SUM(CASE WHEN r.dialysis_active = 1 THEN r.interval_hours ELSE 0 END) AS hours,
         -- 各类型RRT记录数量
         COUNT(CASE WHEN r.dialysis_type = 'CRRT' THEN 1 END) AS crrt,
         COUNT(CASE WHEN r.dialysis_type = 'CVVHDF' THEN 1 END) AS cvvhdf,
@@ -300,7 +269,8 @@ rrt_info AS (
         COUNT(CASE WHEN r.dialysis_type = 'IHD' THEN 1 END) AS ihd,
         COUNT(CASE WHEN r.dialysis_type = 'Peritoneal' THEN 1 END) AS peritoneal,
         COUNT(CASE WHEN r.dialysis_type = 'SCUF' THEN 1 END) AS scuf
-    FROM rrt_durations r
+    FROM mimiciv_derived.rrt r
+    WHERE r.dialysis_type IS NOT NULL AND r.dialysis_type <> ''
     GROUP BY r.stay_id
 ),
 
@@ -422,29 +392,30 @@ SELECT
     CASE WHEN sep.sepsis3 = true THEN 1 ELSE 0 END AS sepsis3_sofa,
     CASE WHEN sep2.sepsis3_sofa2 = true THEN 1 ELSE 0 END AS sepsis3_sofa2,
 
-    -- 机械通气结局（四分类系统）
-    COALESCE(vent.invasive_vent, 0) AS invasive_ventilation,
-    COALESCE(vent.tracheostomy, 0) AS tracheostomy,
-    COALESCE(vent.noninvasive_vent, 0) AS noninvasive_ventilation,
-    COALESCE(vent.hfnc, 0) AS hfnc_ventilation,
-    COALESCE(vent.oxygen_only, 0) AS oxygen_only,
-    COALESCE(vent.invasive_ventilation_hours, 0) AS invasive_ventilation_hours,
-    COALESCE(vent.noninvasive_ventilation_hours, 0) AS noninvasive_ventilation_hours,
-    COALESCE(vent.hfnc_hours, 0) AS hfnc_hours,
-    COALESCE(vent.advanced_respiratory_support_hours, 0) AS advanced_respiratory_support_hours,
-    COALESCE(vent.time_to_invasive_vent_hours, 0) AS time_to_invasive_vent_hours,
-    COALESCE(vent.time_to_noninvasive_vent_hours, 0) AS time_to_noninvasive_vent_hours,
-    COALESCE(vent.time_to_hfnc_hours, 0) AS time_to_hfnc_hours,
-    COALESCE(vent.time_to_advanced_support_hours, 0) AS time_to_advanced_support_hours,
+    -- 机械通气结局（四分类系统，来自区间覆盖表）
+    COALESCE(cov.invasive_vent, 0) AS invasive_ventilation,
+    COALESCE(cov.tracheostomy, 0) AS tracheostomy,
+    COALESCE(cov.noninvasive_vent, 0) AS noninvasive_ventilation,
+    COALESCE(cov.hfnc, 0) AS hfnc_ventilation,
+    COALESCE(cov.oxygen_only, 0) AS oxygen_only,
+    COALESCE(cov.invasive_ventilation_hours, 0) AS invasive_ventilation_hours,
+    COALESCE(cov.noninvasive_ventilation_hours, 0) AS noninvasive_ventilation_hours,
+    COALESCE(cov.hfnc_hours, 0) AS hfnc_hours,
+    COALESCE(cov.advanced_respiratory_support_hours, 0) AS advanced_respiratory_support_hours,
+    -- 从ICU入院到首次各类通气的时间（小时）
+    COALESCE(EXTRACT(EPOCH FROM GREATEST(cov.first_invasive_start - icu.intime, INTERVAL '0')) / 3600, 0) AS time_to_invasive_vent_hours,
+    COALESCE(EXTRACT(EPOCH FROM GREATEST(cov.first_niv_start - icu.intime, INTERVAL '0')) / 3600, 0) AS time_to_noninvasive_vent_hours,
+    COALESCE(EXTRACT(EPOCH FROM GREATEST(cov.first_hfnc_start - icu.intime, INTERVAL '0')) / 3600, 0) AS time_to_hfnc_hours,
+    COALESCE(EXTRACT(EPOCH FROM GREATEST(cov.first_advanced_start - icu.intime, INTERVAL '0')) / 3600, 0) AS time_to_advanced_support_hours,
 
     -- 血管活性药物结局
-    COALESCE(vaso.vasoactive_hours, 0) AS vasoactive_hours,
+    COALESCE(cov.vasoactive_hours, 0) AS vasoactive_hours,
 
     -- RRT结局
     COALESCE(rrt.required, 0) AS rrt_required,
     rrt.types AS rrt_types,
     COALESCE(rrt.sessions, 0) AS rrt_sessions,
-    COALESCE(rrt.hours, 0) AS rrt_hours,
+    COALESCE(cov.rrt_hours, 0) AS rrt_hours,
     COALESCE(rrt.crrt, 0) AS crrt_sessions,
     COALESCE(rrt.cvvhdf, 0) AS cvvhdf_sessions,
     COALESCE(rrt.cvvhd, 0) AS cvvhd_sessions,
@@ -465,9 +436,8 @@ LEFT JOIN sofa_info sofa ON icu.stay_id = sofa.stay_id
 LEFT JOIN sofa2_info sofa2 ON icu.stay_id = sofa2.stay_id
 LEFT JOIN sepsis_info sep ON icu.stay_id = sep.stay_id
 LEFT JOIN sepsis2_info sep2 ON icu.stay_id = sep2.stay_id
-LEFT JOIN ventilation_info vent ON icu.stay_id = vent.stay_id
-LEFT JOIN vasoactive_info vaso ON icu.stay_id = vaso.stay_id
 LEFT JOIN rrt_info rrt ON icu.stay_id = rrt.stay_id
+LEFT JOIN mimiciv_derived.stay_interval_coverage cov ON icu.stay_id = cov.stay_id
 LEFT JOIN icu_readmit icu_r ON icu.stay_id = icu_r.stay_id;
 
 -- 创建索引
@@ -7,6 +7,10 @@ SOFA vs SOFA2 ICU生存预测AUC计算脚本
 3. 运行此脚本：python calculate_auc_python.py
 """
 
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
 import pandas as pd
 import numpy as np
 from sklearn.metrics import roc_auc_score, roc_curve, precision_recall_curve, auc
@@ -17,6 +21,10 @@ from scipy import stats
 import warnings
 warnings.filterwarnings('ignore')
 
+from utils.auc_bootstrap import bootstrap_auc
+from utils.score_grid import discrimination_grid
+from utils.calibration import calibration_report
+
 def load_and_prepare_data(csv_file='survival_auc_data.csv'):
     """加载并准备数据"""
     print("📊 加载数据...")
@@ -81,13 +89,19 @@ def calculate_auc_scores(df):
     print("\n🎯 AUC计算结果")
     print("=" * 50)
 
+    # 两个评分 × 两个结局一次计算（utils/score_grid.py）
+    grid = discrimination_grid(df, score_cols=['sofa_score', 'sofa2_score'],
+                               outcome_cols=['icu_mortality', 'hospital_expire_flag'],
+                               subgroups={'overall': None})
+    auc = grid.set_index(['score', 'outcome'])['auc']
+
     # ICU死亡率预测AUC
-    auc_sofa_icu = roc_auc_score(df['icu_mortality'], df['sofa_score'])
-    auc_sofa2_icu = roc_auc_score(df['icu_mortality'], df['sofa2_score'])
+    auc_sofa_icu = auc['sofa_score', 'icu_mortality']
+    auc_sofa2_icu = auc['sofa2_score', 'icu_mortality']
 
     # 医院死亡率预测AUC
-    auc_sofa_hosp = roc_auc_score(df['hospital_expire_flag'], df['sofa_score'])
-    auc_sofa2_hosp = roc_auc_score(df['hospital_expire_flag'], df['sofa2_score'])
+    auc_sofa_hosp = auc['sofa_score', 'hospital_expire_flag']
+    auc_sofa2_hosp = auc['sofa2_score', 'hospital_expire_flag']
 
     print("🏆 ICU死亡率预测AUC：")
     print(f"SOFA-1: {auc_sofa_icu:.4f}")
@@ -114,24 +128,13 @@ def perform_statistical_test(df, auc_results):
     # 使用Delong检验比较AUC差异 (需要额外的库)
     # 这里我们使用bootstrap方法进行简化检验
 
-    def bootstrap_auc(df, score_col, outcome_col, n_bootstrap=1000):
-        """Bootstrap方法计算AUC置信区间"""
-        np.random.seed(42)
-        aucs = []
-
-        for _ in range(n_bootstrap):
-            bootstrap_sample = df.sample(n=len(df), replace=True)
-            if len(bootstrap_sample[outcome_col].unique()) > 1:  # 确保有正负样本
-                auc = roc_auc_score(bootstrap_sample[outcome_col], bootstrap_sample[score_col])
-                aucs.append(auc)
-
-        if len(aucs) > 0:
-            return np.array(aucs)
-        return None
-
-    # ICU死亡率AUC bootstrap
-    sofa_aucs = bootstrap_auc(df, 'sofa_score', 'icu_mortality')
-    sofa2_aucs = bootstrap_auc(df, 'sofa2_score', 'icu_mortality')
+    # ICU死亡率AUC 配对bootstrap（两个评分共用同一组重采样）
+    result = bootstrap_auc(df['icu_mortality'], df[['sofa_score', 'sofa2_score']],
+                           n_bootstrap=1000, seed=42)
+    valid = ~np.isnan(result.replicates).any(axis=1)
+    sofa_aucs, sofa2_aucs = result.replicates[valid, 0], result.replicates[valid, 1]
+    if not valid.any():
+        sofa_aucs = sofa2_aucs = None
 
     if sofa_aucs is not None and sofa2_aucs is not None:
         # 计算置信区间
@@ -241,6 +244,20 @@ def analyze_score_distributions(df):
     plt.savefig('sofa_score_distributions.png', dpi=300, bbox_inches='tight')
     print("💾 评分分布图已保存为 'sofa_score_distributions.png'")
 
+def analyze_calibration(df):
+    """校准与决策曲线分析（utils/calibration.py）"""
+    print("\n📐 校准与决策曲线分析")
+    print("=" * 50)
+
+    report = calibration_report(df, score_cols=['sofa_score', 'sofa2_score'],
+                                outcome_cols=['icu_mortality', 'hospital_expire_flag'],
+                                subgroups={'overall': None}, n_bootstrap=200)
+    for _, row in report.metrics.iterrows():
+        print(f"{row['score']} / {row['outcome']}：ECE={row['ece']:.4f} "
+              f"(95% CI {row['ece_ci_low']:.4f}-{row['ece_ci_high']:.4f})，Brier={row['brier']:.4f}")
+    report.save('.', prefix='sofa_vs_sofa2_calibration')
+    return report
+
 def generate_summary_report(auc_results, df):
     """生成总结报告"""
     print("\n📋 总结报告")
@@ -311,6 +328,9 @@ def main():
         # 分析评分分布
         analyze_score_distributions(df)
 
+        # 校准与决策曲线
+        analyze_calibration(df)
+
         # 生成报告
         generate_summary_report(auc_results, df)
 
@@ -319,6 +339,7 @@ def main():
         print("  - sofa_vs_sofa2_roc_curves.png")
         print("  - sofa_score_distributions.png")
         print("  - sofa_vs_sofa2_auc_report.txt")
+        print("  - sofa_vs_sofa2_calibration_*.csv")
 
     except FileNotFoundError:
         print("❌ 错误：找不到CSV数据文件")
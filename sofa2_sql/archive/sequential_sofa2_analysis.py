@@ -4,6 +4,10 @@ SOFA2序贯分析：验证原文的"ICU day 1 to day 7"方法
 对比单日AUC vs 序贯AUC，解释与原文结果的差异
 """
 
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
 import pandas as pd
 import numpy as np
 from sklearn.metrics import roc_auc_score, roc_curve
@@ -13,12 +17,11 @@ from scipy import stats
 import warnings
 warnings.filterwarnings('ignore')
 
-def load_time_series_data():
-    """从数据库直接提取时间序列数据"""
-    print("📊 从数据库提取时间序列数据...")
+from utils.sofa2_daily import load_daily_sofa2
 
-    # 使用pandas直接连接数据库（模拟）
-    # 由于需要连接，我们先分析现有数据
+def load_time_series_data():
+    """加载分析人群（逐日SOFA2轨迹由 load_sequential_sofa2 从数据库提取）"""
+    print("📊 加载分析人群...")
 
     # 从现有的survival_auc_data.csv开始
     df = pd.read_csv('survival_auc_data.csv')
@@ -30,61 +33,30 @@ def load_time_series_data():
 
     return df_7d
 
-def simulate_sequential_sofa2(df):
-    """模拟序贯SOFA2评分变化"""
-    print("\n🔄 模拟ICU第1-7天SOFA2评分变化...")
-
-    np.random.seed(42)  # 确保结果可重现
-
-    # 基于临床实际情况模拟SOFA2变化模式
-    def generate_sofa2_trajectory(base_sofa2, mortality, icu_los):
-        """生成SOFA2轨迹"""
-        days = min(7, int(icu_los))
-
-        if mortality == 1:  # 死亡患者：评分倾向于上升或持续高位
-            trajectory = []
-            current = base_sofa2
-
-            for day in range(days):
-                if day == 0:
-                    trajectory.append(current)
-                else:
-                    # 死亡患者评分倾向于上升
-                    change = np.random.normal(0.3, 1.0)  # 平均每天增加0.3分
-                    current = max(0, min(24, current + change))
-                    trajectory.append(current)
-
-            return trajectory + [current] * (7 - len(trajectory))
-
-        else:  # 存活患者：评分倾向于下降
-            trajectory = []
-            current = base_sofa2
-
-            for day in range(days):
-                if day == 0:
-                    trajectory.append(current)
-                else:
-                    # 存活患者评分倾向于下降
-                    change = np.random.normal(-0.2, 0.8)  # 平均每天减少0.2分
-                    current = max(0, min(24, current + change))
-                    trajectory.append(current)
-
-            return trajectory + [current] * (7 - len(trajectory))
-
-    # 为每个患者生成7天SOFA2轨迹
-    sofa2_columns = []
-    for i in range(7):
-        df[f'sofa2_day{i+1}'] = df.apply(lambda row:
-            generate_sofa2_trajectory(row['sofa2_score'], row['icu_mortality'], row['icu_los_days'])[i],
-            axis=1)
-        sofa2_columns.append(f'sofa2_day{i+1}')
+def load_sequential_sofa2(df, days=7):
+    """从 sofa2_scores_hr_filtered 提取真实的ICU第1-7天SOFA2轨迹（一次分组扫描）"""
+    print(f"\n🔄 提取ICU第1-{days}天真实SOFA2评分...")
+
+    daily = load_daily_sofa2(days=days, stay_ids=df['stay_id'])
+    # 出ICU后的天沿用最后一天的评分
+    trajectory = daily.subset(df['stay_id']).matrix('sofa2_total', carry_forward=True)
+
+    sofa2_columns = [f'sofa2_day{i+1}' for i in range(days)]
+    for i, col in enumerate(sofa2_columns):
+        df[col] = trajectory[:, i]
+
+    # 第1天没有小时评分的患者无法构成轨迹
+    missing = df[sofa2_columns[0]].isna()
+    if missing.any():
+        print(f"⚠️  {missing.sum()}名患者缺少第1天SOFA2小时评分，已排除")
+        df = df[~missing].copy()
 
     # 计算序贯SOFA2指标
     df['sofa2_avg_7d'] = df[sofa2_columns].mean(axis=1)
     df['sofa2_max_7d'] = df[sofa2_columns].max(axis=1)
-    df['sofa2_trend'] = df['sofa2_day7'] - df['sofa2_day1']  # 7天变化趋势
+    df['sofa2_trend'] = df[sofa2_columns[-1]] - df[sofa2_columns[0]]  # 7天变化趋势
 
-    print(f"✅ 生成时间序列：SOFA2平均评分 {df['sofa2_avg_7d'].mean():.2f} ± {df['sofa2_avg_7d'].std():.2f}")
+    print(f"✅ 真实时间序列：SOFA2平均评分 {df['sofa2_avg_7d'].mean():.2f} ± {df['sofa2_avg_7d'].std():.2f}")
 
     return df, sofa2_columns
 
@@ -294,10 +266,9 @@ vs SOFA-1：
         report += """❌ 序贯方法未显示预期优势
 
 可能原因：
-1. 模拟数据与真实临床轨迹的差异
-2. 需要真实的ICU时间序列数据验证
-3. SOFA-2优势可能体现在特定患者群体
-4. 需要更复杂的序贯分析方法
+1. 原文人群与MIMIC-IV人群的差异
+2. SOFA-2优势可能体现在特定患者群体
+3. 需要更复杂的序贯分析方法
 """
 
     report += f"""
@@ -324,8 +295,8 @@ def main():
         # 1. 加载时间序列数据
         df = load_time_series_data()
 
-        # 2. 模拟序贯SOFA2评分
-        df, sofa2_columns = simulate_sequential_sofa2(df)
+        # 2. 提取真实序贯SOFA2评分
+        df, sofa2_columns = load_sequential_sofa2(df)
 
         # 3. 对比预测性能
         results, improvement = compare_sequential_vs_single_day(df, sofa2_columns)
@@ -347,7 +318,7 @@ def main():
             print("✅ 序贯SOFA2支持原文发现 - 时间序列分析显示了SOFA-2的优势")
             print("💡 这解释了我们之前单日分析与原文结果的差异")
         else:
-            print("❌ 需要真实时间序列数据进一步验证")
+            print("❌ 真实时间序列中序贯SOFA2未显示优势")
 
     except Exception as e:
         print(f"❌ 分析过程出错：{e}")
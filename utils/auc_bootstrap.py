@@ -0,0 +1,236 @@
+"""
+配对 Bootstrap AUC 引擎 - 多个评分共用同一组重采样，一次算出所有评分的 AUC 分布
+
+替代 old-docs/sofa2_auc_statistical_test.py 中逐次 df.iloc[...].copy() + roc_auc_score 的循环：
+    - 每个评分只排序一次：观测值映射到评分取值（并列组）编号
+    - AUC 只依赖各"取值组合 × 结局"单元格的人数，重采样直接在单元格上进行：
+      有放回重采样 n 例 ⇔ 单元格人数 ~ Multinomial(n, 人数/n)；Poisson 权重 ⇔ 单元格 ~ Poisson(人数)
+      （与逐例重采样同分布，但只需生成 B × 单元格数 个随机数）
+    - 加权 AUC 由各取值上的阳性/阴性权重和直接得到（Mann-Whitney 秩和，含并列 0.5）：
+          AUC = Σ_g P_g · (N_<g + N_g / 2) / (ΣP · ΣN)
+      所有评分的取值哑变量拼成一个稀疏矩阵，一块重采样只需一次稀疏矩阵乘法
+    - 同一块权重用于所有评分，结果天然配对；各块可以分发到多个进程
+
+SOFA 类整数评分只有几十个取值组合，7 万例、2000 次重采样、多个评分不到一秒。
+
+示例：
+    result = bootstrap_auc(df['icu_mortality'], df[['sofa_score', 'sofa2_score']], n_bootstrap=2000)
+    print(result.summary())
+    print(paired_difference(result, 'sofa2_score', 'sofa_score'))
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+class AUCBootstrapResult(NamedTuple):
+    """
+    names: 评分名称
+    auc: 原始样本 AUC，形状 (k,)
+    replicates: 每次重采样的 AUC，形状 (B, k)；阳性或阴性被抽空的重采样为 NaN
+    """
+    names: List[str]
+    auc: np.ndarray
+    replicates: np.ndarray
+
+    def summary(self, alpha: float = 0.05) -> pd.DataFrame:
+        """各评分的 AUC、Bootstrap 标准误和百分位置信区间"""
+        low, high = np.nanpercentile(self.replicates, [100 * alpha / 2, 100 * (1 - alpha / 2)], axis=0)
+        return pd.DataFrame({
+            'score': self.names,
+            'auc': self.auc,
+            'se': np.nanstd(self.replicates, axis=0, ddof=1),
+            'ci_low': low,
+            'ci_high': high,
+            'n_valid': np.sum(~np.isnan(self.replicates), axis=0),
+        })
+
+
+def _as_score_matrix(scores) -> (List[str], np.ndarray):
+    if isinstance(scores, pd.Series):
+        return [scores.name or 'score'], scores.to_numpy(dtype=float)[:, None]
+    if isinstance(scores, pd.DataFrame):
+        return [str(c) for c in scores.columns], scores.to_numpy(dtype=float)
+    if isinstance(scores, dict):
+        names = [str(k) for k in scores]
+        return names, np.column_stack([np.asarray(v, dtype=float) for v in scores.values()])
+    matrix = np.asarray(scores, dtype=float)
+    if matrix.ndim == 1:
+        matrix = matrix[:, None]
+    return [f"score_{i}" for i in range(matrix.shape[1])], matrix
+
+
+def _cell_design(y: np.ndarray, matrix: np.ndarray):
+    """
+    按 (各评分取值编号, 结局) 合并观测为单元格，构造单元格 → 取值的稀疏哑变量矩阵
+
+    返回 (单元格人数, 每例所属单元格, 阳性矩阵, 阴性矩阵, 每个评分的列区间)；
+    矩阵为 L × C（列 = 单元格），缺失值单元格在该评分下不计入。
+    """
+    n, k = matrix.shape
+    codes = np.full((n, k), -1, dtype=np.int64)
+    n_levels = []
+    for j in range(k):
+        valid = ~np.isnan(matrix[:, j])
+        levels, codes[valid, j] = np.unique(matrix[valid, j], return_inverse=True)
+        n_levels.append(len(levels))
+    cells, cell_of, counts = np.unique(np.column_stack([codes, y]), axis=0,
+                                       return_inverse=True, return_counts=True)
+    positive = cells[:, -1] == 1
+
+    rows, cols, slices = [], [], []
+    offset = 0
+    for j in range(k):
+        valid = np.flatnonzero(cells[:, j] >= 0)
+        rows.append(cells[valid, j] + offset)
+        cols.append(valid)
+        slices.append(slice(offset, offset + n_levels[j]))
+        offset += n_levels[j]
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    is_pos = positive[cols]
+    shape = (offset, len(cells))
+    # CSR × 稠密矩阵是最快的稀疏乘法
+    design_pos = sparse.csr_matrix((np.ones(is_pos.sum()), (rows[is_pos], cols[is_pos])), shape=shape)
+    design_neg = sparse.csr_matrix((np.ones((~is_pos).sum()), (rows[~is_pos], cols[~is_pos])), shape=shape)
+    return counts, cell_of.ravel(), design_pos, design_neg, slices
+
+
+def _weighted_aucs(weights: np.ndarray, design_pos, design_neg, slices) -> np.ndarray:
+    """weights (C × B，每列一次重采样) -> 每次重采样、每个评分的加权 AUC，形状 (B × k)"""
+    pos = np.asarray(design_pos @ weights).T          # B × L：各取值上的阳性权重和
+    neg = np.asarray(design_neg @ weights).T
+    aucs = np.empty((weights.shape[1], len(slices)))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for j, cols in enumerate(slices):
+            p, q = pos[:, cols], neg[:, cols]
+            below = np.cumsum(q, axis=1) - q          # 严格小于该取值的阴性权重
+            concordant = np.sum(p * (below + 0.5 * q), axis=1)
+            aucs[:, j] = concordant / (p.sum(axis=1) * q.sum(axis=1))
+    return aucs
+
+
+def _resample_weights(rng: np.random.Generator, counts: np.ndarray, cell_of: np.ndarray,
+                      size: int, method: str) -> np.ndarray:
+    """生成 C × size 的单元格权重矩阵（每列一次重采样）"""
+    n_cells, n = len(counts), len(cell_of)
+    if method == 'poisson':
+        weights = rng.poisson(counts, size=(size, n_cells))
+    elif n_cells * 8 <= n:
+        weights = rng.multinomial(n, counts / n, size=size)
+    else:
+        # 连续评分几乎每例一个单元格，逐例抽样 + bincount 比逐单元格二项抽样快
+        draws = cell_of[rng.integers(0, n, size=(size, n), dtype=np.int32)]
+        draws += np.arange(size)[:, None] * n_cells
+        weights = np.bincount(draws.ravel(), minlength=size * n_cells).reshape(size, n_cells)
+    return np.ascontiguousarray(weights.T, dtype=float)
+
+
+_WORKER_STATE = {}
+
+
+def _init_worker(counts, cell_of, design_pos, design_neg, slices, method):
+    _WORKER_STATE.update(counts=counts, cell_of=cell_of, design_pos=design_pos,
+                         design_neg=design_neg, slices=slices, method=method)
+
+
+def _run_block(task) -> np.ndarray:
+    seed, size = task
+    state = _WORKER_STATE
+    rng = np.random.default_rng(seed)
+    weights = _resample_weights(rng, state['counts'], state['cell_of'], size, state['method'])
+    return _weighted_aucs(weights, state['design_pos'], state['design_neg'], state['slices'])
+
+
+def bootstrap_auc(y, scores, n_bootstrap: int = 2000, seed: Optional[int] = 42,
+                  block_size: int = 200, method: str = 'multinomial',
+                  n_jobs: int = 1) -> AUCBootstrapResult:
+    """
+    配对 Bootstrap：所有评分使用同一组重采样
+
+    参数：
+        y: 二分类结局（0/1）
+        scores: 评分（Series / DataFrame / {name: array} / n×k 数组）；NaN 在该评分下不计入
+        n_bootstrap: 重采样次数
+        seed: 随机种子（结果只取决于 seed 和 block_size，与 n_jobs 无关）
+        block_size: 每块重采样次数（内存约 block_size × 单元格数 × 16 字节）
+        method: 'multinomial'（经典有放回重采样）或 'poisson'（Poisson(1) 权重，各块样本量不固定）
+        n_jobs: 进程数（-1 为全部 CPU）
+
+    返回：
+        AUCBootstrapResult(names, auc, replicates)
+    """
+    if method not in ('multinomial', 'poisson'):
+        raise ValueError("method 只能是 'multinomial' 或 'poisson'")
+    y = np.asarray(y, dtype=float)
+    names, matrix = _as_score_matrix(scores)
+    keep = ~np.isnan(y)
+    y, matrix = y[keep].astype(int), matrix[keep]
+    counts, cell_of, design_pos, design_neg, slices = _cell_design(y, matrix)
+
+    observed = _weighted_aucs(counts[:, None].astype(float), design_pos, design_neg, slices)[0]
+
+    sizes = [block_size] * (n_bootstrap // block_size)
+    if n_bootstrap % block_size:
+        sizes.append(n_bootstrap % block_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = list(zip(seeds, sizes))
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+    if n_jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(tasks)), initializer=_init_worker,
+                                 initargs=(counts, cell_of, design_pos, design_neg, slices, method)) as executor:
+            blocks = list(executor.map(_run_block, tasks))
+    else:
+        _init_worker(counts, cell_of, design_pos, design_neg, slices, method)
+        blocks = [_run_block(task) for task in tasks]
+
+    replicates = np.vstack(blocks) if blocks else np.empty((0, len(names)))
+    return AUCBootstrapResult(names, observed, replicates)
+
+
+def paired_difference(result: AUCBootstrapResult, score_a: str, score_b: str,
+                      alpha: float = 0.05) -> Dict[str, float]:
+    """
+    AUC(score_a) - AUC(score_b) 的配对 Bootstrap 推断
+
+    返回：
+        diff, se, ci_low, ci_high, p_value（双尾，按 Bootstrap 差值越过 0 的比例）
+    """
+    a, b = result.names.index(score_a), result.names.index(score_b)
+    diffs = result.replicates[:, a] - result.replicates[:, b]
+    diffs = diffs[~np.isnan(diffs)]
+    observed = result.auc[a] - result.auc[b]
+    low, high = np.percentile(diffs, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+    one_sided = np.mean(diffs < 0) if observed >= 0 else np.mean(diffs > 0)
+    return {
+        'diff': observed,
+        'se': np.std(diffs, ddof=1),
+        'ci_low': low,
+        'ci_high': high,
+        'p_value': min(1.0, 2 * min(one_sided, 1 - one_sided)),
+        'n_valid': len(diffs),
+    }
+
+
+def bootstrap_auc_by_group(df: pd.DataFrame, outcome: str, score_cols: Sequence[str],
+                           group_col: str, **kwargs) -> pd.DataFrame:
+    """
+    按亚组分别做配对 Bootstrap，返回每个亚组、每个评分的 AUC 与置信区间
+
+    kwargs 传给 bootstrap_auc（n_bootstrap、seed、n_jobs 等）
+    """
+    frames = []
+    for group, sub in df.groupby(group_col, sort=True):
+        if sub[outcome].nunique() < 2:
+            continue
+        summary = bootstrap_auc(sub[outcome], sub[list(score_cols)], **kwargs).summary()
+        summary.insert(0, group_col, group)
+        summary.insert(1, 'n', len(sub))
+        frames.append(summary)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
@@ -0,0 +1,353 @@
+"""
+校准与决策曲线 - 整数评分（SOFA-1 / SOFA-2 总分）映射为死亡风险后的校准和净获益分析
+
+评分只有约 25 个取值，所有统计量都只依赖"亚组 × 评分取值 × 结局"的人数：
+    - 风险映射：在全队列上按取值人数拟合 logistic 回归 logit p = a + b · score（可换成外部死亡率表）
+    - 校准截距（calibration-in-the-large，logit p 作 offset）与校准斜率：按取值加权的批量 Newton 法
+    - ECE：以评分取值为分箱，Σ n_l · |观察率_l - p_l| / n；Brier 同样由取值人数得到
+    - 校准曲线：保序回归（min-max 公式，L × L 区间均值一次算完）和 LOESS（预测风险上的三次权局部线性）
+    - 决策曲线：Σ_{p_l ≥ t} 阳性 / 阴性人数 → 净获益 = TP/n - FP/n · t/(1-t)，一次矩阵乘法覆盖所有阈值
+Bootstrap 在"亚组 × 各评分取值 × 结局"单元格上重采样（与 utils/auc_bootstrap.py 相同），
+同一组权重用于所有评分，点估计与所有重采样在同一批数组运算中完成。
+
+风险映射在原始队列上拟合一次后固定，重采样只评估该映射（不重新拟合），
+因此全队列的校准截距 / 斜率恒为 0 / 1，亚组或外部映射下才有意义。
+
+示例：
+    report = calibration_report(df, score_cols=['sofa_score', 'sofa2_score'], n_bootstrap=200)
+    print(report.metrics)
+    report.save('calibration_output')
+"""
+
+import os
+from typing import Dict, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.special import expit, logit
+
+from utils.auc_bootstrap import _resample_weights
+from utils.score_grid import DEFAULT_OUTCOMES, DEFAULT_SCORES, _as_float, _default_subgroups, _subgroup_labels
+
+DEFAULT_THRESHOLDS = np.round(np.arange(0.01, 1.0, 0.01), 2)
+
+
+class CalibrationReport(NamedTuple):
+    """
+    metrics: score, outcome, subgroup, level, n, events 以及
+             citl / slope / ece / brier 各自的点估计和 _ci_low / _ci_high
+    curves: 每个评分取值的 predicted、observed、isotonic、loess（含 loess 置信带）
+    decision: 每个阈值的 net_benefit（含置信区间）与 treat_all 参照
+    """
+    metrics: pd.DataFrame
+    curves: pd.DataFrame
+    decision: pd.DataFrame
+
+    def save(self, output_dir: str, prefix: str = 'calibration') -> None:
+        os.makedirs(output_dir, exist_ok=True)
+        for name in self._fields:
+            getattr(self, name).to_csv(os.path.join(output_dir, f'{prefix}_{name}.csv'), index=False)
+        print(f"💾 校准报告已保存到 {output_dir}/{prefix}_*.csv")
+
+
+def _fit_binomial(design: np.ndarray, offset: np.ndarray, events: np.ndarray, totals: np.ndarray,
+                  iterations: int = 30, l2: float = 0.0) -> np.ndarray:
+    """
+    批量分组 logistic 回归（Newton 法）
+
+    design: L × k 设计矩阵（第 0 列为截距）；offset: (L,)；events / totals: (..., L) 每个取值的阳性数 / 人数
+    l2: 除截距外各系数的 L2 惩罚（0 为普通最大似然）
+    返回 (..., k) 系数，未收敛（如完全分离）为 NaN
+    """
+    lead = events.shape[:-1]
+    events = events.reshape(-1, events.shape[-1])
+    totals = totals.reshape(-1, totals.shape[-1])
+    k = design.shape[1]
+    beta = np.zeros((len(events), k))
+    penalty = np.full(k, float(l2))
+    penalty[0] = 0.0
+    ridge = np.diag(penalty + 1e-9)
+    step = np.zeros_like(beta)
+    for _ in range(iterations):
+        p = expit(beta @ design.T + offset)
+        w = totals * p * (1 - p)
+        grad = (events - totals * p) @ design - penalty * beta
+        hess = (design.T * w[:, None, :]) @ design + ridge               # M × k × k（批量 BLAS）
+        step = np.linalg.solve(hess, grad[..., None])[..., 0]
+        beta += step
+        if np.abs(step).max() < 1e-8:
+            break
+    beta[np.abs(step).max(axis=1) > 1e-6] = np.nan
+    return beta.reshape(lead + (k,))
+
+
+def fit_risk_map(score, y) -> pd.Series:
+    """
+    在给定队列上拟合 logit p = a + b · score，返回 评分取值 -> 死亡风险 的映射表
+
+    可在推导队列上拟合后，通过 calibration_report(risk_maps=...) 用于其他队列
+    """
+    score, y = _as_float(pd.Series(score)), _as_float(pd.Series(y))
+    keep = ~np.isnan(score) & ~np.isnan(y)
+    levels, codes = np.unique(score[keep], return_inverse=True)
+    totals = np.bincount(codes, minlength=len(levels)).astype(float)
+    events = np.bincount(codes, weights=y[keep], minlength=len(levels))
+    design = np.column_stack([np.ones(len(levels)), levels])
+    beta = _fit_binomial(design, np.zeros(len(levels)), events, totals)
+    return pd.Series(expit(design @ beta), index=pd.Index(levels, name='score'), name='risk')
+
+
+def _isotonic(events: np.ndarray, totals: np.ndarray) -> np.ndarray:
+    """
+    加权保序回归（取值已按预测风险升序）：iso_i = max_{a≤i} min_{b≥i} 均值(a..b)
+
+    (..., L) -> (..., L)；区间均值由累积和一次得到，人数为 0 的取值结果为 NaN
+    """
+    cum_e = np.concatenate([np.zeros(events.shape[:-1] + (1,)), np.cumsum(events, axis=-1)], axis=-1)
+    cum_n = np.concatenate([np.zeros(totals.shape[:-1] + (1,)), np.cumsum(totals, axis=-1)], axis=-1)
+    size = events.shape[-1]
+    # mean[..., a, b] = 区间 a..b 的观察率（b < a 或区间无人时为 +inf，不参与取最小）
+    span_e = cum_e[..., None, 1:] - cum_e[..., :-1, None]
+    span_n = cum_n[..., None, 1:] - cum_n[..., :-1, None]
+    upper = np.triu(np.ones((size, size), dtype=bool))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(upper & (span_n > 0), span_e / span_n, np.inf)
+    # 对 b 做后缀最小：suffix[..., a, i] = min_{b≥i} mean[..., a, b]
+    suffix = np.minimum.accumulate(mean[..., ::-1], axis=-1)[..., ::-1]
+    suffix = np.where(upper & np.isfinite(suffix), suffix, -np.inf)
+    iso = suffix.max(axis=-2)
+    return np.where(totals > 0, iso, np.nan)
+
+
+def _loess_kernel(predicted: np.ndarray, totals: np.ndarray, span: float) -> np.ndarray:
+    """
+    三次权核矩阵 K[..., i, j]：第 i 个取值的窗口包含最近的若干取值，累计人数达到 span · n
+
+    totals (..., L) 为点估计人数，窗口宽度固定后用于所有重采样
+    """
+    dist = np.abs(predicted[:, None] - predicted[None, :])              # L × L
+    order = np.argsort(dist, axis=1, kind='stable')
+    sorted_dist = np.take_along_axis(dist, order, axis=1)
+    cum = np.cumsum(totals[..., order], axis=-1)                        # (..., L, L)
+    target = span * totals.sum(axis=-1)[..., None, None]
+    reach = np.minimum((cum < target).sum(axis=-1), len(predicted) - 1)
+    width = np.maximum(sorted_dist[np.arange(len(predicted)), reach], 1e-12) * 1.0001
+    ratio = np.clip(dist / width[..., :, None], 0, 1)
+    return (1 - ratio ** 3) ** 3
+
+
+def _loess(predicted: np.ndarray, events: np.ndarray, totals: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    """
+    局部线性回归：在每个取值 i 上最小化 Σ_j K_ij Σ_个体 (y - a - b · p_j)²
+
+    events / totals (..., B, L)，kernel (..., L, L)；返回 (..., B, L)，截断到 [0, 1]
+    """
+    x = predicted
+    s0 = np.einsum('...bl,...il->...bi', totals, kernel)
+    s1 = np.einsum('...bl,...il->...bi', totals * x, kernel)
+    s2 = np.einsum('...bl,...il->...bi', totals * x * x, kernel)
+    t0 = np.einsum('...bl,...il->...bi', events, kernel)
+    t1 = np.einsum('...bl,...il->...bi', events * x, kernel)
+    det = s0 * s2 - s1 ** 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        local = (s2 * t0 - s1 * t1 + (s0 * t1 - s1 * t0) * x) / det
+        flat = t0 / s0
+    fitted = np.where(np.abs(det) > 1e-9 * np.maximum(s0 ** 2, 1e-300), local, flat)
+    return np.clip(fitted, 0, 1)
+
+
+def _calibration_arrays(predicted: np.ndarray, events: np.ndarray, totals: np.ndarray,
+                        thresholds: np.ndarray, span: float) -> Dict[str, np.ndarray]:
+    """
+    events / totals: (G, 1 + B, L)，第 0 列为点估计；predicted (L,) 已升序
+    """
+    lp = logit(np.clip(predicted, 1e-12, 1 - 1e-12))
+    ones = np.ones((len(predicted), 1))
+    n = totals.sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        observed = events / totals
+        ece = np.nansum(totals * np.abs(observed - predicted), axis=-1) / n
+        brier = (events * (1 - predicted) ** 2 + (totals - events) * predicted ** 2).sum(axis=-1) / n
+
+        citl = _fit_binomial(ones, lp, events, totals)[..., 0]
+        slope = _fit_binomial(np.column_stack([ones, lp]), np.zeros_like(lp), events, totals)[..., 1]
+
+        kernel = _loess_kernel(predicted, totals[:, 0], span)
+        loess = _loess(predicted, events, totals, kernel)
+        loess = np.where(totals[:, :1] > 0, loess, np.nan)
+
+        treat = (predicted[:, None] >= thresholds[None, :]).astype(float)   # L × T
+        odds = thresholds / (1 - thresholds)
+        tp, fp = events @ treat, (totals - events) @ treat
+        net_benefit = (tp - fp * odds) / n[..., None]
+        prevalence = events.sum(axis=-1) / n
+        treat_all = prevalence[..., None] - (1 - prevalence[..., None]) * odds
+
+    return {
+        'n': n, 'events': events.sum(axis=-1), 'observed': observed,
+        'citl': citl, 'slope': slope, 'ece': ece, 'brier': brier,
+        'isotonic': _isotonic(events, totals), 'loess': loess,
+        'net_benefit': net_benefit, 'treat_all': treat_all,
+    }
+
+
+def _interval(replicates: np.ndarray, alpha: float):
+    """replicates (G, B, ...) -> 沿 B 轴的百分位区间（无重采样时为 NaN）"""
+    if replicates.shape[1] == 0:
+        nan = np.full(replicates.shape[:1] + replicates.shape[2:], np.nan)
+        return nan, nan
+    quantiles = [100 * alpha / 2, 100 * (1 - alpha / 2)]
+    values = np.moveaxis(replicates, 1, -1)
+    missing = np.isnan(values)
+    out = np.percentile(values, quantiles, axis=-1)
+    # 只有部分重采样为 NaN（如个别重采样无阳性）的位置才需要较慢的 nanpercentile
+    partial = missing.any(axis=-1) & ~missing.all(axis=-1)
+    if partial.any():
+        out[:, partial] = np.nanpercentile(values[partial], quantiles, axis=-1)
+    return out[0], out[1]
+
+
+def _cell_key(columns: Sequence[np.ndarray]):
+    """
+    多列小整数编码（-1 为缺失）合并为单个 int64 键后 np.unique，比 np.unique(axis=0) 快得多
+
+    返回 (单元格编码矩阵 C × k, 每例所属单元格, 单元格人数)
+    """
+    radix = [int(c.max(initial=-1)) + 2 for c in columns]
+    key = np.zeros(len(columns[0]), dtype=np.int64)
+    for column, base in zip(columns, radix):
+        key = key * base + (column + 1)
+    keys, cell_of, counts = np.unique(key, return_inverse=True, return_counts=True)
+    cells = np.empty((len(keys), len(columns)), dtype=np.int64)
+    for j in range(len(columns) - 1, -1, -1):
+        keys, cells[:, j] = np.divmod(keys, radix[j])
+    return cells - 1, cell_of, counts
+
+
+def calibration_report(df: pd.DataFrame, score_cols: Optional[Sequence[str]] = None,
+                       outcome_cols: Optional[Sequence[str]] = None,
+                       subgroups: Optional[Dict[str, object]] = None,
+                       risk_maps: Optional[Dict[str, pd.Series]] = None,
+                       thresholds: Sequence[float] = DEFAULT_THRESHOLDS,
+                       n_bootstrap: int = 200, seed: Optional[int] = 42,
+                       alpha: float = 0.05, span: float = 0.75,
+                       method: str = 'multinomial') -> CalibrationReport:
+    """
+    评分 × 结局 × 亚组 的校准与决策曲线报告
+
+    参数：
+        df: patient_outcomes（或包含评分、结局、亚组列的任意表）
+        score_cols: 整数评分列，默认 DEFAULT_SCORES
+        outcome_cols: 0/1 结局列，默认 DEFAULT_OUTCOMES 中 df 里存在的列
+        subgroups: {亚组名: 列名 / 函数 / None}，默认 DEFAULT_SUBGROUPS 中 df 里可用的定义
+        risk_maps: {评分列: 评分取值 -> 风险 的 Series}（如 fit_risk_map 在推导队列上的结果）；
+                   未给出的评分在本队列上按结局拟合 logistic 映射
+        thresholds: 决策曲线的风险阈值
+        n_bootstrap: 重采样次数（0 为只算点估计）
+        span: LOESS 窗口覆盖的人数比例
+        method: 'multinomial' 或 'poisson'，同 utils.auc_bootstrap
+
+    返回：
+        CalibrationReport(metrics, curves, decision)
+    """
+    score_cols = list(score_cols or DEFAULT_SCORES)
+    if outcome_cols is None:
+        outcome_cols = [c for c in DEFAULT_OUTCOMES if c in df.columns]
+    if subgroups is None:
+        subgroups = _default_subgroups(df)
+    risk_maps = dict(risk_maps or {})
+    thresholds = np.asarray(thresholds, dtype=float)
+
+    # 评分取值编码只算一次（缺失为 -1）
+    score_levels, score_codes = {}, {}
+    for col in score_cols:
+        values = _as_float(df[col])
+        valid = ~np.isnan(values)
+        codes = np.full(len(df), -1, dtype=np.int64)
+        score_levels[col], codes[valid] = np.unique(values[valid], return_inverse=True)
+        score_codes[col] = codes
+    subgroup_codes = {name: pd.factorize(_subgroup_labels(df, spec), sort=True)
+                      for name, spec in subgroups.items()}
+
+    seeds = iter(np.random.SeedSequence(seed).spawn(len(outcome_cols) * len(subgroups)))
+    metric_rows, curve_frames, decision_frames = [], [], []
+    for outcome_col in outcome_cols:
+        y = _as_float(df[outcome_col])
+        predicted = {}
+        for col in score_cols:
+            levels = score_levels[col]
+            if col in risk_maps:
+                table = risk_maps[col].sort_index()
+                predicted[col] = np.interp(levels, table.index.to_numpy(dtype=float), table.to_numpy(dtype=float))
+            else:
+                predicted[col] = fit_risk_map(df[col], y).reindex(levels).to_numpy()
+
+        for name, (group_codes, group_levels) in subgroup_codes.items():
+            rng = np.random.default_rng(next(seeds))
+            keep = ~np.isnan(y) & (group_codes >= 0)
+            cells, cell_of, counts = _cell_key([group_codes[keep]] + [score_codes[c][keep] for c in score_cols]
+                                               + [y[keep].astype(np.int64)])
+            weights = counts[:, None].astype(float)
+            if n_bootstrap:
+                weights = np.hstack([weights, _resample_weights(rng, counts, cell_of, n_bootstrap, method)])
+            positive = cells[:, -1] == 1
+            n_groups = len(group_levels)
+
+            for j, col in enumerate(score_cols):
+                n_levels = len(score_levels[col])
+                valid = cells[:, 1 + j] >= 0
+                row = cells[valid, 0] * n_levels + cells[valid, 1 + j]
+                # (亚组 × 取值) × 单元格 的稀疏哑变量矩阵乘以权重矩阵，得到每次重采样的直方图
+                shape = (n_groups * n_levels, len(cells))
+                cols = np.flatnonzero(valid)
+                design = sparse.csr_matrix((np.ones(len(cols)), (row, cols)), shape=shape)
+                design_pos = sparse.csr_matrix((np.ones(positive[cols].sum()),
+                                                (row[positive[cols]], cols[positive[cols]])), shape=shape)
+                totals = np.asarray(design @ weights).reshape(n_groups, n_levels, -1).transpose(0, 2, 1)
+                events = np.asarray(design_pos @ weights).reshape(n_groups, n_levels, -1).transpose(0, 2, 1)
+
+                risk = predicted[col]
+                order = np.argsort(risk, kind='stable')
+                arrays = _calibration_arrays(risk[order], events[..., order], totals[..., order],
+                                             thresholds, span)
+                keys = {'score': col, 'outcome': outcome_col, 'subgroup': name}
+
+                for g, level in enumerate(group_levels):
+                    row_out = dict(keys, level=level, n=int(arrays['n'][g, 0]),
+                                   events=int(arrays['events'][g, 0]))
+                    for metric in ('citl', 'slope', 'ece', 'brier'):
+                        low, high = _interval(arrays[metric][g:g + 1, 1:], alpha)
+                        row_out.update({metric: arrays[metric][g, 0],
+                                        f'{metric}_ci_low': low[0], f'{metric}_ci_high': high[0]})
+                    metric_rows.append(row_out)
+
+                loess_low, loess_high = _interval(arrays['loess'][:, 1:], alpha)
+                nb_low, nb_high = _interval(arrays['net_benefit'][:, 1:], alpha)
+                for g, level in enumerate(group_levels):
+                    curve_frames.append(pd.DataFrame(dict(
+                        keys, level=level,
+                        score_value=score_levels[col][order],
+                        n=totals[g, 0].astype(int),
+                        events=events[g, 0].astype(int),
+                        predicted=risk[order],
+                        observed=arrays['observed'][g, 0],
+                        isotonic=arrays['isotonic'][g, 0],
+                        loess=arrays['loess'][g, 0],
+                        loess_ci_low=loess_low[g],
+                        loess_ci_high=loess_high[g],
+                    )))
+                    decision_frames.append(pd.DataFrame(dict(
+                        keys, level=level,
+                        threshold=thresholds,
+                        net_benefit=arrays['net_benefit'][g, 0],
+                        ci_low=nb_low[g],
+                        ci_high=nb_high[g],
+                        treat_all=arrays['treat_all'][g, 0],
+                    )))
+
+    metrics = pd.DataFrame(metric_rows)
+    curves = pd.concat(curve_frames, ignore_index=True) if curve_frames else pd.DataFrame()
+    decision = pd.concat(decision_frames, ignore_index=True) if decision_frames else pd.DataFrame()
+    print(f"✅ 校准报告：{len(score_cols)} 个评分 × {len(outcome_cols)} 个结局，{len(metrics)} 行指标")
+    return CalibrationReport(metrics, curves, decision)
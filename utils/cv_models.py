@@ -0,0 +1,263 @@
+"""
+重复交叉验证的器官分项 logistic 模型 - SOFA-1 与 SOFA-2 六个分项分别拟合，比较折外预测
+
+每个特征集（默认 SOFA-1 / SOFA-2 六个器官分项）× 每个结局做 R 次重复的 K 折分层交叉验证：
+    - 分项都是 0-4 的整数，先把每例映射到"分项取值组合"（实际只有几千种），
+      模型在组合上按人数加权拟合（与逐例拟合的似然完全相同）
+    - 一次重复的 K 折训练集人数堆成 K × 组合数 矩阵，用批量 Newton 法一次拟合全部折
+      （utils/calibration.py 的 _fit_binomial，带 L2 惩罚）
+    - 任务按 (结局, 特征集, 重复) 分发到进程池；组合编号、结局矩阵和折外预测输出放在共享内存中，
+      各进程直接读写，不再为每个任务 pickle 整个特征矩阵
+    - 同一结局、同一重复的分折对所有特征集相同，折外预测天然配对，
+      可直接送入 utils.delong.fast_delong 和 utils.auc_bootstrap.bootstrap_auc 比较
+
+缺失的分项按 0 分处理（与 patient_outcomes 中总分 COALESCE(…, 0) 一致）。
+
+示例：
+    cv = cross_validate_components(df, outcome_cols=['icu_mortality', 'hospital_mortality'],
+                                   n_splits=10, n_repeats=10, n_jobs=-1)
+    print(cv.repeat_auc())
+    print(cv.compare('icu_mortality'))
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy.special import expit
+
+from utils.calibration import _fit_binomial
+from utils.score_grid import DEFAULT_OUTCOMES, _as_float
+
+SOFA1_COMPONENTS = ['sofa_respiration', 'sofa_coagulation', 'sofa_liver',
+                    'sofa_cardiovascular', 'sofa_cns', 'sofa_renal']
+
+SOFA2_COMPONENTS = ['sofa2_respiratory', 'sofa2_hemostasis', 'sofa2_liver',
+                    'sofa2_cardiovascular', 'sofa2_brain', 'sofa2_kidney']
+
+FEATURE_SETS = {
+    'sofa1_components': SOFA1_COMPONENTS,
+    'sofa2_components': SOFA2_COMPONENTS,
+}
+
+
+class CVResult(NamedTuple):
+    """
+    feature_sets / outcomes: 特征集名与结局名
+    stay_ids: 每例的 stay_id（无该列时为行号）
+    y: 结局矩阵，形状 (O, n)，NaN 为缺失
+    oof: 折外预测概率，形状 (O, S, R, n)，结局缺失的病例为 NaN
+    """
+    feature_sets: List[str]
+    outcomes: List[str]
+    stay_ids: np.ndarray
+    y: np.ndarray
+    oof: np.ndarray
+
+    def predictions(self, outcome: str) -> pd.DataFrame:
+        """某个结局的合并折外预测（R 次重复取平均）：stay_id、结局和每个特征集一列"""
+        o = self.outcomes.index(outcome)
+        frame = pd.DataFrame({'stay_id': self.stay_ids, outcome: self.y[o]})
+        for s, name in enumerate(self.feature_sets):
+            frame[name] = self.oof[o, s].mean(axis=0)
+        return frame[~np.isnan(self.y[o])].reset_index(drop=True)
+
+    def repeat_auc(self) -> pd.DataFrame:
+        """每次重复的折外 AUC 的均值 / 标准差，以及合并预测的 AUC"""
+        from utils.delong import fast_delong
+
+        rows = []
+        for o, outcome in enumerate(self.outcomes):
+            keep = ~np.isnan(self.y[o])
+            for s, name in enumerate(self.feature_sets):
+                per_repeat = fast_delong(self.y[o, keep], self.oof[o, s][:, keep].T).auc
+                pooled = fast_delong(self.y[o, keep], self.oof[o, s][:, keep].mean(axis=0)).auc[0]
+                rows.append({'outcome': outcome, 'feature_set': name,
+                             'auc_mean': per_repeat.mean(),
+                             'auc_sd': per_repeat.std(ddof=1) if len(per_repeat) > 1 else np.nan,
+                             'auc_pooled': pooled, 'n_repeats': len(per_repeat)})
+        return pd.DataFrame(rows)
+
+    def compare(self, outcome: str, method: str = 'delong', alpha: float = 0.05,
+                **kwargs) -> pd.DataFrame:
+        """
+        合并折外预测的两两 AUC 比较
+
+        method: 'delong'（utils.delong.fast_delong）或 'bootstrap'
+                （utils.auc_bootstrap.bootstrap_auc，kwargs 传给它，如 n_bootstrap、n_jobs）
+        """
+        frame = self.predictions(outcome)
+        scores = frame[self.feature_sets]
+        if method == 'delong':
+            from utils.delong import fast_delong
+            return fast_delong(frame[outcome], scores).pairwise(alpha=alpha)
+        if method == 'bootstrap':
+            from itertools import combinations
+            from utils.auc_bootstrap import bootstrap_auc, paired_difference
+            result = bootstrap_auc(frame[outcome], scores, **kwargs)
+            return pd.DataFrame([dict(score_a=a, score_b=b, **paired_difference(result, a, b, alpha))
+                                 for a, b in combinations(self.feature_sets, 2)])
+        raise ValueError("method 只能是 'delong' 或 'bootstrap'")
+
+
+def _pattern_design(df: pd.DataFrame, columns: Sequence[str], encoding: str):
+    """
+    每例映射到分项取值组合；返回 (组合设计矩阵 L × k，含截距列, 每例组合编号 int32)
+
+    encoding: 'onehot'（每个分项每个非 0 取值一个哑变量）或 'linear'（分项分值直接作为协变量）
+    """
+    values = np.column_stack([np.nan_to_num(_as_float(df[c]), nan=0.0) for c in columns]).astype(np.int64)
+    patterns, pattern_of = np.unique(values, axis=0, return_inverse=True)
+    if encoding == 'linear':
+        features = patterns.astype(float)
+    elif encoding == 'onehot':
+        dummies = [patterns[:, j] == level for j in range(len(columns))
+                   for level in np.unique(patterns[:, j]) if level != 0]
+        features = np.column_stack(dummies).astype(float) if dummies else np.empty((len(patterns), 0))
+    else:
+        raise ValueError("encoding 只能是 'onehot' 或 'linear'")
+    design = np.column_stack([np.ones(len(patterns)), features])
+    return design, pattern_of.ravel().astype(np.int32)
+
+
+def _stratified_folds(y: np.ndarray, n_splits: int, rng: np.random.Generator) -> np.ndarray:
+    """分层分折：阳性、阴性分别随机排列后轮流分到各折；y 缺失的病例折号为 -1"""
+    folds = np.full(len(y), -1, dtype=np.int64)
+    offset = 0
+    for label in (1, 0):
+        idx = np.flatnonzero(y == label)
+        idx = idx[rng.permutation(len(idx))]
+        folds[idx] = (np.arange(len(idx)) + offset) % n_splits
+        offset += len(idx)
+    return folds
+
+
+_WORKER_STATE = {}
+
+
+def _attach(spec):
+    """spec = (共享内存名, 形状, dtype) -> (SharedMemory, ndarray)；进程内运行时直接传 ndarray"""
+    if isinstance(spec, np.ndarray):
+        return None, spec
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _share(blocks: list, shape, dtype, source: Optional[np.ndarray] = None):
+    """创建共享内存数组（记录到 blocks 以便释放），返回 (spec, ndarray 视图)"""
+    dtype = np.dtype(dtype)
+    shm = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+    blocks.append(shm)
+    view = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    if source is not None:
+        view[:] = source
+    return (shm.name, shape, dtype), view
+
+
+def _init_worker(designs, pattern_spec, y_spec, oof_spec, n_splits, seed, l2):
+    handles = []
+    arrays = {}
+    for key, spec in (('patterns', pattern_spec), ('y', y_spec), ('oof', oof_spec)):
+        shm, arrays[key] = _attach(spec)
+        if shm is not None:
+            handles.append(shm)
+    _WORKER_STATE.update(arrays, designs=designs, n_splits=n_splits, seed=seed, l2=l2, handles=handles)
+
+
+def _run_task(task) -> None:
+    o, s, r = task
+    state = _WORKER_STATE
+    y = state['y'][o]
+    pattern_of = state['patterns'][s]
+    design = state['designs'][s]
+    n_splits = state['n_splits']
+    n_patterns = len(design)
+
+    # 分折只取决于 (seed, 结局, 重复)，所有特征集共用
+    folds = _stratified_folds(y, n_splits, np.random.default_rng([state['seed'], o, r]))
+    valid = folds >= 0
+    positive = valid & (y == 1)
+    totals_all = np.bincount(pattern_of[valid], minlength=n_patterns)
+    events_all = np.bincount(pattern_of[positive], minlength=n_patterns)
+    # 每折训练集 = 全部 - 该折：K × L 人数一次得到
+    code = folds[valid] * n_patterns + pattern_of[valid]
+    fold_totals = np.bincount(code, minlength=n_splits * n_patterns).reshape(n_splits, n_patterns)
+    fold_events = np.bincount(folds[positive] * n_patterns + pattern_of[positive],
+                              minlength=n_splits * n_patterns).reshape(n_splits, n_patterns)
+    beta = _fit_binomial(design, np.zeros(n_patterns), (events_all - fold_events).astype(float),
+                         (totals_all - fold_totals).astype(float), l2=state['l2'])
+    probs = expit(beta @ design.T)                                   # K × L
+
+    out = state['oof'][o, s, r]
+    out[:] = np.nan
+    out[valid] = probs[folds[valid], pattern_of[valid]]
+
+
+def cross_validate_components(df: pd.DataFrame, feature_sets: Optional[Dict[str, Sequence[str]]] = None,
+                              outcome_cols: Optional[Sequence[str]] = None,
+                              n_splits: int = 10, n_repeats: int = 10, seed: int = 42,
+                              encoding: str = 'onehot', l2: float = 1.0,
+                              n_jobs: int = 1) -> CVResult:
+    """
+    各特征集 × 各结局的重复分层 K 折交叉验证 logistic 模型
+
+    参数：
+        df: patient_outcomes（或包含分项和结局列的任意表）
+        feature_sets: {特征集名: 分项列}，默认 SOFA-1 / SOFA-2 六个器官分项
+        outcome_cols: 0/1 结局列，默认 DEFAULT_OUTCOMES 中 df 里存在的列
+        n_splits / n_repeats: 折数与重复次数
+        seed: 随机种子（分折只取决于 seed、结局和重复序号，与 n_jobs 无关）
+        encoding: 'onehot'（分项每个取值一个系数）或 'linear'（每个分项一个系数）
+        l2: 除截距外系数的 L2 惩罚
+        n_jobs: 进程数（-1 为全部 CPU）
+
+    返回：
+        CVResult(feature_sets, outcomes, stay_ids, y, oof)
+    """
+    feature_sets = dict(feature_sets or FEATURE_SETS)
+    if outcome_cols is None:
+        outcome_cols = [c for c in DEFAULT_OUTCOMES if c in df.columns]
+    names, outcomes = list(feature_sets), list(outcome_cols)
+
+    designs, patterns = [], []
+    for name in names:
+        design, pattern_of = _pattern_design(df, feature_sets[name], encoding)
+        designs.append(design)
+        patterns.append(pattern_of)
+    patterns = np.vstack(patterns)                                   # S × n
+    y = np.vstack([_as_float(df[c]) for c in outcomes])              # O × n
+    stay_ids = df['stay_id'].to_numpy() if 'stay_id' in df.columns else np.arange(len(df))
+    oof_shape = (len(outcomes), len(names), n_repeats, len(df))
+    tasks = [(o, s, r) for o in range(len(outcomes)) for s in range(len(names)) for r in range(n_repeats)]
+    print(f"🔁 交叉验证：{len(names)} 个特征集 × {len(outcomes)} 个结局 × {n_repeats} 次 {n_splits} 折"
+          f"（组合数 {', '.join(str(len(d)) for d in designs)}）")
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+    if n_jobs > 1 and len(tasks) > 1:
+        blocks = []
+        try:
+            pattern_spec, _ = _share(blocks, patterns.shape, patterns.dtype, patterns)
+            y_spec, _ = _share(blocks, y.shape, y.dtype, y)
+            oof_spec, oof_view = _share(blocks, oof_shape, float)
+            with ProcessPoolExecutor(max_workers=min(n_jobs, len(tasks)), initializer=_init_worker,
+                                     initargs=(designs, pattern_spec, y_spec, oof_spec, n_splits, seed, l2)) as executor:
+                list(executor.map(_run_task, tasks))
+            oof = oof_view.copy()
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+    else:
+        oof = np.empty(oof_shape)
+        _init_worker(designs, patterns, y, oof, n_splits, seed, l2)
+        for task in tasks:
+            _run_task(task)
+    _WORKER_STATE.clear()
+
+    print("✅ 交叉验证完成")
+    return CVResult(names, outcomes, stay_ids, y, oof)
@@ -1,14 +1,35 @@
 """
 数据库辅助工具 - 让Claude Code可以方便地查询数据库
 类似于Navicat的功能，但更强大
+
+所有查询共用进程级连接池（每个 DB_CONFIG 键一个，见 get_pool / configure_pool），
+脚本通过 get_connection() 拿到的连接 close() 时归还连接池。
+
+pandas / psycopg2 / asyncio 在用到的函数内部才导入，import 本模块本身不加载它们
+（sofa2 status / count 等命令行子命令需要亚秒级启动）。
 """
 
-import pandas as pd
-import psycopg2
-from sqlalchemy import create_engine
-from typing import Optional, Union
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from statistics import NormalDist
+from typing import TYPE_CHECKING, List, NamedTuple, Optional, Sequence, Tuple, Union
 import subprocess
 
+if TYPE_CHECKING:
+    import pandas as pd
+
 def get_windows_ip():
     """自动获取Windows主机IP"""
     # Fixed IP for this system
@@ -33,8 +54,352 @@ DB_CONFIG = {
     }
 }
 
+# 连接池配置（可用 configure_pool 按数据库覆盖）
+POOL_CONFIG = {
+    'maxconn': 8,                   # 每个数据库最多同时打开的连接数
+    'checkout_timeout': 60,         # 连接池耗尽时最长等待秒数
+    'health_check_interval': 30,    # 连接空闲超过该秒数，借出前先 SELECT 1 探活
+    'connect_timeout': 10,
+}
+
+# 查询结果磁盘缓存配置（query_to_df(..., cache=True) 时启用）
+QUERY_CACHE_CONFIG = {
+    'dir': os.environ.get('SOFA2_QUERY_CACHE_DIR',
+                          os.path.join(os.path.expanduser('~'), '.cache', 'sofa2_query_cache')),
+    'max_bytes': 2 * 1024 ** 3,     # 超出后按最近使用时间淘汰（LRU）
+}
+
+# 查询指标记录配置（默认关闭；SOFA2_QUERY_METRICS=1 时每条 query_to_df / query_many 查询
+# 写入本地 SQLite，见 query_metrics_report）
+METRICS_CONFIG = {
+    'enabled': os.environ.get('SOFA2_QUERY_METRICS', '0') == '1',
+    'path': os.environ.get('SOFA2_QUERY_METRICS_DB',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'sofa2_query_metrics.sqlite')),
+    # 额外执行 EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) 保存执行计划（查询会再跑一遍，只用于排查）
+    'explain': os.environ.get('SOFA2_QUERY_EXPLAIN', '0') == '1',
+    # 结果字节数默认取浅层估计；深度统计要逐个访问字符串单元格，大结果集上很慢，只在排查内存时开启
+    'deep_bytes': os.environ.get('SOFA2_QUERY_METRICS_DEEP', '0') == '1',
+}
+
+
+# =============================================================================
+# 连接池 - 进程内按数据库复用连接
+# =============================================================================
+
+class ConnectionPool:
+    """
+    线程安全的 PostgreSQL 连接池（每个 DB_CONFIG 键一个）
+
+    与 psycopg2.pool.ThreadedConnectionPool 的区别：
+        - 池满时阻塞等待（最多 checkout_timeout 秒），而不是直接抛 PoolError
+        - 归还的连接全部保留复用（psycopg2 自带的池会关闭超出 minconn 的连接）
+        - 空闲超过 health_check_interval 的连接借出前先探活，断线自动重连
+        - 归还时回滚未结束事务并恢复 autocommit=False
+        - temporary_capacity 为单次并发调用临时放宽上限，不改动 configure_pool 的设置
+    """
+
+    def __init__(self, db: str, maxconn: int = 8, checkout_timeout: float = 60,
+                 health_check_interval: float = 30, connect_timeout: int = 10):
+        self.db = db
+        self.maxconn = maxconn
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self.connect_timeout = connect_timeout
+        self.pid = os.getpid()
+        self._slots = threading.Semaphore(maxconn)
+        self._lock = threading.Lock()
+        self._idle = deque()        # (conn, last_used)，LIFO 复用最近用过的连接
+        self._in_use = 0
+        self._debt = 0              # 临时扩容结束时尚未收回的名额（由之后归还的连接抵扣）
+        self._opened = 0
+        self.closed = False
+
+    def _connect(self):
+        import psycopg2
+        config = DB_CONFIG[self.db]
+        conn = psycopg2.connect(
+            host=config['host'],
+            port=config['port'],
+            database=config['database'],
+            user=config['user'],
+            password=config['password'],
+            connect_timeout=self.connect_timeout
+        )
+        self._opened += 1
+        return conn
+
+    def _is_healthy(self, conn, last_used: float) -> bool:
+        import psycopg2
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """借出一个连接（池满时阻塞）"""
+        from psycopg2.pool import PoolError
+        if self.closed:
+            raise PoolError(f"{self.db} 连接池已关闭")
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise PoolError(f"{self.db} 连接池等待超时 ({self.checkout_timeout}s, maxconn={self.maxconn})")
+        try:
+            while True:
+                with self._lock:
+                    item = self._idle.pop() if self._idle else None
+                if item is None:
+                    conn = self._connect()
+                    break
+                conn, last_used = item
+                if self._is_healthy(conn, last_used):
+                    break
+                _close_quietly(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_use += 1
+        return conn
+
+    def putconn(self, conn, discard: bool = False):
+        """归还连接；discard=True 或连接已损坏时直接关闭"""
+        import psycopg2
+        with self._lock:
+            self._in_use -= 1
+            repay = self._debt > 0      # 临时扩容已结束：收回这个名额，连接直接关闭
+            if repay:
+                self._debt -= 1
+        try:
+            if not discard and not repay and not conn.closed and not self.closed:
+                status = conn.info.transaction_status
+                if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    discard = True
+                else:
+                    if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                    if conn.autocommit:
+                        conn.autocommit = False
+            else:
+                discard = True
+        except psycopg2.Error:
+            discard = True
+        try:
+            if discard:
+                _close_quietly(conn)
+            else:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+        finally:
+            if not repay:
+                self._slots.release()
+
+    @contextmanager
+    def temporary_capacity(self, maxconn: int):
+        """
+        在 with 块内把借出上限临时提高到至少 maxconn（只影响本池，不修改 configure_pool 设置）
+
+        退出时立即收回空闲名额；仍被借出的连接归还时抵扣剩余名额并关闭，不阻塞调用方。
+        """
+        extra = max(0, maxconn - self.maxconn)
+        with self._lock:
+            self.maxconn += extra
+        for _ in range(extra):
+            self._slots.release()
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self.maxconn -= extra
+                self._debt += extra
+            while True:
+                with self._lock:
+                    if not self._debt or not self._slots.acquire(blocking=False):
+                        break
+                    self._debt -= 1
+            with self._lock:
+                surplus = [self._idle.popleft() for _ in range(max(0, len(self._idle) - self.maxconn))]
+            for conn, _ in surplus:
+                _close_quietly(conn)
+
+    def closeall(self):
+        self.closed = True
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn, _ in idle:
+            _close_quietly(conn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'db': self.db,
+                'maxconn': self.maxconn,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'opened_total': self._opened,
+            }
+
+
+class PooledConnection:
+    """
+    get_connection() 返回的连接代理
+
+    用法与 psycopg2 连接完全一致（cursor/commit/rollback/autocommit/with 事务块），
+    唯一区别是 close() 把连接归还给连接池，而不是断开 TCP 连接。
+    """
+
+    def __init__(self, pool: ConnectionPool, conn):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_conn', conn)
+
+    def __getattr__(self, name):
+        import psycopg2
+        conn = object.__getattribute__(self, '_conn')
+        if conn is None:
+            raise psycopg2.InterfaceError("connection already returned to pool")
+        return getattr(conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    @property
+    def closed(self):
+        conn = object.__getattribute__(self, '_conn')
+        return 1 if conn is None else conn.closed
+
+    def close(self):
+        conn = object.__getattribute__(self, '_conn')
+        if conn is not None:
+            object.__setattr__(self, '_conn', None)
+            self._pool.putconn(conn)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pool_settings = {}
+_pools_lock = threading.Lock()
+_inherited_pools = []   # fork 后继承的池：不能在子进程里关闭父进程的 socket，只保留引用
 
-def query_to_df(sql: str, db: str = 'mimic', limit: Optional[int] = None) -> pd.DataFrame:
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def configure_pool(db: str = 'mimic', **settings) -> None:
+    """
+    设置某个数据库的连接池参数（maxconn / checkout_timeout / health_check_interval / connect_timeout）
+
+    已存在的池会被关闭并在下次使用时按新参数重建。
+
+    示例：
+        configure_pool('mimic', maxconn=16)
+    """
+    unknown = set(settings) - set(POOL_CONFIG)
+    if unknown:
+        raise ValueError(f"未知的连接池参数: {', '.join(sorted(unknown))}")
+    with _pools_lock:
+        _pool_settings.setdefault(db, {}).update(settings)
+        pool = _pools.pop(db, None)
+    if pool is not None:
+        pool.closeall()
+
+
+def get_pool(db: str = 'mimic') -> ConnectionPool:
+    """获取（必要时创建）某个数据库的进程级连接池"""
+    pool = _pools.get(db)
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with _pools_lock:
+        pool = _pools.get(db)
+        if pool is not None and pool.pid != os.getpid():
+            _inherited_pools.append(_pools.pop(db))
+            pool = None
+        if pool is None:
+            if db not in DB_CONFIG:
+                raise KeyError(f"未知数据库: {db}（可选: {', '.join(DB_CONFIG)}）")
+            pool = ConnectionPool(db, **{**POOL_CONFIG, **_pool_settings.get(db, {})})
+            _pools[db] = pool
+        return pool
+
+
+@contextmanager
+def pooled_connection(db: str = 'mimic', autocommit: bool = False):
+    """
+    从连接池借出连接的上下文管理器，退出时自动归还（异常时回滚）
+
+    示例：
+        with pooled_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT COUNT(*) FROM mimiciv_icu.icustays")
+    """
+    pool = get_pool(db)
+    conn = pool.getconn()
+    try:
+        if autocommit:
+            conn.autocommit = True
+        yield conn
+    except BaseException:
+        pool.putconn(conn, discard=conn.closed != 0)
+        raise
+    else:
+        pool.putconn(conn)
+
+
+def get_connection(db: str = 'mimic') -> PooledConnection:
+    """
+    获取连接池中的连接（替代各脚本里的 psycopg2.connect）
+
+    返回对象的 close() 会把连接归还给连接池。
+    """
+    pool = get_pool(db)
+    return PooledConnection(pool, pool.getconn())
+
+
+def close_all_pools() -> None:
+    """关闭所有连接池（进程退出时自动调用）"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        if pool.pid == os.getpid():
+            pool.closeall()
+
+
+atexit.register(close_all_pools)
+
+
+def _cursor_to_df(cursor, rows=None) -> pd.DataFrame:
+    """把游标结果转为 DataFrame（numeric 转 float，与 pd.read_sql 一致）"""
+    import pandas as pd
+    columns = [desc[0] for desc in cursor.description]
+    if rows is None:
+        rows = cursor.fetchall()
+    return pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+
+
+def query_to_df(sql: str, db: str = 'mimic', limit: Optional[int] = None,
+                cache: bool = False, label: Optional[str] = None,
+                engine: str = 'cursor') -> pd.DataFrame:
     """
     执行SQL查询并返回DataFrame（类似Navicat的查询功能）
 
@@ -42,6 +407,11 @@ def query_to_df(sql: str, db: str = 'mimic', limit: Optional[int] = None) -> pd.
         sql: SQL查询语句
         db: 'mimic' 或 'eicu'
         limit: 限制返回行数（用于预览）
+        cache: 使用磁盘结果缓存（见 QUERY_CACHE_CONFIG）。缓存键包含 SQL 和所引用表的指纹，
+               上游表被流水线重建后自动失效
+        label: 查询指标中的名称（见 METRICS_CONFIG / query_metrics_report）
+        engine: 'cursor'（默认，逐行 Python 对象）或 'arrow'（COPY 直接解析为列式数组，
+                大结果集快数倍，整数列为与 PostgreSQL 类型同宽的可空整数 dtype；只适用于 SELECT，见 query_to_arrow）
 
     返回：
         pd.DataFrame: 查询结果
@@ -52,27 +422,501 @@ def query_to_df(sql: str, db: str = 'mimic', limit: Optional[int] = None) -> pd.
 
         # 预览前10条数据
         df = query_to_df("SELECT * FROM mimiciv_icu.icustays", limit=10)
-    """
-    config = DB_CONFIG[db]
 
+        # 重复运行的提取查询走缓存
+        df = query_to_df(cohort_sql, cache=True)
+
+        # 几百万行的小时表
+        df = query_to_df("SELECT * FROM mimiciv_derived.sofa2_scores", engine='arrow')
+    """
+    if engine not in ('cursor', 'arrow'):
+        raise ValueError("engine 只能是 'cursor' 或 'arrow'")
     # 如果指定了limit，自动添加到SQL
     if limit and 'limit' not in sql.lower():
         sql = f"{sql.rstrip(';')} LIMIT {limit};"
 
-    # 创建连接
-    engine = create_engine(
-        f"postgresql://{config['user']}:{config['password']}@"
-        f"{config['host']}:{config['port']}/{config['database']}"
-    )
+    if cache:
+        return _cached_query(sql, db, label, engine)
 
-    # 执行查询
+    # 执行查询（连接来自进程级连接池）
     print(f"🔍 执行查询 (数据库: {db})...")
-    df = pd.read_sql(sql, engine)
+    df = _fetch_df(sql, db, label, engine)
     print(f"✅ 查询完成，返回 {len(df)} 行数据")
 
     return df
 
 
+def _fetch_df(sql: str, db: str, label: Optional[str] = None,
+              engine: str = 'cursor') -> pd.DataFrame:
+    import pandas as pd
+    started = time.perf_counter()
+    execute_seconds = None
+    try:
+        with pooled_connection(db, autocommit=engine == 'cursor') as conn:
+            if engine == 'arrow':
+                table = _fetch_arrow(conn, sql)
+                execute_seconds = time.perf_counter() - started
+                df = _arrow_to_pandas(table)
+            else:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    execute_seconds = time.perf_counter() - started
+                    # DDL/DML 等无结果集的语句返回空 DataFrame
+                    df = _cursor_to_df(cur) if cur.description is not None else pd.DataFrame()
+            wall_seconds = time.perf_counter() - started
+            plan = server_seconds = None
+            if METRICS_CONFIG['enabled'] and METRICS_CONFIG['explain']:
+                plan, server_seconds = _explain_analyze(conn, sql)
+    except Exception as e:
+        _record_query(db, sql, label, time.perf_counter() - started, execute_seconds, error=e)
+        raise
+    _record_query(db, sql, label, wall_seconds, execute_seconds, df=df,
+                  server_seconds=server_seconds, plan=plan)
+    return df
+
+
+# =============================================================================
+# 查询结果磁盘缓存 - SQL + 表指纹为键，Parquet 存储
+# =============================================================================
+
+_FINGERPRINT_SQL = """
+SELECT n.nspname, c.relname, c.relfilenode,
+       COALESCE(st.n_tup_ins, 0), COALESCE(st.n_tup_upd, 0), COALESCE(st.n_tup_del, 0)
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_stat_user_tables st ON st.relid = c.oid
+WHERE (n.nspname, c.relname) IN %s
+ORDER BY 1, 2
+"""
+
+
+# SQL 词法片段：字符串 / 标识符 / 美元引用原样保留，注释与空白才会被规范化
+_SQL_TOKEN_RE = re.compile(r"""
+      (?P<literal>
+          [Ee]'(?:[^'\\]|\\.|'')*'         # E'...' 转义字符串
+        | '(?:[^']|'')*'                     # 普通字符串
+        | "(?:[^"]|"")*"                     # 带引号的标识符
+        | \$(?P<tag>[A-Za-z_]\w*|)\$.*?\$(?P=tag)\$   # 美元引用 $$...$$ / $tag$...$tag$
+      )
+    | (?P<comment>--[^\n]*|/\*.*?\*/)
+    | (?P<space>\s+)
+    | (?P<other>[^'"$\s/-]+|.)
+""", re.S | re.X)
+
+
+def _normalize_sql(sql: str) -> str:
+    """去掉注释、合并空白、去掉结尾分号；字符串字面量、带引号标识符和美元引用内的文本原样保留"""
+    parts = []
+    for match in _SQL_TOKEN_RE.finditer(sql):
+        if match.group('comment') is not None or match.group('space') is not None:
+            if parts and parts[-1] != ' ':
+                parts.append(' ')
+        else:
+            parts.append(match.group())
+    return ''.join(parts).strip().rstrip(';').strip()
+
+
+def _plan_relations(plan) -> set:
+    """从 EXPLAIN (FORMAT JSON) 中收集所有被扫描的 (schema, table)（视图已展开为基表）"""
+    relations = set()
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if 'Relation Name' in node:
+                relations.add((node.get('Schema', 'public'), node['Relation Name']))
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return relations
+
+
+def _query_fingerprint(conn, sql: str) -> Optional[list]:
+    """
+    返回查询所引用表的指纹（relfilenode + 增删改计数）；不可 EXPLAIN 的语句返回 None
+
+    DROP/CREATE TABLE AS 与 TRUNCATE 会更换 relfilenode，INSERT/UPDATE/DELETE 会改变
+    pg_stat 计数（写入会话空闲或断开后才对其他会话可见；run_steps.sh 每个阶段单独一个 psql 会话）
+    """
+    import psycopg2
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"EXPLAIN (FORMAT JSON) {_strip_sql(sql)}")
+            plan = cur.fetchone()[0]
+    except psycopg2.Error:
+        conn.rollback()
+        return None
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    relations = _plan_relations(plan)
+    if not relations:
+        return None     # 不读表的查询（如 SELECT now()）无法判断何时失效
+    with conn.cursor() as cur:
+        cur.execute(_FINGERPRINT_SQL, (tuple(sorted(relations)),))
+        return [list(row) for row in cur.fetchall()]
+
+
+def _cache_key(sql: str, db: str, fingerprint: list) -> str:
+    config = DB_CONFIG[db]
+    payload = json.dumps({
+        'server': [config['host'], config['port'], config['database']],
+        'sql': _normalize_sql(sql),
+        'relations': fingerprint,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _evict_query_cache(cache_dir: str, max_bytes: int) -> None:
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.parquet'):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except FileNotFoundError:
+            pass
+
+
+def _cached_query(sql: str, db: str, label: Optional[str] = None,
+                  engine: str = 'cursor') -> pd.DataFrame:
+    import pandas as pd
+    started = time.perf_counter()
+    cache_dir = QUERY_CACHE_CONFIG['dir']
+    with pooled_connection(db, autocommit=True) as conn:
+        fingerprint = _query_fingerprint(conn, sql)
+    if fingerprint is None:
+        print("⚠️  该语句无法计算表指纹，不使用缓存")
+        return query_to_df(sql, db=db, label=label, engine=engine)
+
+    key = _cache_key(sql, db, fingerprint)
+    path = os.path.join(cache_dir, f"{key}.parquet")
+    if os.path.exists(path):
+        try:
+            df = pd.read_parquet(path)
+            os.utime(path)      # 更新最近使用时间（LRU）
+            _record_query(db, sql, label, time.perf_counter() - started, None, df=df, cache_hit=True)
+            print(f"⚡ 缓存命中，返回 {len(df)} 行数据 ({key[:12]})")
+            return df
+        except (OSError, ValueError) as e:
+            print(f"⚠️  缓存文件损坏，重新查询: {e}")
+
+    df = query_to_df(sql, db=db, label=label, engine=engine)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        _evict_query_cache(cache_dir, QUERY_CACHE_CONFIG['max_bytes'])
+    except Exception as e:      # 缓存写入失败（如重复列名、缺少 pyarrow）不影响查询结果
+        print(f"⚠️  结果未写入缓存: {e}")
+    return df
+
+
+def clear_query_cache() -> int:
+    """清空查询结果缓存，返回删除的文件数"""
+    cache_dir = QUERY_CACHE_CONFIG['dir']
+    if not os.path.isdir(cache_dir):
+        return 0
+    removed = 0
+    for name in os.listdir(cache_dir):
+        if name.endswith('.parquet') or '.parquet.tmp-' in name:
+            os.remove(os.path.join(cache_dir, name))
+            removed += 1
+    return removed
+
+
+# =============================================================================
+# 查询指标 - 耗时 / 行数 / 数据量 / 执行计划写入本地 SQLite
+# =============================================================================
+
+_METRICS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_metrics (
+    id              INTEGER PRIMARY KEY,
+    recorded_at     TEXT NOT NULL,          -- UTC ISO 时间
+    script          TEXT NOT NULL,          -- 发起查询的脚本（sys.argv[0] 文件名）
+    label           TEXT,
+    db              TEXT NOT NULL,
+    sql_hash        TEXT NOT NULL,          -- 规范化 SQL 的 sha256 前 16 位
+    sql_text        TEXT NOT NULL,          -- 规范化 SQL（截断到 2000 字符）
+    wall_seconds    REAL NOT NULL,          -- 客户端总耗时（含结果转 DataFrame）
+    execute_seconds REAL,                   -- execute() 返回耗时：服务器执行 + 结果传输
+    server_seconds  REAL,                   -- EXPLAIN ANALYZE 的 Execution Time（仅开启 explain 时）
+    rows            INTEGER,
+    bytes           INTEGER,                -- 结果 DataFrame 内存大小，近似传输数据量
+    cache_hit       INTEGER NOT NULL DEFAULT 0,
+    plan            TEXT,                   -- EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)
+    error           TEXT
+);
+CREATE INDEX IF NOT EXISTS query_metrics_script_idx ON query_metrics (script, sql_hash);
+"""
+
+_metrics_lock = threading.Lock()
+_metrics_ready = set()
+
+
+def _sql_hash(sql: str) -> str:
+    return hashlib.sha256(_normalize_sql(sql).encode('utf-8')).hexdigest()[:16]
+
+
+def _script_name() -> str:
+    return os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else '<interactive>'
+
+
+def _explain_analyze(conn, sql: str) -> Tuple[Optional[str], Optional[float]]:
+    """
+    重新执行一次 EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)，返回 (计划 JSON, 服务器执行秒数)
+
+    只对 SELECT/WITH 语句执行，并包在回滚的事务里，不会产生副作用。
+    """
+    import psycopg2
+    if _strip_sql(sql).split(None, 1)[0].lower() not in ('select', 'with', 'values', 'table'):
+        return None, None
+    try:
+        with conn.cursor() as cur:
+            cur.execute("BEGIN")
+            try:
+                cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {_strip_sql(sql)}")
+                plan = cur.fetchone()[0]
+            finally:
+                cur.execute("ROLLBACK")
+    except psycopg2.Error:
+        return None, None
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return json.dumps(plan), plan[0].get('Execution Time', 0) / 1000
+
+
+def _record_query(db: str, sql: str, label: Optional[str], wall_seconds: float,
+                  execute_seconds: Optional[float], df=None, server_seconds=None,
+                  plan=None, cache_hit: bool = False, error=None) -> None:
+    """写入一条查询指标；写入失败（如目录只读）时提示一次并关闭记录"""
+    if not METRICS_CONFIG['enabled']:
+        return
+    import sqlite3
+    from datetime import datetime, timezone
+    path = METRICS_CONFIG['path']
+    rows = nbytes = None
+    if df is not None:
+        rows = len(df)
+        nbytes = int(df.memory_usage(index=False, deep=METRICS_CONFIG['deep_bytes']).sum())
+    record = (
+        datetime.now(timezone.utc).isoformat(timespec='milliseconds'), _script_name(), label, db,
+        _sql_hash(sql), _normalize_sql(sql)[:2000], wall_seconds, execute_seconds,
+        server_seconds, rows, nbytes, int(cache_hit), plan,
+        None if error is None else str(error).strip()[:2000],
+    )
+    try:
+        with _metrics_lock:
+            if path not in _metrics_ready:
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            conn = sqlite3.connect(path, timeout=30)
+            try:
+                if path not in _metrics_ready:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.executescript(_METRICS_SCHEMA)
+                    _metrics_ready.add(path)
+                with conn:
+                    conn.execute("""
+                        INSERT INTO query_metrics (recorded_at, script, label, db, sql_hash, sql_text,
+                            wall_seconds, execute_seconds, server_seconds, rows, bytes, cache_hit,
+                            plan, error)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, record)
+            finally:
+                conn.close()
+    except (OSError, sqlite3.Error) as e:
+        METRICS_CONFIG['enabled'] = False
+        print(f"⚠️  查询指标无法写入 {path}，已关闭记录: {e}")
+
+
+def query_metrics_report(script: Optional[str] = None, top: int = 10,
+                         since: Optional[str] = None) -> pd.DataFrame:
+    """
+    每个脚本中总耗时最高的查询（按规范化 SQL 聚合）
+
+    需要先以 SOFA2_QUERY_METRICS=1（或 METRICS_CONFIG['enabled'] = True）运行脚本记录指标。
+
+    参数：
+        script: 只看某个脚本（文件名，如 'extract_sofa_comparison_data.py'）
+        top: 每个脚本返回前 N 条
+        since: 只统计该时间之后的记录（ISO 格式，如 '2025-01-01'）
+
+    返回：
+        pd.DataFrame: script, rank, label, sql_hash, runs, total_seconds, mean_seconds,
+                      max_seconds, mean_execute_seconds, mean_server_seconds, mean_rows,
+                      mean_bytes, cache_hits, errors, sql_text
+
+    示例：
+        print(query_metrics_report(top=5).to_string(index=False))
+    """
+    import sqlite3
+    import pandas as pd
+    path = METRICS_CONFIG['path']
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    conditions, params = [], []
+    if script:
+        conditions.append("script = ?")
+        params.append(script)
+    if since:
+        conditions.append("recorded_at >= ?")
+        params.append(since)
+    where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    sql = f"""
+        WITH agg AS (
+            SELECT script, sql_hash,
+                   max(label) AS label,
+                   count(*) AS runs,
+                   sum(wall_seconds) AS total_seconds,
+                   avg(wall_seconds) AS mean_seconds,
+                   max(wall_seconds) AS max_seconds,
+                   avg(execute_seconds) AS mean_execute_seconds,
+                   avg(server_seconds) AS mean_server_seconds,
+                   avg(rows) AS mean_rows,
+                   avg(bytes) AS mean_bytes,
+                   sum(cache_hit) AS cache_hits,
+                   sum(error IS NOT NULL) AS errors,
+                   max(sql_text) AS sql_text
+            FROM query_metrics {where_clause}
+            GROUP BY script, sql_hash
+        )
+        SELECT script,
+               row_number() OVER (PARTITION BY script ORDER BY total_seconds DESC) AS rank,
+               label, sql_hash, runs, total_seconds, mean_seconds, max_seconds,
+               mean_execute_seconds, mean_server_seconds, mean_rows, mean_bytes,
+               cache_hits, errors, sql_text
+        FROM agg
+    """
+    conn = sqlite3.connect(path)
+    try:
+        report = pd.read_sql_query(sql, conn, params=params)
+    finally:
+        conn.close()
+    report = report[report['rank'] <= top]
+    totals = report.groupby('script')['total_seconds'].transform('max')
+    return (report.assign(_script_total=totals)
+                  .sort_values(['_script_total', 'rank'], ascending=[False, True])
+                  .drop(columns='_script_total')
+                  .reset_index(drop=True))
+
+
+# =============================================================================
+# 异步并发查询 - 相互独立的查询并行执行
+# =============================================================================
+
+class QueryResult(NamedTuple):
+    """query_many 的单条结果"""
+    label: str
+    sql: str
+    df: Optional[pd.DataFrame]
+    seconds: float
+    error: Optional[BaseException] = None
+
+
+def _normalize_queries(queries) -> List[Tuple[str, str]]:
+    if isinstance(queries, dict):
+        return [(str(label), sql) for label, sql in queries.items()]
+    items = []
+    for i, query in enumerate(queries):
+        if isinstance(query, str):
+            items.append((f"q{i}", query))
+        else:
+            label, sql = query
+            items.append((str(label), sql))
+    return items
+
+
+async def aquery_to_df(sql: str, db: str = 'mimic', label: Optional[str] = None) -> pd.DataFrame:
+    """query_to_df 的 asyncio 版本（在线程中使用连接池连接，不阻塞事件循环）"""
+    import asyncio
+    return await asyncio.to_thread(_fetch_df, sql, db, label)
+
+
+async def aquery_many(queries, db: str = 'mimic', concurrency: int = 4,
+                      raise_errors: bool = False, verbose: bool = True) -> List[QueryResult]:
+    """
+    并发执行多条相互独立的查询，按输入顺序返回结果和耗时
+
+    参数：
+        queries: SQL 列表、(label, sql) 列表或 {label: sql} 字典
+        db: 数据库名
+        concurrency: 同时执行的查询数（每条占用一个连接池连接）
+        raise_errors: True 时任一查询失败即抛出；否则错误记录在 QueryResult.error
+        verbose: 打印每条查询完成情况
+    """
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    items = _normalize_queries(queries)
+    if not items:
+        return []
+    concurrency = max(1, min(concurrency, len(items)))
+
+    loop = asyncio.get_running_loop()
+    limiter = asyncio.Semaphore(concurrency)
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f'query-{db}')
+
+    async def run(label, sql):
+        async with limiter:
+            started = time.perf_counter()
+            try:
+                df = await loop.run_in_executor(executor, _fetch_df, sql, db, label)
+                error = None
+            except Exception as e:
+                if raise_errors:
+                    raise
+                df, error = None, e
+            seconds = time.perf_counter() - started
+            if verbose:
+                status = f"{len(df)} 行" if error is None else f"错误: {str(error).strip()}"
+                print(f"  {'✅' if error is None else '❌'} {label} ({seconds:.2f}s, {status})")
+            return QueryResult(label, sql, df, seconds, error)
+
+    # 连接池太小时本次调用临时扩容，避免工作线程排队等连接（不改动全局连接池设置）
+    with get_pool(db).temporary_capacity(concurrency):
+        try:
+            return list(await asyncio.gather(*(run(label, sql) for label, sql in items)))
+        finally:
+            executor.shutdown(wait=not raise_errors)
+
+
+def query_many(queries, db: str = 'mimic', concurrency: int = 4,
+               raise_errors: bool = False, verbose: bool = True) -> List[QueryResult]:
+    """
+    aquery_many 的同步入口（脚本中直接调用）
+
+    示例：
+        results = query_many({
+            'chartevents': "SELECT COUNT(*) AS count FROM mimiciv_icu.chartevents",
+            'labevents': "SELECT COUNT(*) AS count FROM mimiciv_hosp.labevents",
+        }, concurrency=8)
+        for r in results:
+            print(r.label, r.df.iloc[0]['count'], f"{r.seconds:.1f}s")
+    """
+    import asyncio
+    items = _normalize_queries(queries)
+    if verbose:
+        print(f"🔍 并发执行 {len(items)} 条查询 (数据库: {db}, 并发: {concurrency})...")
+    started = time.perf_counter()
+    results = asyncio.run(aquery_many(items, db=db, concurrency=concurrency,
+                                      raise_errors=raise_errors, verbose=verbose))
+    if verbose and results:
+        wall = time.perf_counter() - started
+        serial = sum(r.seconds for r in results)
+        print(f"✅ 完成: 总耗时 {wall:.2f}s（串行合计 {serial:.2f}s，最慢单条 {max(r.seconds for r in results):.2f}s）")
+    return results
+
+
 def preview_table(table_name: str, db: str = 'mimic', n: int = 10) -> pd.DataFrame:
     """
     预览表格（类似Navicat点击表名查看数据）
@@ -140,26 +984,573 @@ def export_to_csv(sql: str, output_file: str, db: str = 'mimic',
             "output/long_stay_patients.csv"
         )
     """
-    config = DB_CONFIG[db]
-    engine = create_engine(
-        f"postgresql://{config['user']}:{config['password']}@"
-        f"{config['host']}:{config['port']}/{config['database']}"
-    )
-
     print(f"🔍 执行查询并导出到 {output_file}...")
 
-    # 分块读取并写入（节省内存）
+    # 服务器端游标分块读取并写入（节省内存）
     first_chunk = True
-    for chunk in pd.read_sql(sql, engine, chunksize=chunksize):
-        mode = 'w' if first_chunk else 'a'
-        header = first_chunk
-        chunk.to_csv(output_file, mode=mode, header=header, index=False)
-        first_chunk = False
-        print(f"  已写入 {len(chunk)} 行...")
+    with pooled_connection(db) as conn:
+        with conn.cursor(name='export_to_csv') as cur:
+            cur.itersize = chunksize
+            cur.execute(sql)
+            rows = cur.fetchmany(chunksize)
+            while first_chunk or rows:
+                chunk = _cursor_to_df(cur, rows)
+                mode = 'w' if first_chunk else 'a'
+                header = first_chunk
+                chunk.to_csv(output_file, mode=mode, header=header, index=False)
+                first_chunk = False
+                print(f"  已写入 {len(chunk)} 行...")
+                rows = cur.fetchmany(chunksize)
 
     print(f"✅ 导出完成！文件保存在: {output_file}")
 
 
+# =============================================================================
+# Arrow / Parquet - COPY 流式导出
+# =============================================================================
+
+# PostgreSQL 类型 OID -> Arrow 类型名（未列出的类型按字符串处理）
+PG_ARROW_TYPES = {
+    16: 'bool_',
+    20: 'int64', 21: 'int16', 23: 'int32', 26: 'int64',
+    700: 'float32', 701: 'float64', 1700: 'float64',     # numeric 与 pd.read_sql 一致转 float
+    1082: 'date32',
+    1114: 'timestamp', 1184: 'timestamptz',
+    1083: 'time64',
+}
+_TEMPORAL_ARROW_TYPES = ('date32', 'timestamp', 'timestamptz')
+
+
+def _require_pyarrow():
+    """延迟导入 pyarrow（仅 Arrow/Parquet 相关函数需要）"""
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("该功能需要 pyarrow: pip install pyarrow") from e
+    return pa, pa_csv, pq
+
+
+def _arrow_type(pa, type_name: Optional[str]):
+    if type_name is None:
+        return pa.string()
+    if type_name == 'timestamp':
+        return pa.timestamp('us')
+    if type_name == 'timestamptz':
+        return pa.timestamp('us', tz='UTC')
+    if type_name == 'time64':
+        return pa.time64('us')
+    return getattr(pa, type_name)()
+
+
+def _strip_sql(sql: str) -> str:
+    return sql.strip().rstrip(';').strip()
+
+
+def _describe_query(conn, sql: str) -> list:
+    """不执行查询，只取结果列 (列名, 类型 OID)"""
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT * FROM ({_strip_sql(sql)}) AS _q LIMIT 0")
+        return [(desc.name, desc.type_code) for desc in cur.description]
+
+
+def _quote_ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _iter_copy_batches(conn, sql: str, block_size: int = 16 << 20):
+    """
+    COPY (query) TO STDOUT 流式解析为 Arrow RecordBatch
+
+    COPY 输出经管道直接交给 pyarrow 的多线程 C++ CSV 解析器，
+    值不经过 Python 对象；内存占用约为 block_size 的常数倍。
+
+    返回：
+        (schema, batches 生成器)
+    """
+    pa, pa_csv, _ = _require_pyarrow()
+    columns = _describe_query(conn, sql)
+    names = [name for name, _ in columns]
+    type_names = [PG_ARROW_TYPES.get(oid) for _, oid in columns]
+    schema = pa.schema([(name, _arrow_type(pa, t)) for name, t in zip(names, type_names)])
+
+    # infinity/-infinity 无法转换为 Arrow 时间类型，按 NULL 导出
+    select_list = ', '.join(
+        f"CASE WHEN isfinite(_q.{_quote_ident(name)}) THEN _q.{_quote_ident(name)} END"
+        if t in _TEMPORAL_ARROW_TYPES else f"_q.{_quote_ident(name)}"
+        for name, t in zip(names, type_names)
+    )
+    copy_sql = (
+        f"COPY (SELECT {select_list} FROM ({_strip_sql(sql)}) AS _q) "
+        f"TO STDOUT WITH (FORMAT csv)"
+    )
+
+    def generate():
+        read_fd, write_fd = os.pipe()
+        errors = []
+
+        def produce():
+            try:
+                with conn.cursor() as cur, os.fdopen(write_fd, 'wb') as sink:
+                    # 会话参数仅在本事务内生效，归还连接池时随回滚恢复
+                    cur.execute("SET LOCAL TIME ZONE 'UTC'; SET LOCAL DateStyle = 'ISO'")
+                    cur.copy_expert(copy_sql, sink, size=1 << 20)
+            except BaseException as e:
+                errors.append(e)
+
+        producer = threading.Thread(target=produce, name='copy-producer', daemon=True)
+        producer.start()
+        source = os.fdopen(read_fd, 'rb')
+        try:
+            # 空结果时 COPY 不输出任何字节：peek 到 EOF 即不产生批次（不依赖 Arrow 的报错文本）
+            if source.peek(1):
+                reader = pa_csv.open_csv(
+                    source,
+                    read_options=pa_csv.ReadOptions(column_names=names, block_size=block_size),
+                    convert_options=pa_csv.ConvertOptions(
+                        column_types=schema,
+                        null_values=[''],
+                        strings_can_be_null=True,
+                        quoted_strings_can_be_null=False,   # COPY CSV 中 "" 是空字符串，未加引号的空值才是 NULL
+                        true_values=['t'],
+                        false_values=['f'],
+                    ),
+                )
+                for batch in reader:
+                    yield batch
+        except pa.ArrowInvalid:
+            # 先关闭读端，让可能阻塞在写管道上的生产者以 BrokenPipe 退出，再等待它结束；
+            # 生产者自身出错（管道提前关闭）时优先抛出数据库侧的原始错误
+            source.close()
+            producer.join()
+            if errors and not isinstance(errors[0], BrokenPipeError):
+                raise errors[0]
+            raise
+        finally:
+            source.close()
+            producer.join()
+        if errors and not isinstance(errors[0], BrokenPipeError):
+            raise errors[0]
+
+    return schema, generate()
+
+
+def _write_parquet(conn, sql: str, output_file: str, row_group_size: int = 1_000_000,
+                   compression: str = 'zstd', block_size: int = 16 << 20,
+                   progress: bool = True) -> int:
+    """在给定连接上把查询 COPY 到 Parquet（先写临时文件再原子替换），返回行数"""
+    pa, _, pq = _require_pyarrow()
+    directory = os.path.dirname(os.path.abspath(output_file))
+    os.makedirs(directory, exist_ok=True)
+    tmp_file = f"{output_file}.tmp-{os.getpid()}-{threading.get_ident()}"
+    total_rows = 0
+    try:
+        schema, batches = _iter_copy_batches(conn, sql, block_size=block_size)
+        with pq.ParquetWriter(tmp_file, schema, compression=compression) as writer:
+            pending, pending_rows = [], 0
+            for batch in batches:
+                pending.append(batch)
+                pending_rows += batch.num_rows
+                if pending_rows >= row_group_size:
+                    writer.write_table(pa.Table.from_batches(pending, schema), row_group_size=row_group_size)
+                    total_rows += pending_rows
+                    if progress:
+                        print(f"  已写入 {total_rows} 行...")
+                    pending, pending_rows = [], 0
+            if pending:
+                writer.write_table(pa.Table.from_batches(pending, schema), row_group_size=row_group_size)
+                total_rows += pending_rows
+        os.replace(tmp_file, output_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    return total_rows
+
+
+def export_to_parquet(sql: str, output_file: str, db: str = 'mimic',
+                      row_group_size: int = 1_000_000, compression: str = 'zstd',
+                      block_size: int = 16 << 20) -> int:
+    """
+    COPY 流式导出查询结果到 Parquet（比 export_to_csv 快数倍，文件小得多）
+
+    参数：
+        sql: SQL查询（或表名外的任意 SELECT）
+        output_file: 输出 .parquet 路径
+        db: 数据库名
+        row_group_size: 每个 Parquet row group 的行数上限
+        compression: Parquet 压缩算法（zstd / snappy / gzip / none）
+        block_size: 每次解析的 COPY 数据块字节数（决定内存占用）
+
+    返回：
+        int: 导出行数
+
+    示例：
+        export_to_parquet(
+            "SELECT * FROM mimiciv_derived.sofa2_scores",
+            "output/sofa2_scores.parquet"
+        )
+    """
+    _require_pyarrow()
+    print(f"🔍 COPY 导出到 {output_file}...")
+    with pooled_connection(db) as conn:
+        total_rows = _write_parquet(conn, sql, output_file, row_group_size=row_group_size,
+                                    compression=compression, block_size=block_size)
+
+    size_mb = os.path.getsize(output_file) / 1024 / 1024
+    print(f"✅ 导出完成！{total_rows} 行，{size_mb:.1f} MB，文件保存在: {output_file}")
+    return total_rows
+
+
+def _downcast_integers(table, columns: Sequence[str]):
+    """
+    指定的整数列按实际取值范围缩小到 int8/int16/int32（SOFA 分项 0-4、总分 0-24 都是 int8）
+
+    只处理点名的评分类列：ID、hr、计数等列保持 PostgreSQL 返回的宽度，
+    避免 pandas 小整数运算溢出回绕（如 Int16 的 hr * 3600）
+    """
+    import pyarrow.compute as pc
+    pa = _require_pyarrow()[0]
+    missing = [name for name in columns if name not in table.column_names]
+    if missing:
+        raise ValueError(f"downcast 中的列不在结果中: {missing}")
+    arrays = []
+    for field, column in zip(table.schema, table.columns):
+        if field.name in columns and pa.types.is_integer(field.type) and field.type.bit_width > 8:
+            bounds = pc.min_max(column).as_py()
+            if bounds['min'] is not None:
+                for candidate in (pa.int8(), pa.int16(), pa.int32()):
+                    if candidate.bit_width >= field.type.bit_width:
+                        break
+                    limit = 1 << (candidate.bit_width - 1)
+                    if -limit <= bounds['min'] and bounds['max'] < limit:
+                        column = column.cast(candidate)
+                        break
+        arrays.append(column)
+    return pa.Table.from_arrays(arrays, names=table.column_names)
+
+
+def _fetch_arrow(conn, sql: str, block_size: int = 16 << 20, downcast: Sequence[str] = ()):
+    pa = _require_pyarrow()[0]
+    schema, batches = _iter_copy_batches(conn, sql, block_size=block_size)
+    table = pa.Table.from_batches(list(batches), schema)
+    return _downcast_integers(table, downcast) if downcast else table
+
+
+def _arrow_to_pandas(table) -> pd.DataFrame:
+    """Arrow -> pandas：整数/布尔列转为可空扩展类型（按缓冲区整体转换，不逐个值建 Python 对象）"""
+    import pandas as pd
+    pa = _require_pyarrow()[0]
+    mapping = {
+        pa.int8(): pd.Int8Dtype(), pa.int16(): pd.Int16Dtype(),
+        pa.int32(): pd.Int32Dtype(), pa.int64(): pd.Int64Dtype(),
+        pa.bool_(): pd.BooleanDtype(),
+    }
+    return table.to_pandas(types_mapper=mapping.get, split_blocks=True, self_destruct=True)
+
+
+def query_to_arrow(sql: str, db: str = 'mimic', downcast: Sequence[str] = (),
+                   block_size: int = 16 << 20):
+    """
+    查询结果直接读成 pyarrow.Table（COPY + Arrow C++ CSV 解析，全程不经过逐行 Python 对象）
+
+    参数：
+        sql: SELECT 查询
+        db: 数据库名
+        downcast: 需要按取值范围缩小为 int8/int16/int32 的整数列（如评分分项）；
+                  其余列保持 PostgreSQL 类型的宽度（smallint -> int16, integer -> int32, bigint -> int64）
+        block_size: 每次解析的 COPY 数据块字节数
+
+    返回：
+        pyarrow.Table（table.to_pandas() 或 query_to_df(..., engine='arrow') 得到 DataFrame）
+
+    示例：
+        table = query_to_arrow("SELECT stay_id, hr, sofa2_total FROM mimiciv_derived.sofa2_scores",
+                               downcast=('sofa2_total',))
+    """
+    with pooled_connection(db) as conn:
+        return _fetch_arrow(conn, sql, block_size=block_size, downcast=downcast)
+
+
+# =============================================================================
+# 并行分区导出 - 按 key 的 pg_stats 直方图切分区间，每个区间一个连接一个文件
+# =============================================================================
+
+_IDENTIFIER_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_$]*(\.[A-Za-z_][A-Za-z0-9_$]*)?$')
+
+
+def _stats_source(conn, source: str, key: str) -> str:
+    """取 key 列统计信息的表：source 是表名时即本表，是查询时取计划中第一个含该列统计的表"""
+    if _IDENTIFIER_RE.match(source.strip()):
+        return source.strip()
+    with conn.cursor() as cur:
+        cur.execute(f"EXPLAIN (FORMAT JSON) {_strip_sql(source)}")
+        plan = cur.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        for schema, table in sorted(_plan_relations(plan)):
+            cur.execute("""
+                SELECT 1 FROM pg_stats WHERE schemaname = %s AND tablename = %s AND attname = %s
+            """, (schema, table, key))
+            if cur.fetchone():
+                return f"{schema}.{table}"
+    raise ValueError(f"查询引用的表中没有 {key} 列的统计信息，请先 ANALYZE")
+
+
+def _partition_bounds(conn, table_name: str, key: str, partitions: int) -> List[Optional[int]]:
+    """
+    返回 partitions-1 个整数切点，使各区间行数大致相等
+
+    优先使用 pg_stats.histogram_bounds（等频分桶，ANALYZE 得到）；
+    没有直方图时退回 min/max 等宽切分。
+    """
+    schema, table = _split_table_name(table_name)
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT histogram_bounds::text FROM pg_stats
+            WHERE schemaname = %s AND tablename = %s AND attname = %s
+        """, (schema, table, key))
+        row = cur.fetchone()
+        if row and row[0]:
+            try:
+                histogram = [int(v) for v in row[0].strip('{}').split(',')]
+            except ValueError:
+                raise ValueError(f"分区列 {key} 必须是整数类型")
+        else:
+            cur.execute(f"SELECT min({key})::bigint, max({key})::bigint FROM {table_name}")
+            low, high = cur.fetchone()
+            if low is None:
+                return []
+            histogram = [low + (high - low) * i // partitions for i in range(partitions + 1)]
+    cuts = []
+    for i in range(1, partitions):
+        cut = histogram[round(i * (len(histogram) - 1) / partitions)]
+        if (not cuts or cut > cuts[-1]) and cut > histogram[0]:
+            cuts.append(cut)
+    return cuts
+
+
+def export_partitioned_parquet(source: str, output_dir: str, db: str = 'mimic',
+                               key: str = 'stay_id', partitions: int = 8,
+                               workers: Optional[int] = None,
+                               row_group_size: int = 1_000_000, compression: str = 'zstd',
+                               block_size: int = 16 << 20) -> dict:
+    """
+    按 key 区间并行导出大表/查询为分区 Parquet 数据集（每个区间一个连接、一个文件）
+
+    单个 COPY 只用一个后端进程；切成 N 段后由 N 个连接同时导出，
+    服务器端 CPU、磁盘和网络都能被用满。所有连接共享同一个导出快照
+    （pg_export_snapshot），各文件合起来与单次导出的结果一致。
+
+    参数：
+        source: 表名（schema.table）或 SELECT 查询
+        output_dir: 输出目录，写入 part-00000.parquet ... 和 _manifest.json
+        db: 数据库名
+        key: 整数分区列（默认 stay_id）
+        partitions: 区间数
+        workers: 并行连接数（默认等于区间数）
+        row_group_size / compression / block_size: 同 export_to_parquet
+
+    返回：
+        dict: manifest（source、key、每个文件的区间、行数、字节数、耗时）
+
+    示例：
+        export_partitioned_parquet("mimiciv_derived.sofa2_scores", "output/sofa2_scores", partitions=16)
+        # 读取：pyarrow.dataset.dataset("output/sofa2_scores") 或 pd.read_parquet("output/sofa2_scores")
+    """
+    from datetime import datetime, timezone
+    _require_pyarrow()
+    source = _strip_sql(source)
+    is_table = bool(_IDENTIFIER_RE.match(source))
+    base_sql = f"SELECT * FROM {source}" if is_table else f"SELECT * FROM ({source}) AS _src"
+    workers = max(1, min(workers or partitions, partitions))
+
+    print(f"🔍 并行分区导出到 {output_dir}（{partitions} 个区间，{workers} 个连接）...")
+    started = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+
+    # 协调连接 + workers 个导出连接：连接池不够时只在本次导出期间临时扩容
+    with get_pool(db).temporary_capacity(workers + 1):
+        with pooled_connection(db) as coordinator:
+            # 可重复读事务导出快照；协调连接保持事务打开直到所有分区导出完成
+            with coordinator.cursor() as cur:
+                cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                cur.execute("SELECT pg_export_snapshot()")
+                snapshot = cur.fetchone()[0]
+            cuts = _partition_bounds(coordinator, _stats_source(coordinator, source, key), key, partitions)
+            ranges = list(zip([None] + cuts, cuts + [None]))
+
+            def export_range(index):
+                lower, upper = ranges[index]
+                conditions = []
+                if lower is not None:
+                    conditions.append(f"{key} >= {lower}")
+                if upper is not None:
+                    conditions.append(f"{key} < {upper}")
+                condition = ' AND '.join(conditions) or 'TRUE'
+                if lower is None:
+                    condition = f"({condition} OR {key} IS NULL)"
+                path = os.path.join(output_dir, f"part-{index:05d}.parquet")
+                part_started = time.perf_counter()
+                with pooled_connection(db) as conn:
+                    with conn.cursor() as cur:
+                        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                        cur.execute("SET TRANSACTION SNAPSHOT %s", (snapshot,))
+                    rows = _write_parquet(conn, f"{base_sql} WHERE {condition}", path,
+                                          row_group_size=row_group_size, compression=compression,
+                                          block_size=block_size, progress=False)
+                seconds = time.perf_counter() - part_started
+                print(f"  ✅ {os.path.basename(path)}: [{lower}, {upper}) {rows} 行 ({seconds:.1f}s)")
+                return {
+                    'file': os.path.basename(path), 'lower': lower, 'upper': upper,
+                    'rows': rows, 'bytes': os.path.getsize(path), 'seconds': round(seconds, 3),
+                }
+
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='partition-export') as executor:
+                files = list(executor.map(export_range, range(len(ranges))))
+            coordinator.rollback()
+
+    # 清理上一次导出遗留、本次没有覆盖的分区文件
+    current = {f['file'] for f in files}
+    for name in os.listdir(output_dir):
+        if name.startswith('part-') and name.endswith('.parquet') and name not in current:
+            os.remove(os.path.join(output_dir, name))
+
+    manifest = {
+        'source': source,
+        'db': db,
+        'key': key,
+        'snapshot': snapshot,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'rows': sum(f['rows'] for f in files),
+        'bytes': sum(f['bytes'] for f in files),
+        'seconds': round(time.perf_counter() - started, 3),
+        'files': files,
+    }
+    manifest_path = os.path.join(output_dir, '_manifest.json')
+    with open(f"{manifest_path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+    print(f"✅ 导出完成！{manifest['rows']} 行，{len(files)} 个文件，"
+          f"{manifest['bytes'] / 1024 / 1024:.1f} MB，{manifest['seconds']:.1f}s")
+    return manifest
+
+
+# =============================================================================
+# 流式查询 - 服务器端游标分批读取
+# =============================================================================
+
+# Arrow 类型名 -> pandas 列类型（整数/布尔使用可空类型，分批之间 dtype 保持一致）
+PANDAS_DTYPES = {
+    'bool_': 'boolean',
+    'int16': 'Int16', 'int32': 'Int32', 'int64': 'Int64',
+    'float32': 'float32', 'float64': 'float64',
+    'timestamp': 'datetime64[us]',
+}
+
+
+def _typed_frame(description, rows) -> pd.DataFrame:
+    """按结果列的 PostgreSQL 类型构造 DataFrame，保证每一批的 dtype 相同"""
+    import pandas as pd
+    df = pd.DataFrame.from_records(rows, columns=[desc.name for desc in description], coerce_float=True)
+    for i, desc in enumerate(description):
+        type_name = PG_ARROW_TYPES.get(desc.type_code)
+        if type_name == 'timestamptz':
+            df.isetitem(i, pd.to_datetime(df.iloc[:, i], utc=True))
+        elif type_name in PANDAS_DTYPES:
+            df.isetitem(i, df.iloc[:, i].astype(PANDAS_DTYPES[type_name]))
+    return df
+
+
+def iter_query(sql: str, db: str = 'mimic', batch_size: int = 100_000,
+               output: str = 'pandas', key: Optional[str] = None):
+    """
+    服务器端（命名）游标流式读取查询结果，按批返回，内存只与 batch_size 有关
+
+    参数：
+        sql: SQL查询
+        db: 数据库名
+        batch_size: 每批行数（也是每次网络往返的行数）
+        output: 'pandas'（可空整数/布尔 dtype 的 DataFrame）或 'arrow'（pyarrow.RecordBatch）
+        key: 分组列名（可选）。给定时 SQL 必须按该列 ORDER BY，
+             保证同一 key 的行不会被拆到两批里，便于逐 stay 聚合
+
+    示例：
+        # 逐批统计，不把小时表整体读入内存
+        for chunk in iter_query("SELECT stay_id, sofa2_total FROM mimiciv_derived.sofa2_scores"):
+            ...
+
+        # 按 stay 对齐分批
+        for chunk in iter_query(
+            "SELECT * FROM mimiciv_derived.sofa2_scores ORDER BY stay_id, hr",
+            key='stay_id'
+        ):
+            per_stay = chunk.groupby('stay_id')['sofa2_total'].max()
+    """
+    import pandas as pd
+    if output not in ('pandas', 'arrow'):
+        raise ValueError("output 只能是 'pandas' 或 'arrow'")
+    if output == 'arrow':
+        pa = _require_pyarrow()[0]
+
+    def emit(df):
+        if output == 'arrow':
+            return pa.RecordBatch.from_pandas(df, preserve_index=False)
+        return df
+
+    def matches(values, value):
+        return (values.isna() if pd.isna(value) else values.eq(value).fillna(False)).to_numpy(dtype=bool)
+
+    with pooled_connection(db) as conn:
+        with conn.cursor(name=f'iter_query_{threading.get_ident()}_{time.monotonic_ns()}') as cur:
+            cur.itersize = batch_size
+            cur.execute(sql)
+            # 末尾 key 尚未结束的各段：跨多批的 key 只追加到列表，key 变化时一次拼接
+            carry, carry_key = [], None
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                df = _typed_frame(cur.description, rows)
+                if key is not None:
+                    if carry:
+                        if matches(df[key], carry_key).all():
+                            carry.append(df)
+                            continue
+                        df = pd.concat(carry + [df], ignore_index=True)
+                    # 最后一个 key 的行可能延续到下一批，先留着
+                    carry_key = df[key].iloc[-1]
+                    tail = matches(df[key], carry_key)
+                    carry = [df[tail].reset_index(drop=True)]
+                    df = df[~tail].reset_index(drop=True)
+                    if df.empty:
+                        continue
+                yield emit(df)
+            if carry:
+                yield emit(pd.concat(carry, ignore_index=True) if len(carry) > 1 else carry[0])
+
+
+def fold_query(sql: str, func, initial, db: str = 'mimic', batch_size: int = 100_000,
+               output: str = 'pandas', key: Optional[str] = None):
+    """
+    对流式查询结果做折叠聚合：acc = func(acc, chunk)
+
+    示例：
+        # 各 SOFA2 总分的小时数分布
+        counts = fold_query(
+            "SELECT sofa2_total FROM mimiciv_derived.sofa2_scores",
+            lambda acc, chunk: acc.add(chunk['sofa2_total'].value_counts(), fill_value=0),
+            pd.Series(dtype='float64')
+        )
+    """
+    acc = initial
+    for chunk in iter_query(sql, db=db, batch_size=batch_size, output=output, key=key):
+        acc = func(acc, chunk)
+    return acc
+
+
 def execute_sql_file(sql_file: str, db: str = 'mimic') -> pd.DataFrame:
     """
     执行SQL文件（类似Navicat的运行SQL脚本）
@@ -177,8 +1568,232 @@ def execute_sql_file(sql_file: str, db: str = 'mimic') -> pd.DataFrame:
     return query_to_df(sql, db=db)
 
 
+# =============================================================================
+# 行数统计 - 目录估计 / 块抽样 / 精确（distinct 使用 HyperLogLog）
+# =============================================================================
+
+# HyperLogLog 寄存器位数：m = 2^14 个寄存器，相对标准误差约 1.04/sqrt(m) ≈ 0.8%
+HLL_PRECISION = 14
+
+
+class RowCount(NamedTuple):
+    """
+    count_rows 的结果；low/high 为行数的置信区间（精确模式下与 rows 相同）
+
+    approx_distinct 在所有模式下都是近似值：exact 模式为 HyperLogLog，其余为 pg_stats.n_distinct
+    """
+    rows: int
+    low: Optional[int]
+    high: Optional[int]
+    approx_distinct: Optional[int]
+    mode: str
+
+
+def _split_table_name(table_name: str) -> Tuple[str, str]:
+    schema, _, table = table_name.rpartition('.')
+    return schema or 'public', table
+
+
+def _planner_rows(cur, table_name: str, where: Optional[str]) -> int:
+    """规划器行数估计（reltuples 按当前 relpages 缩放，带 WHERE 时再乘选择率）"""
+    where_clause = f"WHERE {where}" if where else ""
+    cur.execute(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM {table_name} {where_clause}")
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def _stats_distinct(cur, table_name: str, column: str, rows: int) -> Optional[int]:
+    """pg_stats.n_distinct（ANALYZE 抽样得到；负值表示占总行数的比例）"""
+    schema, table = _split_table_name(table_name)
+    cur.execute("""
+        SELECT n_distinct FROM pg_stats
+        WHERE schemaname = %s AND tablename = %s AND attname = %s
+    """, (schema, table, column))
+    row = cur.fetchone()
+    if row is None or row[0] is None:
+        return None
+    n_distinct = float(row[0])
+    return int(round(-n_distinct * rows if n_distinct < 0 else n_distinct))
+
+
+def _sampled_blocks(cur, sample_clause: str, table_name: str) -> int:
+    """
+    TABLESAMPLE 实际读取的数据块数（EXPLAIN ANALYZE BUFFERS 中 Sample Scan 节点的块访问数）
+
+    包括没有可见行的块（全部已删除 / 膨胀），这些块不会出现在抽样查询的结果中
+    """
+    cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) SELECT count(*) FROM {table_name} {sample_clause}")
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    nodes = [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        if node['Node Type'] == 'Sample Scan':
+            return int(node.get('Shared Hit Blocks', 0) + node.get('Shared Read Blocks', 0))
+        nodes.extend(node.get('Plans', []))
+    return 0
+
+
+def _sample_rows(cur, table_name: str, where: Optional[str],
+                 sample_percent: float, confidence: float) -> Tuple[int, int, int]:
+    """
+    TABLESAMPLE SYSTEM 块抽样估计行数
+
+    以数据块为抽样单位（整群抽样）：总数 = 块数 × 抽中块的平均行数，
+    方差按块间行数差异计算（含有限总体校正）。抽中块只读一次，不做全表扫描。
+    抽中块数用同一 REPEATABLE 种子单独统计：按块分组的结果里没有空块，只用它求平均会偏高。
+    """
+    if not 0 < confidence < 1:
+        raise ValueError(f"confidence 必须在 (0, 1) 之间，收到: {confidence!r}")
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    cur.execute("SELECT pg_relation_size(%s::regclass) / current_setting('block_size')::int",
+                (table_name,))
+    total_blocks = int(cur.fetchone()[0])
+    if total_blocks == 0:
+        return 0, 0, 0
+
+    condition = f"({where})" if where else "TRUE"
+    sample_clause = f"TABLESAMPLE SYSTEM ({float(sample_percent)}) REPEATABLE ({random.randrange(1 << 31)})"
+    cur.execute(f"""
+        SELECT count(*) FILTER (WHERE {condition})
+        FROM {table_name} {sample_clause}
+        GROUP BY (ctid::text::point)[0]
+    """)
+    per_block = [r[0] for r in cur.fetchall()]
+    n = max(_sampled_blocks(cur, sample_clause, table_name), len(per_block))
+    if n == 0:
+        # 抽样没有命中任何块（小表），退回精确计数
+        cur.execute(f"SELECT count(*) FROM {table_name} WHERE {condition}")
+        rows = int(cur.fetchone()[0])
+        return rows, rows, rows
+
+    # 未出现在结果中的抽中块行数为 0
+    mean = sum(per_block) / n
+    variance = (sum(x * x for x in per_block) - n * mean * mean) / (n - 1) if n > 1 else 0.0
+    fpc = max(0.0, 1 - n / total_blocks)
+    stderr = total_blocks * (max(0.0, variance) / n * fpc) ** 0.5
+    rows = total_blocks * mean
+    return int(round(rows)), int(max(0, rows - z * stderr)), int(round(rows + z * stderr))
+
+
+def _hll_estimate(registers: List[int]) -> float:
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / sum(2.0 ** -r for r in registers)
+    zeros = registers.count(0)
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * math.log(m / zeros)     # 小基数线性计数校正
+    return estimate
+
+
+def _hash_expression(cur, table_name: str, column: str) -> str:
+    """列值的 64 位哈希表达式：整数列用 hashint8extended，其余类型转文本后哈希"""
+    cur.execute("""
+        SELECT atttypid::regtype::text FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attname = %s AND NOT attisdropped
+    """, (table_name, column))
+    row = cur.fetchone()
+    if row is None:
+        raise ValueError(f"列 {column} 不存在于 {table_name}")
+    if row[0] in ('smallint', 'integer', 'bigint'):
+        return f"hashint8extended({column}::bigint, 0)"
+    return f"hashtextextended({column}::text, 0)"
+
+
+def _exact_rows_hll_distinct(cur, table_name: str, column: str,
+                             where: Optional[str]) -> Tuple[int, int]:
+    """
+    一次顺序扫描同时得到精确行数和 HyperLogLog 去重数
+
+    每行对列值做 64 位哈希：高 p 位选寄存器，其余位的前导零个数 + 1 为秩。
+    秩随低位值单调递减，所以数据库端只需按寄存器取 min(低位)（最多 2^p 组的并行哈希聚合），
+    秩在 Python 端换算；内存占用固定，不需要 COUNT(DISTINCT) 的排序。
+    """
+    p = HLL_PRECISION
+    low_bits = 64 - p
+    where_clause = f"WHERE {where}" if where else ""
+    cur.execute(f"""
+        SELECT (v >> {low_bits}) & {(1 << p) - 1}, min(v & {(1 << low_bits) - 1}), count(*)
+        FROM (SELECT {_hash_expression(cur, table_name, column)} AS v
+              FROM {table_name} {where_clause}) h
+        GROUP BY 1
+    """)
+    registers = [0] * (1 << p)
+    rows = 0
+    for reg, low, n in cur.fetchall():
+        rows += n
+        if reg is not None:         # NULL 值只计入行数
+            registers[reg] = low_bits - low.bit_length() + 1
+    return rows, int(round(_hll_estimate(registers)))
+
+
+def _count_rows(cur, table_name: str, mode: str, where: Optional[str],
+                distinct: Optional[str], sample_percent: float,
+                confidence: float) -> RowCount:
+    if mode == 'exact':
+        if distinct:
+            rows, n_distinct = _exact_rows_hll_distinct(cur, table_name, distinct, where)
+        else:
+            where_clause = f"WHERE {where}" if where else ""
+            cur.execute(f"SELECT count(*) FROM {table_name} {where_clause}")
+            rows, n_distinct = int(cur.fetchone()[0]), None
+        return RowCount(rows, rows, rows, n_distinct, mode)
+
+    if mode == 'estimate':
+        rows = _planner_rows(cur, table_name, where)
+        low = high = None
+    elif mode == 'sample':
+        rows, low, high = _sample_rows(cur, table_name, where, sample_percent, confidence)
+    else:
+        raise ValueError(f"mode 必须是 'estimate'、'sample' 或 'exact'，收到: {mode!r}")
+
+    n_distinct = None
+    if distinct:
+        n_distinct = _stats_distinct(cur, table_name, distinct, rows)
+        if n_distinct is not None:
+            n_distinct = min(n_distinct, rows)
+    return RowCount(rows, low, high, n_distinct, mode)
+
+
+def count_rows(table_name: str, db: str = 'mimic', mode: str = 'sample',
+               where: Optional[str] = None, distinct: Optional[str] = None,
+               sample_percent: float = 1.0, confidence: float = 0.95) -> RowCount:
+    """
+    统计表行数（及某列去重数），按精度/耗时选择模式
+
+    参数：
+        table_name: 表名（schema.table）
+        db: 数据库名
+        mode:
+            'estimate' - 规划器估计（pg_class.reltuples），毫秒级；未 ANALYZE 的新表不准确
+            'sample'   - TABLESAMPLE SYSTEM 块抽样，返回置信区间；只读 sample_percent% 的数据块
+            'exact'    - 全表扫描精确计数
+        where: WHERE条件（可选）
+        distinct: 需要近似去重计数的列（如 'stay_id'）。exact 模式只有行数精确，去重数在同一次
+                  扫描中用 HyperLogLog 估计（误差约 0.8%）；estimate/sample 模式取 pg_stats.n_distinct
+                  （需要表已 ANALYZE，否则为 None）
+        sample_percent: sample 模式的抽样块比例（%）
+        confidence: sample 模式置信区间水平（0 到 1 之间，如 0.95）
+
+    返回：
+        RowCount(rows, low, high, approx_distinct, mode)
+
+    示例：
+        # 新建表后先 ANALYZE，再做秒级检查
+        c = count_rows('mimiciv_derived.sofa2_scores', mode='sample', distinct='stay_id')
+        print(f"{c.rows:,} 行 (95% CI {c.low:,}-{c.high:,}), 约 {c.approx_distinct:,} 个 ICU stay")
+    """
+    with pooled_connection(db, autocommit=True) as conn:
+        with conn.cursor() as cur:
+            return _count_rows(cur, table_name, mode, where, distinct,
+                               sample_percent, confidence)
+
+
 def get_row_count(table_name: str, db: str = 'mimic',
-                  where: Optional[str] = None) -> int:
+                  where: Optional[str] = None, mode: str = 'exact') -> int:
     """
     快速获取表行数
 
@@ -186,6 +1801,7 @@ def get_row_count(table_name: str, db: str = 'mimic',
         table_name: 表名
         db: 数据库名
         where: WHERE条件（可选）
+        mode: 'exact'（默认）/'sample'/'estimate'，见 count_rows
 
     返回：
         int: 行数
@@ -197,11 +1813,11 @@ def get_row_count(table_name: str, db: str = 'mimic',
         # 带条件
         count = get_row_count('mimiciv_icu.icustays',
                              where="los > 7")
+
+        # 大表只要数量级
+        count = get_row_count('mimiciv_icu.chartevents', mode='estimate')
     """
-    where_clause = f"WHERE {where}" if where else ""
-    sql = f"SELECT COUNT(*) as count FROM {table_name} {where_clause}"
-    df = query_to_df(sql, db=db)
-    return int(df.iloc[0]['count'])
+    return count_rows(table_name, db=db, mode=mode, where=where).rows
 
 
 # =============================================================================
@@ -253,15 +1869,9 @@ def test_connection(db: str = 'mimic') -> bool:
         print(f"   端口: {config['port']}")
         print(f"   数据库: {config['database']}")
 
-        conn = psycopg2.connect(
-            host=config['host'],
-            port=config['port'],
-            database=config['database'],
-            user=config['user'],
-            password=config['password'],
-            connect_timeout=5
-        )
-        conn.close()
+        with pooled_connection(db, autocommit=True) as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
 
         print(f"✅ 连接成功！")
         return True
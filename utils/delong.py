@@ -0,0 +1,155 @@
+"""
+快速 DeLong 检验 - 一次排序同时得到 k 个相关评分的 AUC、k×k 协方差矩阵和两两比较
+
+算法（Sun & Xu 2014, "Fast Implementation of DeLong's Algorithm"）：
+    - 阳性 m 例、阴性 n 例；每个评分分别在阳性内、阴性内、全体中求中位秩（并列取平均秩）
+    - AUC = (阳性在全体中的秩和 - m(m+1)/2) / (m·n)
+    - 结构分量 V10（每个阳性）、V01（每个阴性）由全体秩减去组内秩得到，无需 m×n 比较
+    - 协方差 S = cov(V10) / m + cov(V01) / n
+复杂度 O(k · N log N)，14 个评分、7 万例一次调用约 0.2 秒。
+
+只使用所有评分都不缺失的病例（DeLong 协方差要求同一批病例）。
+
+示例：
+    result = fast_delong(df['icu_mortality'], df[['sofa_score', 'sofa2_score']])
+    print(result.summary())
+    print(result.pairwise())
+"""
+
+from itertools import combinations
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from utils.auc_bootstrap import _as_score_matrix
+
+
+class DeLongResult(NamedTuple):
+    """
+    names: 评分名称
+    auc: 各评分 AUC，形状 (k,)
+    cov: AUC 的 DeLong 协方差矩阵，形状 (k, k)
+    n_pos / n_neg: 参与计算的阳性 / 阴性例数
+    """
+    names: List[str]
+    auc: np.ndarray
+    cov: np.ndarray
+    n_pos: int
+    n_neg: int
+
+    def summary(self, alpha: float = 0.05) -> pd.DataFrame:
+        """各评分的 AUC、标准误和正态近似置信区间"""
+        se = np.sqrt(np.diag(self.cov))
+        z = stats.norm.ppf(1 - alpha / 2)
+        return pd.DataFrame({
+            'score': self.names,
+            'auc': self.auc,
+            'se': se,
+            'ci_low': self.auc - z * se,
+            'ci_high': self.auc + z * se,
+        })
+
+    def pairwise(self, pairs: Optional[Sequence[Tuple[str, str]]] = None,
+                 alpha: float = 0.05) -> pd.DataFrame:
+        """
+        两两比较 AUC(score_a) - AUC(score_b)
+
+        pairs 默认为所有组合；返回 diff、se、z、p_value 和置信区间
+        """
+        if pairs is None:
+            pairs = list(combinations(self.names, 2))
+        a = np.array([self.names.index(p[0]) for p in pairs], dtype=int)
+        b = np.array([self.names.index(p[1]) for p in pairs], dtype=int)
+        diff = self.auc[a] - self.auc[b]
+        var = self.cov[a, a] + self.cov[b, b] - 2 * self.cov[a, b]
+        se = np.sqrt(np.clip(var, 0, None))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = diff / se
+        q = stats.norm.ppf(1 - alpha / 2)
+        return pd.DataFrame({
+            'score_a': [p[0] for p in pairs],
+            'score_b': [p[1] for p in pairs],
+            'auc_a': self.auc[a],
+            'auc_b': self.auc[b],
+            'diff': diff,
+            'se': se,
+            'z': z,
+            'p_value': 2 * stats.norm.sf(np.abs(z)),
+            'ci_low': diff - q * se,
+            'ci_high': diff + q * se,
+        })
+
+
+def fast_delong(y, scores) -> DeLongResult:
+    """
+    DeLong AUC 与协方差（所有评分一次计算）
+
+    参数：
+        y: 二分类结局（0/1）
+        scores: 评分（Series / DataFrame / {name: array} / n×k 数组）
+
+    返回：
+        DeLongResult(names, auc, cov, n_pos, n_neg)
+    """
+    y = np.asarray(y, dtype=float)
+    names, matrix = _as_score_matrix(scores)
+    keep = ~np.isnan(y) & ~np.isnan(matrix).any(axis=1)
+    y, matrix = y[keep], matrix[keep]
+
+    positive = y == 1
+    pos, neg = matrix[positive].T, matrix[~positive].T      # k × m, k × n
+    m, n = pos.shape[1], neg.shape[1]
+    k = len(names)
+    if m == 0 or n == 0:
+        return DeLongResult(names, np.full(k, np.nan), np.full((k, k), np.nan), m, n)
+
+    # 中位秩：组内与全体各排序一次（rankdata 按行排序，并列取平均秩）
+    rank_pos = stats.rankdata(pos, axis=1)
+    rank_neg = stats.rankdata(neg, axis=1)
+    rank_all = stats.rankdata(np.hstack([pos, neg]), axis=1)
+
+    auc = (rank_all[:, :m].sum(axis=1) - m * (m + 1) / 2) / (m * n)
+    v10 = (rank_all[:, :m] - rank_pos) / n                   # 每个阳性：低于它的阴性比例
+    v01 = 1 - (rank_all[:, m:] - rank_neg) / m               # 每个阴性：高于它的阳性比例
+
+    cov = np.atleast_2d(np.cov(v10)) / m + np.atleast_2d(np.cov(v01)) / n
+    return DeLongResult(names, auc, cov, m, n)
+
+
+def delong_by_group(df: pd.DataFrame, outcomes: Sequence[str], score_cols: Sequence[str],
+                    group_col: Optional[str] = None,
+                    pairs: Optional[Sequence[Tuple[str, str]]] = None,
+                    alpha: float = 0.05) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    多结局 × 多亚组的 DeLong 分析
+
+    参数：
+        outcomes: 结局列（每个结局单独计算）
+        score_cols: 评分列（例如 SOFA-1 总分、SOFA-2 总分和各器官分项）
+        group_col: 亚组列，None 时只算全体
+        pairs: 需要比较的评分对，默认所有组合
+
+    返回：
+        (auc_table, pair_table)：每个结局 / 亚组 / 评分的 AUC，以及两两比较结果
+    """
+    groups = [('all', df)] if group_col is None else list(df.groupby(group_col, sort=True))
+    auc_frames, pair_frames = [], []
+    for outcome in outcomes:
+        for group, sub in groups:
+            result = fast_delong(sub[outcome], sub[list(score_cols)])
+            if result.n_pos == 0 or result.n_neg == 0:
+                continue
+            keys = {'outcome': outcome, 'group': group, 'n_pos': result.n_pos, 'n_neg': result.n_neg}
+            auc_frames.append(result.summary(alpha).assign(**keys))
+            pair_frames.append(result.pairwise(pairs, alpha).assign(**keys))
+
+    def _ordered(frames):
+        if not frames:
+            return pd.DataFrame()
+        out = pd.concat(frames, ignore_index=True)
+        front = ['outcome', 'group', 'n_pos', 'n_neg']
+        return out[front + [c for c in out.columns if c not in front]]
+
+    return _ordered(auc_frames), _ordered(pair_frames)
@@ -0,0 +1,142 @@
+"""
+逐日 SOFA-2 轨迹 - 从 sofa2_scores_hr_filtered 一次分组扫描得到每个 stay 第 0..N 天的最大分
+
+口径：
+    - ICU 第 d 天 = hr / 24 == d（hr 从 0 开始，第 0 天即入科后前 24 小时）
+    - 各组件取当天 24 小时窗口分的最大值；sofa2_total 取当天小时总分的最大值
+      （即当天最差的 24 小时窗口，与 first_day_sofa2 的口径一致）
+    - 一条 GROUP BY stay_id, hr / 24 查询完成，不再按天分别查询
+
+结果保存为紧凑的 字段 × stays × 天 int8 矩阵（-1 表示该天无数据），7 万个 stay、
+7 天、7 个字段约 3.4 MB，可以 save() / load() 到 .npz 供分析脚本复用。
+
+示例：
+    daily = load_daily_sofa2(days=7)
+    totals = daily.matrix('sofa2_total', carry_forward=True)      # stays × 7，float，NaN 为缺失
+    frame = daily.to_frame('sofa2_total')                          # 列 day0..day6，index 为 stay_id
+"""
+
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+DAILY_FIELDS = ('brain', 'respiratory', 'cardiovascular', 'liver', 'kidney', 'hemostasis', 'sofa2_total')
+
+MISSING = -1
+
+DAILY_SQL = """
+SELECT
+    stay_id,
+    hr / 24 AS day,
+    {maxima}
+FROM {table}
+WHERE hr < {max_hr}{stay_filter}
+GROUP BY stay_id, hr / 24
+"""
+
+
+class DailySofa2(NamedTuple):
+    """
+    stay_ids: 升序 stay_id，形状 (n_stays,)
+    fields: 字段名（组件 + sofa2_total）
+    values: int8 矩阵，形状 (n_fields, n_stays, n_days)，MISSING (-1) 表示无数据
+    """
+    stay_ids: np.ndarray
+    fields: Tuple[str, ...]
+    values: np.ndarray
+
+    @property
+    def n_days(self) -> int:
+        return self.values.shape[2]
+
+    def matrix(self, field: str = 'sofa2_total', carry_forward: bool = False) -> np.ndarray:
+        """
+        某个字段的 stays × days 浮点矩阵（缺失为 NaN）
+
+        carry_forward: 出 ICU 或中间缺失的天沿用最近一天的分数（首日之前的缺失保持 NaN）
+        """
+        data = self.values[self.fields.index(field)].astype(float)
+        data[data == MISSING] = np.nan
+        if carry_forward:
+            observed = ~np.isnan(data)
+            last = np.where(observed, np.arange(data.shape[1]), 0)
+            np.maximum.accumulate(last, axis=1, out=last)
+            filled = np.take_along_axis(data, last, axis=1)
+            seen = np.maximum.accumulate(observed, axis=1)
+            data = np.where(seen, filled, np.nan)
+        return data
+
+    def to_frame(self, field: str = 'sofa2_total', carry_forward: bool = False,
+                 prefix: str = 'day') -> pd.DataFrame:
+        """某个字段的宽表：index 为 stay_id，列为 day0..dayN-1"""
+        return pd.DataFrame(self.matrix(field, carry_forward),
+                            index=pd.Index(self.stay_ids, name='stay_id'),
+                            columns=[f'{prefix}{d}' for d in range(self.n_days)])
+
+    def subset(self, stay_ids: Sequence[int]) -> 'DailySofa2':
+        """按给定 stay_id 顺序取子集（不存在的 stay 全部为 MISSING）"""
+        stay_ids = np.asarray(stay_ids, dtype=np.int64)
+        pos = np.searchsorted(self.stay_ids, stay_ids)
+        pos = np.clip(pos, 0, max(len(self.stay_ids) - 1, 0))
+        found = (self.stay_ids[pos] == stay_ids) if len(self.stay_ids) else np.zeros(len(stay_ids), bool)
+        values = np.full((len(self.fields), len(stay_ids), self.n_days), MISSING, dtype=np.int8)
+        values[:, found] = self.values[:, pos[found]]
+        return DailySofa2(stay_ids, self.fields, values)
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(path, stay_ids=self.stay_ids, fields=np.array(self.fields), values=self.values)
+
+    @classmethod
+    def load(cls, path: str) -> 'DailySofa2':
+        with np.load(path) as data:
+            return cls(data['stay_ids'], tuple(str(f) for f in data['fields']), data['values'])
+
+
+def build_daily_matrix(stay_id: np.ndarray, day: np.ndarray, columns: dict, days: int) -> DailySofa2:
+    """
+    (stay_id, day, 字段...) 长表 -> DailySofa2 矩阵
+
+    columns: {字段名: 值数组}；缺失值（NaN / None）记为 MISSING
+    """
+    stay_ids, row = np.unique(np.asarray(stay_id, dtype=np.int64), return_inverse=True)
+    day = np.asarray(day, dtype=np.int64)
+    fields = tuple(columns)
+    values = np.full((len(fields), len(stay_ids), days), MISSING, dtype=np.int8)
+    keep = (day >= 0) & (day < days)
+    for i, field in enumerate(fields):
+        column = pd.to_numeric(pd.Series(columns[field]), errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        valid = keep & ~np.isnan(column)
+        values[i, row[valid], day[valid]] = column[valid].astype(np.int8)
+    return DailySofa2(stay_ids, fields, values)
+
+
+def load_daily_sofa2(db: str = 'mimic', days: int = 7, stay_ids: Optional[Sequence[int]] = None,
+                     table: str = 'mimiciv_derived.sofa2_scores_hr_filtered',
+                     fields: Sequence[str] = DAILY_FIELDS) -> DailySofa2:
+    """
+    一次分组扫描提取第 0..days-1 天的逐日最大分
+
+    参数：
+        days: 天数（第 0 天为入科后前 24 小时）
+        stay_ids: 只提取这些 stay（None 为全部）
+        table: 小时评分表（需含 stay_id、hr 和 fields 各列）
+        fields: 要取最大值的列
+    """
+    from utils.db_helper import query_to_arrow
+
+    maxima = ',\n    '.join(f"max({f})::smallint AS {f}" for f in fields)
+    stay_filter = ''
+    if stay_ids is not None:
+        ids = ', '.join(str(int(s)) for s in np.unique(np.asarray(stay_ids, dtype=np.int64)))
+        stay_filter = f"\n  AND stay_id = ANY(ARRAY[{ids}]::int[])" if ids else "\n  AND false"
+    sql = DAILY_SQL.format(maxima=maxima, table=table, max_hr=int(days) * 24, stay_filter=stay_filter)
+
+    print(f"📥 提取逐日 SOFA-2（第 0-{days - 1} 天，{table}）...")
+    arrow_table = query_to_arrow(sql, db=db)
+    columns = {f: arrow_table.column(f).to_numpy(zero_copy_only=False) for f in fields}
+    daily = build_daily_matrix(arrow_table.column('stay_id').to_numpy(zero_copy_only=False),
+                               arrow_table.column('day').to_numpy(zero_copy_only=False),
+                               columns, days)
+    print(f"✅ {len(daily.stay_ids):,} 个 stay × {days} 天（{arrow_table.num_rows:,} 个 stay-day）")
+    return daily
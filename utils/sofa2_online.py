@@ -0,0 +1,732 @@
+"""
+SOFA-2 在线（增量）评分器 - 按时间顺序消费单个 ICU stay 的事件流，逐小时输出评分
+
+与批处理流水线 (sofa2_sql/02~04) 口径一致：
+    - 小时网格: hr=0 的 endtime 为 ICU 入科时间向上取整到整点，从 hr=-24 开始
+    - 各组件小时原始分 = 03_hourly_raw_scores.sql 的 CASE 逻辑
+    - 最终分 = 过去 24 小时 (ROWS 23 PRECEDING) 各组件最大值，总分为六项之和
+
+评分器只保留 SQL 逻辑所需的最小状态：
+    - 镇静 LOCF (最近一次未镇静 GCS 的分数)
+    - 当前小时内最后一次 FiO2 / SpO2 / PaO2
+    - 6/12/24 小时尿量滚动和
+    - 48 小时胆红素最大值 / 血小板最小值 (单调队列)
+    - 各组件 24 小时最大值 (单调队列)
+每个事件的更新代价为摊还 O(1)，单进程可以同时跟踪数千个床位。
+
+示例：
+    scorer = OnlineSofa2Scorer(stay_id=30000001, intime=intime, weight=72.5)
+    for event in events:                      # 按 time 升序
+        for row in scorer.push(event):        # 每关闭一个小时输出一行
+            print(row.hr, row.sofa2_total)
+    scorer.advance_to(now)                    # 床旁: 按墙钟关闭已结束的小时
+"""
+
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+HOUR = timedelta(hours=1)
+LAB_LOOKBACK = timedelta(hours=48)
+
+COMPONENTS = ('brain', 'respiratory', 'cardiovascular', 'liver', 'kidney', 'hemostasis')
+
+# 与 02_stage_components.sql 2.5 节一致
+ECMO_ITEMIDS = frozenset({
+    224660, 229270, 229277, 229280, 229278, 229363, 229364, 229365, 228193
+})
+ECMO_CONFIG_ITEMID = 229268
+OTHER_MECH_ITEMIDS = frozenset({
+    224322, 227980, 225980, 228866,
+    228154, 229671, 229897, 229898, 229899, 229900,
+    220125, 220128, 229254, 229262, 229255, 229263
+})
+ADVANCED_RESP_STATUSES = frozenset({
+    'InvasiveVent', 'NonInvasiveVent', 'Tracheostomy', 'HFNC'
+})
+VASOACTIVE_DRUGS = (
+    'norepinephrine', 'epinephrine', 'dopamine', 'dobutamine',
+    'vasopressin', 'phenylephrine', 'milrinone'
+)
+
+# FiO2 来源优先级（同一 charttime 血气优先于 chartevents）
+FIO2_PRIORITY = {'bg': 1, 'ce': 2}
+
+
+class Sofa2Event(NamedTuple):
+    """
+    单个临床事件
+
+    time: 事件时间（区间类事件为 starttime）
+    kind: 事件类型，见 OnlineSofa2Scorer 的 _handle_* 方法
+          gcs / sedation / delirium / ventilation / mech / fio2 / spo2 / pao2 /
+          vitals / vasoactive / chemistry / bg / rrt / urine / platelet / bilirubin
+    data: 事件字段（与源表列名一致，如 gcs_motor、norepinephrine、urineoutput）
+    """
+    time: datetime
+    kind: str
+    data: dict
+
+
+class Sofa2HourlyScore(NamedTuple):
+    """一个已关闭小时的评分（列与 mimiciv_derived.sofa2_scores 对应）"""
+    stay_id: int
+    hr: int
+    starttime: datetime
+    endtime: datetime
+    brain: int
+    respiratory: int
+    cardiovascular: int
+    liver: int
+    kidney: int
+    hemostasis: int
+    sofa2_total: int
+    raw: Tuple[int, int, int, int, int, int]
+
+
+# =============================================================================
+# 组件评分（逐条对应 02/03 的 CASE 表达式）
+# =============================================================================
+
+def _gcs_motor_score(gcs_motor):
+    if gcs_motor is None:
+        return None
+    if gcs_motor <= 2:
+        return 4
+    if gcs_motor == 3:
+        return 3
+    if gcs_motor == 4:
+        return 2
+    if gcs_motor == 5:
+        return 1
+    if gcs_motor == 6:
+        return 0
+    return None
+
+
+def gcs_brain_score(gcs=None, gcs_motor=None, gcs_unable=None) -> Optional[int]:
+    """单次 GCS 记录的原始脑评分（插管时强制用 Motor，否则 Total 优先）"""
+    if gcs_unable == 1:
+        return _gcs_motor_score(gcs_motor)
+    if gcs is not None:
+        if gcs <= 5:
+            return 4
+        if gcs <= 8:
+            return 3
+        if gcs <= 12:
+            return 2
+        if gcs <= 14:
+            return 1
+        if gcs == 15:
+            return 0
+    return _gcs_motor_score(gcs_motor)
+
+
+def respiratory_score(is_ecmo, pf_ratio, sf_ratio, raw_spo2, with_resp_support) -> int:
+    """呼吸评分：ECMO -> PF -> SF (SpO2 < 98%) 兜底"""
+    if is_ecmo:
+        return 4
+    if pf_ratio is not None:
+        if pf_ratio <= 75 and with_resp_support:
+            return 4
+        if pf_ratio <= 150 and with_resp_support:
+            return 3
+        if pf_ratio <= 225:
+            return 2
+        if pf_ratio <= 300:
+            return 1
+        return 0
+    if sf_ratio is not None and raw_spo2 is not None and raw_spo2 < 98:
+        if sf_ratio <= 120 and with_resp_support:
+            return 4
+        if sf_ratio <= 200 and with_resp_support:
+            return 3
+        if sf_ratio <= 250:
+            return 2
+        if sf_ratio <= 300:
+            return 1
+        return 0
+    return 0
+
+
+def cardiovascular_score(mech: Dict[str, int], mbp_min, rates: Dict[str, Optional[float]]) -> int:
+    """心血管评分：机械循环支持 > NE+Epi 剂量 > 其他药物 > MAP"""
+    if mech.get('is_other_mech') or mech.get('is_va_ecmo'):
+        return 4
+    if mech.get('is_ecmo') and not mech.get('is_vv_ecmo'):
+        return 4
+
+    ne_epi = (rates.get('norepinephrine') or 0) + (rates.get('epinephrine') or 0)
+    rate_dop = rates.get('dopamine')
+    if rate_dop is not None and rate_dop > 40:
+        dop_score = 4
+    elif rate_dop is not None and rate_dop > 20:
+        dop_score = 3
+    elif rate_dop is not None and rate_dop > 0:
+        dop_score = 2
+    else:
+        dop_score = 0
+    other_drug = any(
+        (rates.get(drug) or 0) > 0
+        for drug in ('dobutamine', 'vasopressin', 'phenylephrine', 'milrinone', 'dopamine')
+    )
+
+    if ne_epi > 0.4 or (ne_epi > 0.2 and other_drug) or dop_score == 4:
+        return 4
+    if ne_epi > 0.2 or (ne_epi > 0 and other_drug) or dop_score == 3:
+        return 3
+    if ne_epi > 0 or other_drug or dop_score == 2:
+        return 2
+
+    mbp = 70 if mbp_min is None else mbp_min
+    if mbp < 40:
+        return 4
+    if mbp < 50:
+        return 3
+    if mbp < 60:
+        return 2
+    if mbp < 70:
+        return 1
+    return 0
+
+
+def liver_score(bilirubin_max) -> int:
+    if bilirubin_max is None:
+        return 0
+    if bilirubin_max > 12.0:
+        return 4
+    if bilirubin_max > 6.0:
+        return 3
+    if bilirubin_max > 3.0:
+        return 2
+    if bilirubin_max > 1.2:
+        return 1
+    return 0
+
+
+def hemostasis_score(platelet_min) -> int:
+    if platelet_min is None:
+        return 0
+    if platelet_min <= 50:
+        return 4
+    if platelet_min <= 80:
+        return 3
+    if platelet_min <= 100:
+        return 2
+    if platelet_min <= 150:
+        return 1
+    return 0
+
+
+def _gt(value, threshold):
+    return value is not None and value > threshold
+
+
+def _lt(value, threshold):
+    return value is not None and value < threshold
+
+
+def kidney_score(creatinine, potassium, ph, bicarbonate, on_rrt,
+                 urine_rate, window_status, uo_sum_12h, cnt_12h) -> int:
+    """肾脏评分：RRT / 虚拟 RRT -> 肌酐与尿量速率分级"""
+    if on_rrt:
+        return 4
+    if ((_gt(creatinine, 1.2) or _lt(urine_rate, 0.3))
+            and ((potassium is not None and potassium >= 6.0)
+                 or (ph is not None and ph <= 7.2 and bicarbonate is not None and bicarbonate <= 12))
+            and window_status in ('full_24h', 'full_12h', 'full_6h')):
+        return 4
+    if _gt(creatinine, 3.5):
+        return 3
+    if _lt(urine_rate, 0.3) and window_status in ('full_24h', 'full_12h'):
+        return 3
+    if _lt(uo_sum_12h, 5.0) and cnt_12h >= 12:
+        return 3
+    if _gt(creatinine, 2.0):
+        return 2
+    if _lt(urine_rate, 0.5) and window_status in ('full_12h', 'full_6h'):
+        return 2
+    if _gt(creatinine, 1.2):
+        return 1
+    if _lt(urine_rate, 0.5) and window_status == 'full_6h':
+        return 1
+    return 0
+
+
+# =============================================================================
+# 增量数据结构
+# =============================================================================
+
+class _WindowExtreme:
+    """滑动窗口极值（单调队列）：窗口为 (key_now - span, key_now]，摊还 O(1)"""
+
+    __slots__ = ('span', 'is_max', 'items')
+
+    def __init__(self, span, mode: str = 'max'):
+        self.span = span
+        self.is_max = mode == 'max'
+        self.items = deque()
+
+    def push(self, key, value):
+        items = self.items
+        if self.is_max:
+            while items and items[-1][1] <= value:
+                items.pop()
+        else:
+            while items and items[-1][1] >= value:
+                items.pop()
+        items.append((key, value))
+
+    def value(self, key_now):
+        items = self.items
+        cutoff = key_now - self.span
+        while items and items[0][0] <= cutoff:
+            items.popleft()
+        return items[0][1] if items else None
+
+
+class _RollingSum:
+    """最近 size 行的 SUM/COUNT（与 ROWS BETWEEN size-1 PRECEDING 一致，全 NULL 时 SUM 为 NULL）"""
+
+    __slots__ = ('size', 'values', 'total', 'non_null')
+
+    def __init__(self, size: int):
+        self.size = size
+        self.values = deque()
+        self.total = 0.0
+        self.non_null = 0
+
+    def push(self, value):
+        self.values.append(value)
+        if value is not None:
+            self.total += value
+            self.non_null += 1
+        if len(self.values) > self.size:
+            old = self.values.popleft()
+            if old is not None:
+                self.total -= old
+                self.non_null -= 1
+
+    @property
+    def sum(self):
+        return self.total if self.non_null else None
+
+    @property
+    def count(self) -> int:
+        return len(self.values)
+
+
+class _HourState:
+    """单个小时窗口内的累积量"""
+
+    __slots__ = (
+        'pao2', 'spo2', 'fio2', 'mbp_min', 'mech',
+        'creatinine', 'potassium', 'ph', 'bicarbonate', 'on_rrt', 'urine'
+    )
+
+    def __init__(self):
+        self.pao2 = None            # (time, value)
+        self.spo2 = None            # (time, value)
+        self.fio2 = None            # (time, priority, value)
+        self.mbp_min = None
+        self.mech = {}
+        self.creatinine = None
+        self.potassium = None
+        self.ph = None
+        self.bicarbonate = None
+        self.on_rrt = 0
+        self.urine = None
+
+
+def _ceil_hour(t: datetime) -> datetime:
+    floored = t.replace(minute=0, second=0, microsecond=0)
+    return floored if floored == t else floored + HOUR
+
+
+def _max(current, value):
+    if value is None:
+        return current
+    return value if current is None or value > current else current
+
+
+def _min(current, value):
+    if value is None:
+        return current
+    return value if current is None or value < current else current
+
+
+# =============================================================================
+# 评分器
+# =============================================================================
+
+class OnlineSofa2Scorer:
+    """
+    单个 ICU stay 的增量 SOFA-2 评分器
+
+    参数：
+        stay_id: ICU stay ID
+        intime: ICU 入科时间
+        weight: 体重 kg（与 02 的五级兜底结果一致）
+        outtime: ICU 出科时间（可选，给定时不输出超出 icustay_hourly 范围的小时）
+        first_hr: 第一个评分小时（默认 -24，与 icustay_hourly_basedon_icuintime 一致）
+
+    使用约定：
+        - 事件必须按 time 非降序 push；同一时刻区间开始类事件（sedation 等）应先于点事件
+        - push 在接收事件前先关闭所有 endtime < event.time 的小时，并返回这些小时的评分
+        - advance_to(t) 可在没有新事件时按墙钟关闭小时
+    """
+
+    def __init__(self, stay_id: int, intime: datetime, weight: Optional[float],
+                 outtime: Optional[datetime] = None, first_hr: int = -24):
+        self.stay_id = stay_id
+        self.intime = intime
+        self.outtime = outtime
+        self.weight = weight
+        self.base = _ceil_hour(intime)
+        self.next_hr = first_hr
+        self.last_hr = None
+        if outtime is not None:
+            seconds = (outtime - intime).total_seconds()
+            self.last_hr = int(-(-seconds // 3600))
+
+        self._hours: Dict[int, _HourState] = {}
+
+        # 脑：镇静区间最大结束时间 + LOCF
+        self._sedated_until = None
+        self._locf_score = None
+        self._pending_gcs = deque()
+        self._brain_current = 0
+        self._delirium = []
+
+        # 区间类事件（按 starttime 到达）
+        self._resp_support = []
+        self._vasoactive = []
+
+        # 48h 实验室回溯
+        self._bilirubin = _WindowExtreme(LAB_LOOKBACK, 'max')
+        self._platelet = _WindowExtreme(LAB_LOOKBACK, 'min')
+
+        # 尿量滚动窗口
+        self._uo6 = _RollingSum(6)
+        self._uo12 = _RollingSum(12)
+        self._uo24 = _RollingSum(24)
+
+        # 各组件 24h 最大值
+        self._component_max = [_WindowExtreme(24, 'max') for _ in COMPONENTS]
+
+        self._handlers = {
+            'gcs': self._handle_gcs,
+            'sedation': self._handle_sedation,
+            'delirium': self._handle_delirium,
+            'ventilation': self._handle_ventilation,
+            'mech': self._handle_mech,
+            'fio2': self._handle_fio2,
+            'spo2': self._handle_spo2,
+            'pao2': self._handle_pao2,
+            'vitals': self._handle_vitals,
+            'vasoactive': self._handle_vasoactive,
+            'chemistry': self._handle_chemistry,
+            'bg': self._handle_bg,
+            'rrt': self._handle_rrt,
+            'urine': self._handle_urine,
+            'platelet': self._handle_platelet,
+            'bilirubin': self._handle_bilirubin,
+        }
+
+    # ------------------------------------------------------------------
+    # 公共接口
+    # ------------------------------------------------------------------
+
+    def endtime(self, hr: int) -> datetime:
+        return self.base + hr * HOUR
+
+    def push(self, event: Sofa2Event) -> List[Sofa2HourlyScore]:
+        """接收一个事件，返回因此关闭的小时评分"""
+        emitted = self.advance_to(event.time)
+        handler = self._handlers.get(event.kind)
+        if handler is None:
+            raise ValueError(f"未知事件类型: {event.kind}")
+        handler(event.time, event.data)
+        return emitted
+
+    def advance_to(self, t: datetime) -> List[Sofa2HourlyScore]:
+        """关闭所有 endtime < t 的小时（这些小时不会再收到事件）"""
+        emitted = []
+        while self.last_hr is None or self.next_hr <= self.last_hr:
+            if self.endtime(self.next_hr) >= t:
+                break
+            emitted.append(self._finalize(self.next_hr))
+            self.next_hr += 1
+        return emitted
+
+    def flush(self) -> List[Sofa2HourlyScore]:
+        """stay 结束：关闭到 last_hr 为止的所有小时（需要 outtime）"""
+        if self.last_hr is None:
+            raise ValueError("flush 需要 outtime；床旁模式请使用 advance_to")
+        return self.advance_to(self.endtime(self.last_hr) + HOUR)
+
+    # ------------------------------------------------------------------
+    # 小时定位
+    # ------------------------------------------------------------------
+
+    def _locate(self, t: datetime) -> Tuple[int, bool]:
+        """返回 t 所属 (endtime-1h, endtime] 小时，以及 t 是否恰好落在整点边界"""
+        q, r = divmod(t - self.base, HOUR)
+        return (q + 1 if r else q), not r
+
+    def _hour(self, hr: int) -> Optional[_HourState]:
+        if hr < self.next_hr:
+            return None
+        state = self._hours.get(hr)
+        if state is None:
+            state = self._hours[hr] = _HourState()
+        return state
+
+    def _open_hours(self, t: datetime) -> List[_HourState]:
+        """左开右闭窗口 (endtime-1h, endtime]"""
+        hr, _ = self._locate(t)
+        state = self._hour(hr)
+        return [state] if state is not None else []
+
+    def _closed_hours(self, t: datetime) -> List[_HourState]:
+        """闭区间窗口 [endtime-1h, endtime]：整点时刻同时属于前后两个小时"""
+        hr, on_boundary = self._locate(t)
+        states = [self._hour(hr)]
+        if on_boundary:
+            states.append(self._hour(hr + 1))
+        return [s for s in states if s is not None]
+
+    # ------------------------------------------------------------------
+    # 事件处理
+    # ------------------------------------------------------------------
+
+    def _handle_sedation(self, t, data):
+        endtime = data.get('endtime')
+        if endtime is not None and (self._sedated_until is None or endtime > self._sedated_until):
+            self._sedated_until = endtime
+
+    def _handle_gcs(self, t, data):
+        raw = gcs_brain_score(data.get('gcs'), data.get('gcs_motor'), data.get('gcs_unable'))
+        sedated = self._sedated_until is not None and t <= self._sedated_until
+        if not sedated:
+            self._locf_score = raw
+        effective = self._locf_score
+        self._pending_gcs.append((t, 0 if effective is None else effective))
+
+    def _handle_delirium(self, t, data):
+        stoptime = data.get('stoptime') or t + timedelta(hours=24)
+        self._delirium.append((t, stoptime))
+
+    def _handle_ventilation(self, t, data):
+        if data.get('ventilation_status') in ADVANCED_RESP_STATUSES:
+            self._resp_support.append((t, data.get('endtime')))
+
+    def _handle_mech(self, t, data):
+        itemid = data.get('itemid')
+        value = data.get('value')
+        flags = []
+        if itemid in ECMO_ITEMIDS:
+            flags.append('is_ecmo')
+        if itemid == ECMO_CONFIG_ITEMID:
+            if value == 'VV':
+                flags.append('is_vv_ecmo')
+            elif value in ('VA', 'VAV'):
+                flags.append('is_va_ecmo')
+            elif value in ('---', None, ''):
+                flags.append('is_ecmo_unknown_type')
+        if itemid in OTHER_MECH_ITEMIDS:
+            flags.append('is_other_mech')
+        for state in self._closed_hours(t):
+            for flag in flags:
+                state.mech[flag] = 1
+
+    def _handle_fio2(self, t, data):
+        fio2 = data.get('fio2')
+        if fio2 is None:
+            return
+        priority = FIO2_PRIORITY.get(data.get('source', 'ce'), 2)
+        for state in self._open_hours(t):
+            last = state.fio2
+            if last is None or t > last[0] or (t == last[0] and priority < last[1]):
+                state.fio2 = (t, priority, fio2)
+
+    def _handle_spo2(self, t, data):
+        spo2 = data.get('spo2')
+        if spo2 is None or not (0 < spo2 <= 100):
+            return
+        for state in self._open_hours(t):
+            state.spo2 = (t, spo2)
+
+    def _handle_pao2(self, t, data):
+        pao2 = data.get('pao2')
+        if pao2 is None:
+            return
+        for state in self._open_hours(t):
+            state.pao2 = (t, pao2)
+
+    def _handle_vitals(self, t, data):
+        mbp = data.get('mbp')
+        if mbp is None:
+            return
+        for state in self._closed_hours(t):
+            state.mbp_min = _min(state.mbp_min, mbp)
+
+    def _handle_vasoactive(self, t, data):
+        rates = {drug: data.get(drug) for drug in VASOACTIVE_DRUGS}
+        self._vasoactive.append((t, data.get('endtime'), rates))
+
+    def _handle_chemistry(self, t, data):
+        for state in self._open_hours(t):
+            state.creatinine = _max(state.creatinine, data.get('creatinine'))
+            state.potassium = _max(state.potassium, data.get('potassium'))
+            state.bicarbonate = _min(state.bicarbonate, data.get('bicarbonate'))
+
+    def _handle_bg(self, t, data):
+        for state in self._open_hours(t):
+            state.potassium = _max(state.potassium, data.get('potassium'))
+            state.ph = _min(state.ph, data.get('ph'))
+            state.bicarbonate = _min(state.bicarbonate, data.get('bicarbonate'))
+        # 氧合部分只取 ICU 住院期间的血气（与 02 的 pao2_all / fio2_raw 一致）
+        if t < self.intime or (self.outtime is not None and t > self.outtime):
+            return
+        if data.get('fio2') is not None:
+            self._handle_fio2(t, {'fio2': data['fio2'], 'source': 'bg'})
+        if data.get('specimen') == 'ART.' and data.get('po2') is not None:
+            self._handle_pao2(t, {'pao2': data['po2']})
+
+    def _handle_rrt(self, t, data):
+        if data.get('dialysis_present') == 1 or data.get('dialysis_active') == 1:
+            for state in self._closed_hours(t):
+                state.on_rrt = 1
+
+    def _handle_urine(self, t, data):
+        volume = data.get('urineoutput')
+        if volume is None:
+            return
+        for state in self._open_hours(t):
+            state.urine = volume if state.urine is None else state.urine + volume
+
+    def _handle_platelet(self, t, data):
+        if data.get('platelet') is not None:
+            self._platelet.push(t, data['platelet'])
+
+    def _handle_bilirubin(self, t, data):
+        if data.get('bilirubin_total') is not None:
+            self._bilirubin.push(t, data['bilirubin_total'])
+
+    # ------------------------------------------------------------------
+    # 关闭小时
+    # ------------------------------------------------------------------
+
+    def _finalize(self, hr: int) -> Sofa2HourlyScore:
+        end = self.endtime(hr)
+        start = end - HOUR
+        state = self._hours.pop(hr, None) or _HourState()
+
+        # 1. Brain: 最近一次 charttime < endtime 的 GCS（LOCF 已在接收时解析）
+        pending = self._pending_gcs
+        while pending and pending[0][0] < end:
+            self._brain_current = pending.popleft()[1]
+        self._delirium = [d for d in self._delirium if d[1] >= start]
+        on_delirium = any(d[0] <= end for d in self._delirium)
+        brain = self._brain_current
+        if brain == 0 and on_delirium:
+            brain = 1
+
+        # 2. Respiratory
+        self._resp_support = [v for v in self._resp_support if v[1] is None or v[1] > start]
+        with_support = any(v[0] < end for v in self._resp_support)
+        fio2 = state.fio2[2] if state.fio2 is not None else 21
+        pf_ratio = sf_ratio = raw_spo2 = None
+        if fio2:
+            if state.pao2 is not None:
+                pf_ratio = state.pao2[1] / fio2 * 100
+            if state.spo2 is not None:
+                sf_ratio = state.spo2[1] / fio2 * 100
+        if state.spo2 is not None:
+            raw_spo2 = state.spo2[1]
+        respiratory = respiratory_score(
+            state.mech.get('is_ecmo'), pf_ratio, sf_ratio, raw_spo2, with_support
+        )
+
+        # 3. Cardiovascular: 覆盖本小时且开始 >= 1 小时的输注
+        self._vasoactive = [v for v in self._vasoactive if v[1] is None or v[1] > start]
+        rates = {}
+        for v_start, _, v_rates in self._vasoactive:
+            if v_start <= start:
+                for drug, rate in v_rates.items():
+                    rates[drug] = _max(rates.get(drug), rate)
+        cardiovascular = cardiovascular_score(state.mech, state.mbp_min, rates)
+
+        # 4/5. Liver / Hemostasis: 48 小时回溯
+        liver = liver_score(self._bilirubin.value(end))
+        hemostasis = hemostasis_score(self._platelet.value(end))
+
+        # 6. Kidney
+        self._uo6.push(state.urine)
+        self._uo12.push(state.urine)
+        self._uo24.push(state.urine)
+        if hr >= 24:
+            window_status, uo_sum, hours = 'full_24h', self._uo24.sum, 24
+        elif hr >= 12:
+            window_status, uo_sum, hours = 'full_12h', self._uo12.sum, 12
+        elif hr >= 6:
+            window_status, uo_sum, hours = 'full_6h', self._uo6.sum, 6
+        else:
+            window_status, uo_sum, hours = 'insufficient', None, None
+        urine_rate = None
+        if hr >= 0 and self.weight and self.weight > 0 and uo_sum is not None:
+            urine_rate = uo_sum / self.weight / hours
+        kidney = kidney_score(
+            state.creatinine, state.potassium, state.ph, state.bicarbonate, state.on_rrt,
+            urine_rate, window_status, self._uo12.sum, self._uo12.count
+        )
+
+        # 24 小时滑动最大值
+        raw = (brain, respiratory, cardiovascular, liver, kidney, hemostasis)
+        final = []
+        for window, score in zip(self._component_max, raw):
+            window.push(hr, score)
+            final.append(window.value(hr))
+
+        return Sofa2HourlyScore(
+            self.stay_id, hr, start, end, *final, sum(final), raw
+        )
+
+
+class Sofa2StayRegistry:
+    """
+    多床位评分器注册表（stay_id -> OnlineSofa2Scorer）
+
+    示例：
+        registry = Sofa2StayRegistry()
+        registry.add_stay(stay_id, intime, weight)
+        rows = registry.push(stay_id, event)
+        rows = registry.advance_all(datetime.now())
+    """
+
+    def __init__(self):
+        self.scorers: Dict[int, OnlineSofa2Scorer] = {}
+
+    def add_stay(self, stay_id: int, intime: datetime, weight: Optional[float],
+                 outtime: Optional[datetime] = None) -> OnlineSofa2Scorer:
+        scorer = OnlineSofa2Scorer(stay_id, intime, weight, outtime=outtime)
+        self.scorers[stay_id] = scorer
+        return scorer
+
+    def discharge(self, stay_id: int) -> List[Sofa2HourlyScore]:
+        """出科：关闭剩余小时并移除评分器"""
+        scorer = self.scorers.pop(stay_id)
+        return scorer.flush() if scorer.last_hr is not None else []
+
+    def push(self, stay_id: int, event: Sofa2Event) -> List[Sofa2HourlyScore]:
+        scorer = self.scorers.get(stay_id)
+        if scorer is None:
+            return []
+        return scorer.push(event)
+
+    def advance_all(self, t: datetime) -> List[Sofa2HourlyScore]:
+        emitted = []
+        for scorer in self.scorers.values():
+            emitted.extend(scorer.advance_to(t))
+        return emitted